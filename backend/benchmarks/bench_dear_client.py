@@ -0,0 +1,100 @@
+"""
+/api/inventory 查一個 SKU (Product + 庫存兩次呼叫)：每次 requests.get 新連線 vs 共用的 keep-alive 連線池
+
+    cd backend && python -m benchmarks.bench_dear_client [查詢次數] [建立連線延遲 ms]
+
+在本機起一個假的 DEAR 伺服器 (HTTP/1.1 keep-alive)，每條新連線先等「建立連線延遲」(預設 30 ms)
+模擬到 DEAR 的 TCP + TLS 握手 (本機沒有 TLS，也沒有網路來回)，再用 8 個 thread 同時查詢：
+  每次新連線  上一版：每個請求 new 一個 DearAPIClient，每次呼叫 requests.get
+  連線池      get_dear_client() 共用的 client (DEAR_POOL_SIZE 條連線)
+比較每個 SKU 的平均耗時、伺服器實際收到幾條連線，並確認兩種做法回傳的內容相同。
+"""
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from core import dear_client
+
+THREADS = 8
+
+
+class StubDear(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 標頭和內容分兩次寫出，不關 Nagle 的話 keep-alive 連線上每個回應都會多等 ~40 ms 的 delayed ACK
+    disable_nagle_algorithm = True
+    connections = 0
+    connect_delay = 0.0
+    lock = threading.Lock()
+
+    def setup(self):
+        with StubDear.lock: StubDear.connections += 1
+        time.sleep(StubDear.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        sku = parse_qs(url.query).get("SKU", [""])[0]
+        if url.path.endswith("/Product"):
+            body = {"Products": [{"Name": f"Product {sku}", "SKU": sku, "Barcode": "4890000000000", "UOM": "個"}]}
+        else:
+            body = {"ProductAvailabilityList": [{"SKU": sku, "Location": "Main", "OnHand": 12, "Available": 10}]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def old_lookup(base_url, sku):
+    # 上一版：每次呼叫都是新的 requests.get (新連線)
+    headers = {"api-auth-accountid": "bench", "api-auth-applicationkey": "bench", "Accept": "application/json"}
+    product = requests.get(f"{base_url}Product", headers=headers, params={"SKU": sku}).json()["Products"][0]
+    data = requests.get(f"{base_url}ref/productavailability", headers=headers, params={"SKU": sku}).json()
+    return product["SKU"], data["ProductAvailabilityList"]
+
+def pooled_lookup(sku):
+    client = dear_client.get_dear_client("bench", "bench")
+    return client.get_product_info(sku)["SKU"], client.get_inventory_by_sku(sku)
+
+def run(fn, skus):
+    StubDear.connections = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(fn, skus))
+    return (time.perf_counter() - started) * 1000 / len(skus), StubDear.connections, results
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    StubDear.connect_delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 30.0) / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubDear)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/ExternalApi/v2/"
+    dear_client.DearAPIClient.BASE_URL = base_url
+    try:
+        skus = [f"SKU-{i:05d}" for i in range(lookups)]
+        old_ms, old_conns, old = run(lambda sku: old_lookup(base_url, sku), skus)
+        new_ms, new_conns, new = run(pooled_lookup, skus)
+        assert old == new
+        stats = dear_client.dear_client_stats()
+        print(f"{lookups} 個 SKU ({lookups * 2} 次呼叫), {THREADS} threads, 建立連線延遲 {StubDear.connect_delay * 1000:.0f} ms")
+        print(f"每次新連線 {old_ms:6.2f} ms / SKU, {old_conns:5d} 條連線")
+        print(f"連線池     {new_ms:6.2f} ms / SKU, {new_conns:5d} 條連線 (pool_size {stats['pool_size']})")
+        for endpoint, e in stats["endpoints"].items():
+            print(f"  {endpoint:<26} {e['calls']:5d} 次, 平均 {e['avg_ms']:6.2f} ms, 最長 {e['max_ms']:6.2f} ms")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
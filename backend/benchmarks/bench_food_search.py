@@ -0,0 +1,80 @@
+"""
+/api/food_label/search：掃描小寫內容 + 回傳全部符合列 vs trigram 索引 + 每頁 50 筆
+
+    cd backend && python -m benchmarks.bench_food_search [列數]
+
+合成主資料庫 (預設 6 萬列)，比對商品編號、條碼、名稱三欄，從查詢到 JSON bytes 為止，每種查詢取多次中最快的一次，
+並確認分層後的前 50 筆都是符合的列 (完整貨號 / 條碼時，完全相同的列排第一)。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from core.fast_json import FastJSONResponse
+from services.master_api import add_status_columns, master_indexes, master_search_columns, master_key_columns
+from services.food_label_api import rank_positions, build_search_results, find_food_positions, FOOD_SEARCH_FIELDS, FOOD_SEARCH_LIMIT
+
+ROUNDS = 5
+QUERIES = (
+    ("完整貨號", None),          # 由資料決定
+    ("完整條碼", None),
+    ("常見字 noodles", "noodles"),
+    ("短字串 a", "a"),
+    ("查無資料", "no such product"),
+)
+
+
+def unpaged_search(table, query):
+    # 上一版：逐欄掃描小寫內容，所有符合的列都組成結果
+    positions = np.empty(0, dtype=np.int64)
+    for col in master_search_columns(table):
+        positions = np.union1d(positions, table.find(col, query))
+    ranked = rank_positions(table, positions) if len(positions) else positions
+    return ranked, FastJSONResponse(build_search_results(table, ranked, FOOD_SEARCH_FIELDS)).body
+
+def paged_search(table, query):
+    ranked, _ = find_food_positions(table, query, FOOD_SEARCH_LIMIT + 1)
+    return ranked, FastJSONResponse(build_search_results(table, ranked[:FOOD_SEARCH_LIMIT], FOOD_SEARCH_FIELDS)).body
+
+def best_ms(fn):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "data.csv"), rows)
+        scan_path = shutil.copy(csv_path, os.path.join(tmp, "scan_data.csv"))
+        scanned = table_snapshot.build_snapshot(scan_path, add_status_columns, "bench", master_indexes, master_search_columns)
+        started = time.perf_counter()
+        indexed = table_snapshot.build_snapshot(csv_path, add_status_columns, "bench", master_indexes, master_search_columns,
+                                                ngram_columns=master_search_columns, key_columns=master_key_columns)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        sample = indexed.row(rows // 2)
+        queries = [(name, q if q is not None else sample["Barcode" if "條碼" in name else "Product_No"].lower())
+                   for name, q in QUERIES]
+        print(f"{rows} 列, 建快照 + trigram 索引 {build_ms:.0f} ms, 索引 {indexed.storage_bytes()['indexes'] / 1e6:.1f} MB")
+        print(f"{'查詢':<14} {'符合':>6} {'全部回傳':>10} {'':>9} {'索引 + 分頁':>10} {'':>9}")
+        for name, q in queries:
+            old_ms, (expected, old) = best_ms(lambda: unpaged_search(scanned, q))
+            new_ms, (ranked, new) = best_ms(lambda: paged_search(indexed, q))
+            assert set(ranked[:FOOD_SEARCH_LIMIT].tolist()) <= set(expected.tolist())
+            if q in (sample["Barcode"].lower(), sample["Product_No"].lower()): assert ranked[0] == rows // 2
+            print(f"{name:<14} {len(expected):>6} {old_ms:8.1f} ms {len(old) / 1e3:>7.0f} KB {new_ms:8.1f} ms {len(new) / 1e3:>7.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
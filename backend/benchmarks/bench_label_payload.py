@@ -0,0 +1,52 @@
+"""
+上傳回應大小與序列化時間：compact vs full (舊版 print_html)
+
+    cd backend && python -m benchmarks.bench_label_payload
+
+用 300 頁合成揀貨單 (每行數量 1~48) 跑一次 Homey / HelloBear / Anymall 解析，
+再把同一批 items 分別輸出成兩種格式，比較 JSON 大小與 json.dumps 時間。
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from core.pick_list_job import build_upload_response
+
+PAGES = 300
+ROUNDS = 5
+
+
+def best_of(fn):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+def main():
+    from benchmarks.synthetic_pdf import write_pick_list
+    from services.download_api import _src_path
+    from services.homey_api import process_homey_pdf
+    from services.anymall_api import process_anymall_pdf
+    from services.hello_api import process_hellobear_pdf
+
+    vendors = [("homey", process_homey_pdf), ("hellobear", process_hellobear_pdf), ("anymall", process_anymall_pdf)]
+    with tempfile.TemporaryDirectory() as tmp:
+        src_pdf = write_pick_list(os.path.join(tmp, "pick_list.pdf"), PAGES)
+        print(f"{PAGES} 頁揀貨單")
+        for vendor, process in vendors:
+            pdf_path = os.path.join(tmp, "upload.pdf")
+            shutil.copyfile(src_pdf, pdf_path)
+            items, tracker, out_token = process(pdf_path)
+            for label_format in ("full", "compact"):
+                ms, body = best_of(lambda: json.dumps(build_upload_response(items, tracker, out_token, label_format)))
+                print(f"{vendor:<10} {label_format:<8} {len(body) / 1024 / 1024:8.2f} MB   serialize {ms:8.1f} ms")
+    if os.path.exists(_src_path(None)): os.remove(_src_path(None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+標籤產生效能測試：改版前的 create_*_html vs 現在走 core.label_templates 的版本
+
+    cd backend && python -m benchmarks.bench_label_templates
+
+下面的 legacy_* 是改版前 (food_label_api / homey_api / anymall_api / hello_api) 的 create_*_html 原文，
+只有兩處不同：函式名稱加上 legacy_ 前綴，條碼圖改用 barcode_data_uri (條碼本身的改版另有 benchmark，
+這裡兩邊用同一張圖，只比較 HTML 的組法)。
+同一份輸入分別丟給舊版與現在的服務函式，確認展開後的 HTML 完全一致 (只差 </html> 後的空白)，再比較耗時。
+"""
+import time
+
+from core.barcodes import barcode_data_uri
+from core.fonts import FONT_CSS_PLACEHOLDER
+from core.label_format import render_label
+from services import food_label_api, homey_api, anymall_api, hello_api
+from services.food_label_api import clean_val, get_nutri_val, format_expiry_date
+
+ROUNDS = 2000
+QTY = 12
+
+# ================= 改版前的 create_*_html (原文) =================
+
+def legacy_food_label_html(item_name, barcode_text, matched_data, qty):
+    data = matched_data if matched_data else {}
+    excel_name = clean_val(data.get('Name', ''))
+    if not excel_name: excel_name = clean_val(data.get('Description', ''))
+    desc_text = excel_name if excel_name else item_name
+    
+    b_text = barcode_text if barcode_text and barcode_text != "(N/A)" else clean_val(data.get('Barcode', ''))
+
+    nutri = {
+        'Serving_Size': get_nutri_val(data, 'Serving_Size'),
+        'Energy': get_nutri_val(data, 'Energy'),
+        'Protein': get_nutri_val(data, 'Protein'),
+        'Total_Fat': get_nutri_val(data, 'Total_Fat'),
+        'Sat_Fat': get_nutri_val(data, 'Sat_Fat'),
+        'Trans_Fat': get_nutri_val(data, 'Trans_Fat'),
+        'Carb': get_nutri_val(data, 'Carb'),
+        'Sugar': get_nutri_val(data, 'Sugar'),
+        'Sodium': get_nutri_val(data, 'Sodium'),
+        'Net_Content': get_nutri_val(data, 'Net_Content') or get_nutri_val(data, 'Net Content'),
+        'Country_Of_Origin': get_nutri_val(data, 'Country_Of_Origin'),
+    }
+    ing_text = clean_val(data.get('Ingredients', ''))
+    mfr_text = f"{clean_val(data.get('Madeby_Prefix', ''))} {clean_val(data.get('Madeby', ''))}".strip()
+    if mfr_text and "Manufacturer" not in mfr_text: mfr_text = "Manufacturer: " + mfr_text
+
+    # 動態取得日期格式 (使用 Expiry_Date_Format 作為 Key)
+    expiry_raw = data.get('Expiry_Date_Format', data.get('AD', ''))
+    en_expiry, ch_expiry = format_expiry_date(expiry_raw)
+
+    single_label_html = f"""
+    <html><head><style>
+        /* FONT_CSS_PLACEHOLDER */
+        @page {{ size: auto; margin: 0mm; }}
+        
+        body {{ 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+        }}
+        
+        .label-container {{ 
+            width: 70mm; 
+            height: 50mm; 
+            position: relative; 
+            box-sizing: border-box; 
+            border: 1px solid #ddd; 
+            page-break-after: always; 
+            overflow: hidden; 
+            font-weight: bold; 
+        }}
+        
+        .barcode-text {{ 
+            position: absolute; 
+            left: 2mm; 
+            top: 2mm; 
+            font-size: 5pt; 
+            font-weight: bold; 
+        }}
+        
+        .desc-text {{ 
+            position: absolute; 
+            left: 2mm; 
+            top: 4.5mm; 
+            width: 59mm; 
+            font-size: 5pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+        }}
+        
+        .line1 {{ 
+            position: absolute; 
+            left: 0; 
+            top: 9mm; 
+            width: 70mm; 
+            border-top: 1.42pt solid black; 
+        }}
+        
+        .nutri-box {{   
+            position: absolute; 
+            left: 2mm; 
+            top: 10mm; 
+            width: 23mm; 
+            font-size: 4.5pt; /* 统一改字体大小 */
+            line-height: 1.25; /* 统一改行距 */
+            font-weight: bold; 
+        }}
+        
+        .nutri-title {{ 
+            font-weight: bold; 
+            margin-bottom: 1px; 
+        }}
+        
+        .nutri-row {{ 
+            display: flex; 
+            justify-content: space-between; 
+        }}
+        
+        .indent {{ 
+            padding-left: 3px; 
+        }}
+        
+        .vline {{ 
+            position: absolute; 
+            left: 26mm; 
+            top: 9mm; 
+            height: 29mm; 
+            border-left: 1.42pt solid black; 
+        }}
+        
+        .line2 {{ 
+            position: absolute; 
+            left: 0; 
+            top: 38mm; 
+            width: 70mm; 
+            border-top: 1.42pt solid black; 
+        }}
+        
+        .mfr-box {{ 
+            position: absolute; 
+            left: 2mm; 
+            top: 40mm; 
+            width: 35mm; 
+            font-size: 4.76pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+        }}
+        
+        .bb-box {{ 
+            position: absolute; 
+            left: 47mm; 
+            top: 40mm; 
+            width: 27mm; 
+            font-size: 4.2pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+            white-space: nowrap; 
+        }}
+        
+        .ing-box {{ 
+            position: absolute; 
+            left: 27mm; 
+            top: 10mm; 
+            width: 41mm; 
+            height: 28mm; 
+            font-size: 3.5pt; 
+            line-height: 1.1; 
+            overflow: hidden; 
+            text-align: left; /* 🌟 1. 改成靠左對齊，避免單字被亂拉長 */
+            font-weight: bold; 
+            letter-spacing: 0.2pt; /* 🌟 2. 調整字母與字母之間的距離 (可調 0.1pt ~ 0.5pt) */
+            word-spacing: 0.5pt;   /* 🌟 3. (可選) 調整英文單字與單字之間的距離 */
+        }}
+
+        /* 強制全域粗體 */
+        .label-container, .label-container * {{ 
+            font-weight: 900 !important; 
+        }}
+    </style></head><body>
+        <div class="label-container">
+            <div class="barcode-text">{b_text}</div>
+            <div class="desc-text">{desc_text}</div>
+            <div class="line1"></div>
+            <div class="nutri-box">
+                <div class="nutri-title">Nutrition Information</div>
+                <br>
+                <div class="nutri-row"><span>Serving Size:</span><span>{nutri['Serving_Size']}</span></div>
+                <div class="nutri-row"><span>Energy:</span><span>{nutri['Energy']}</span></div>
+                <div class="nutri-row"><span>Protein:</span><span>{nutri['Protein']}</span></div>
+                <div class="nutri-row"><span>Total fat:</span><span>{nutri['Total_Fat']}</span></div>
+                <div class="nutri-row indent"><span>- Saturated fat:</span><span>{nutri['Sat_Fat']}</span></div>
+                <div class="nutri-row indent"><span>- Trans fat:</span><span>{nutri['Trans_Fat']}</span></div>
+                <div class="nutri-row"><span>Carbohydrates:</span><span>{nutri['Carb']}</span></div>
+                <div class="nutri-row indent"><span>- Sugars:</span><span>{nutri['Sugar']}</span></div>
+                <div class="nutri-row"><span>Sodium:</span><span>{nutri['Sodium']}</span></div>
+                <div class="nutri-row"><span>Net Content:</span><span>{nutri['Net_Content']}</span></div>
+                <div class="nutri-row"><span>Country Of Origin:</span><span>{nutri['Country_Of_Origin']}</span></div>
+            </div>
+            <div class="vline"></div>
+            <div class="ing-box">{ing_text}</div>
+            <div class="line2"></div>
+            <div class="mfr-box">{mfr_text}</div>
+            <div class="bb-box">Best before({en_expiry}):<br>此日期前最佳({ch_expiry})<br>Show on package(見包裝)</div>
+        </div>
+    </body></html>
+    """
+    import re as regex
+    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
+    if match:
+        div_content = match.group(1)
+        full_body = div_content * qty
+        return single_label_html.replace(div_content, full_body)
+    return single_label_html
+
+def legacy_caution_html(text, qty):
+    formatted = str(text).replace('\n', '<br/>')
+    if not formatted or formatted == "nan": formatted = ""
+    single = f"""
+    <html><head><style>
+        /* FONT_CSS_PLACEHOLDER */
+        @page {{ size: auto; margin: 0mm; }}
+        
+        body {{ 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+        }}
+        
+        .label-container {{ 
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            padding: 2mm; 
+            page-break-after: always; 
+            display: flex; 
+            align-items: center; 
+            justify-content: center; 
+            text-align: center; 
+        }}
+        
+        .caution-text {{ 
+            font-size: 15pt; 
+            font-weight: 900; 
+            line-height: 1.2; 
+            word-wrap: break-word; 
+            color: black; 
+        }}
+        
+        /* 強制全域粗體 */
+        .label-container, .label-container * {{ 
+            font-weight: 900 !important; 
+        }}
+    </style></head><body>
+        <div class="label-container"><div class="caution-text">{formatted}</div></div>
+    </body></html>
+    """
+    import re as regex
+    match = regex.search(r'<body>(.*?)</body>', single, regex.DOTALL)
+    if match:
+        div_content = match.group(1)
+        full_body = div_content * qty
+        return single.replace(div_content, full_body)
+    return single
+
+def legacy_insects_label_html(matched_data, qty):
+    data = matched_data if matched_data else {}
+    barcode = clean_val(data.get('Barcode', ''))         
+    desc = clean_val(data.get('Description', ''))        
+    features = clean_val(data.get('FEATURES', ''))       
+    cautions = clean_val(data.get('Cautions', ''))       
+    net_content = clean_val(data.get('Net Content', '')) 
+    if not net_content: net_content = clean_val(data.get('Net_Content', ''))
+    ingredients = clean_val(data.get('Ingredients', '')) 
+    warnings = clean_val(data.get('警告字眼', ''))         
+    
+    single_label_html = f"""
+    <html><head><style>
+        /* FONT_CSS_PLACEHOLDER */
+        @page {{ size: 70mm 50mm; margin: 0; }}
+        
+        body {{ 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+            background-color: white;
+        }}
+        
+        .label-box {{
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            padding: 3mm 4mm; 
+            overflow: hidden; 
+            background-color: white; 
+            color: black; 
+            font-size: 4pt; 
+            line-height: 1.1; 
+            page-break-after: always;
+        }}
+        
+        .insect-row {{
+            margin-bottom: 6pt; 
+            word-wrap: break-word; 
+            font-weight: bold; 
+            min-height: 6pt;
+        }}
+
+        .label-box, .label-box * {{ 
+            font-weight: 900 !important; 
+        }}
+    </style></head><body>
+        <div class="label-box">
+            <div class="insect-row">
+                <div>{barcode}</div>
+                <div>{desc}</div>
+            </div>
+            <div class="insect-row">{features}</div>
+            <div class="insect-row">{cautions}</div>
+            <div class="insect-row">{net_content}</div>
+            <div class="insect-row">{ingredients}</div>
+            <div style="word-wrap: break-word; font-weight: bold; min-height: 6pt;">{warnings}</div>
+        </div>
+    </body></html>
+    """
+    import re as regex
+    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
+    if match:
+        div_content = match.group(1)
+        full_body = div_content * qty
+        return single_label_html.replace(div_content, full_body)
+    return single_label_html
+
+def legacy_repack_label_html(p_name, barcode_val, qty, font_css=""):
+    barcode_img_src = barcode_data_uri(barcode_val)
+    single_label_html = f"""
+    <html><head><style>
+        {font_css}
+        @page {{ size: 70mm 50mm; margin: 0; }}
+        
+        body {{ 
+            margin: 0; 
+            padding: 0; 
+            background-color: white; 
+        }}
+        
+        .label-container {{
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            page-break-after: always; 
+            display: flex; 
+            flex-direction: column; 
+            justify-content: center; 
+            align-items: center; 
+            padding-top: 3mm; 
+            overflow: hidden; 
+            text-align: center;
+        }}
+        
+        .barcode-text {{
+            font-family: monospace; 
+            font-weight: bold; 
+            font-size: 14pt; 
+            margin-top: 2px; 
+            letter-spacing: 1px; 
+            color: black;
+        }}
+        
+        .name-text {{
+            font-size: 10pt; 
+            font-weight: bold; 
+            margin-top: 6px; 
+            width: 95%; 
+            word-wrap: break-word; 
+            line-height: 1.2; 
+            color: black;
+        }}
+
+        .label-container, .label-container * {{ 
+            font-weight: 900 !important; 
+        }}
+    </style></head><body>
+        <div class="label-container">
+            <img src="{barcode_img_src}" style="height: 18mm; width: 90%; object-fit: contain;">
+            <div class="barcode-text">{barcode_val}</div>
+            <div class="name-text">{p_name}</div>
+        </div>
+    </body></html>
+    """
+    import re as regex
+    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
+    if match:
+        div_content = match.group(1)
+        full_body = div_content * qty
+        return single_label_html.replace(div_content, full_body)
+    return single_label_html
+
+def legacy_anymall_label_html(barcode_val, qty):
+    barcode_img_src = barcode_data_uri(barcode_val)
+    single_label = f"""
+    <div style="width: 70mm; height: 50mm; box-sizing: border-box; page-break-after: always; display: flex; flex-direction: column; justify-content: center; align-items: center; padding-top: 3mm; overflow: hidden;">
+        <img src="{barcode_img_src}" style="height: 25mm; width: 90%; object-fit: contain;">
+        <div style="font-family: monospace; font-weight: bold; font-size: 17pt; margin-top: 3px; letter-spacing: 1px; color: black;">{barcode_val}</div>
+    </div>"""
+    return f"<html><head><style>@page {{ size: 70mm 50mm; margin: 0; }} body {{ margin: 0; padding: 0; background-color: white; }}</style></head><body>{single_label * qty}</body></html>"
+
+def legacy_hellobear_label_html(barcode_val, p_name, qty):
+    barcode_img_src = barcode_data_uri(barcode_val)
+    single_label = f"""
+    <div style="width: 70mm; height: 50mm; box-sizing: border-box; page-break-after: always; display: flex; flex-direction: column; justify-content: center; align-items: center; padding-top: 3mm; overflow: hidden; text-align: center;">
+        <img src="{barcode_img_src}" style="height: 22mm; width: 90%; object-fit: contain;">
+        <div style="font-family: monospace; font-weight: bold; font-size: 14pt; margin-top: 2px; letter-spacing: 1px; color: black;">{barcode_val}</div>
+        <div style="font-size: 8pt; font-weight: bold; margin-top: 6px; width: 95%; word-wrap: break-word; line-height: 1.2; color: black;">{p_name}</div>
+    </div>"""
+    return f"<html><head><style>@page {{ size: 70mm 50mm; margin: 0; }} body {{ margin: 0; padding: 0; background-color: white; }}</style></head><body>{single_label * qty}</body></html>"
+
+
+# ================= 測試資料 =================
+
+FOOD_DATA = {"Name": "Butter Cookies 200g", "Barcode": "4891234567890", "Ingredients": "Wheat flour, butter, sugar, egg, salt. " * 6,
+             "Madeby_Prefix": "Imported by", "Madeby": "Sample Foods Ltd.", "Expiry_Date_Format": "YYYY/MM/DD",
+             "Serving_Size": "30g", "Energy": "150kcal", "Protein": "2g", "Total_Fat": "7g", "Sat_Fat": "4g", "Trans_Fat": "0g",
+             "Carb": "20g", "Sugar": "8g", "Sodium": "60mg", "Net_Content": "200g", "Country_Of_Origin": "Japan"}
+INSECT_DATA = {"Barcode": "4891234567890", "Description": "Mosquito repellent", "FEATURES": "Lasts 8 hours", "Cautions": "Avoid eyes",
+               "Net Content": "100ml", "Ingredients": "DEET 15%", "警告字眼": "Flammable"}
+CAUTION_TEXT = "Keep out of reach of children\nNot suitable for infants"
+
+# (名稱, 舊版, 現在的服務函式, 是否回傳 compact 需要 render_label 展開)
+CASES = [
+    ("food", lambda: legacy_food_label_html("Cookies", "(N/A)", FOOD_DATA, QTY),
+     lambda: food_label_api.create_food_label_html("Cookies", "(N/A)", FOOD_DATA, QTY), False),
+    ("caution", lambda: legacy_caution_html(CAUTION_TEXT, QTY),
+     lambda: food_label_api.create_caution_html(CAUTION_TEXT, QTY), False),
+    ("insect", lambda: legacy_insects_label_html(INSECT_DATA, QTY),
+     lambda: food_label_api.create_insects_label_html(INSECT_DATA, QTY), False),
+    ("repack", lambda: legacy_repack_label_html("Repacked item 500g", "AB0012X", QTY, FONT_CSS_PLACEHOLDER),
+     lambda: homey_api.create_homey_repack_label_html("Repacked item 500g", "AB0012X", QTY, FONT_CSS_PLACEHOLDER), True),
+    ("anymall", lambda: legacy_anymall_label_html("AB0012X", QTY),
+     lambda: anymall_api.create_anymall_label_html("AB0012X", QTY), True),
+    ("hellobear", lambda: legacy_hellobear_label_html("AB0012X", "Hello Bear plush", QTY),
+     lambda: hello_api.create_hellobear_label_html("AB0012X", "Hello Bear plush", QTY), True),
+]
+
+def per_call_us(fn):
+    started = time.perf_counter()
+    for _ in range(ROUNDS): fn()
+    return (time.perf_counter() - started) / ROUNDS * 1e6
+
+def main():
+    print(f"每種標籤 {ROUNDS} 次，qty={QTY} (單位 µs / 次)")
+    print(f"{'label':<10} {'舊版':>8} {'現在':>8} {'現在+展開(full)':>16}")
+    for name, legacy, current, compact in CASES:
+        expand = (lambda: render_label(current())) if compact else current
+        # 舊版 f-string 在 </html> 後面還留著原始碼縮排的 "\n    "，新版統一以 LABEL_TAIL 收尾，其餘必須逐字相同
+        assert expand() == legacy().rstrip(), name
+
+        old = per_call_us(legacy)
+        new = per_call_us(current)
+        full = per_call_us(expand)
+        print(f"{name:<10} {old:8.1f} {new:8.1f} {full:16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+主資料庫上傳後到可以查詢的時間：整份重建快照 vs 只套用變動的列 (增量快照)
+
+    cd backend && python -m benchmarks.bench_master_delta [列數]
+
+在暫存資料夾產生合成主資料庫，新版本改掉 12 個貨號的內容、刪 2 個、加 2 個，
+比較 build_snapshot (整份解析、算狀態欄、寫全部欄位與索引) 與 build_delta_snapshot，
+並確認兩者查詢結果一致。
+"""
+import os
+import sys
+import time
+import tempfile
+
+import pandas as pd
+
+from benchmarks.synthetic_master import make_master_df
+from core import table_snapshot
+from services.master_api import add_status_columns, master_indexes, master_search_columns
+
+EDITED = 12
+
+
+def timed_ms(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+def edited_version(df):
+    new = df.copy()
+    for k in range(EDITED):
+        new.loc[k * 97, "Ingredients"] = f"Water, Sugar, Salt (v{k})"
+    new = new.drop(index=[11, 12]).reset_index(drop=True)
+    extra = df.iloc[[0, 1]].copy()
+    extra["Product_No"] = ["NEW-00001", "NEW-00002"]
+    return pd.concat([new, extra], ignore_index=True)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    args = (add_status_columns, "bench", master_indexes, master_search_columns)
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = os.path.join(tmp, "data.csv")
+        df = make_master_df(rows)
+        df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+        base = table_snapshot.build_snapshot(csv_path, *args)
+
+        new_path = os.path.join(tmp, "new", "data.csv")
+        os.makedirs(os.path.dirname(new_path))
+        edited_version(df).to_csv(new_path, index=False, encoding="utf-8-sig")
+
+        # 整份重建寫到另一個資料夾，免得把增量要用的基底快照當成舊版本刪掉
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "full")
+        full_ms, full = timed_ms(lambda: table_snapshot.build_snapshot(new_path, *args))
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        delta_ms, (delta, changes) = timed_ms(lambda: table_snapshot.build_delta_snapshot(new_path, base, "product_no", *args, as_name=csv_path))
+
+        pd.testing.assert_frame_equal(delta.to_pandas().reset_index(drop=True).sort_values("Product_No", ignore_index=True),
+                                      full.to_pandas().reset_index(drop=True).sort_values("Product_No", ignore_index=True))
+        for key in ("SKU-00000", "SKU-00011", "NEW-00002"):
+            assert [delta.row(p) for p in delta.lookup("product_no", key)] == [full.row(p) for p in full.lookup("product_no", key)]
+        print(f"{rows} 列主資料庫，變動 {changes}")
+        print(f"整份重建 {full_ms:8.1f} ms | 增量快照 {delta_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+標籤狀態判斷：每次查詢 iterrows() + check_data_status vs 載入時預先算好的狀態欄
+
+    cd backend && python -m benchmarks.bench_master_status
+
+合成主資料庫 6 萬列 (其中 1 萬個貨號各有一列重複、資料較少的舊紀錄)，
+比較食品標籤搜尋 (一次上萬筆符合) 與 Yummy 揀貨單 (300 頁、每頁幾筆符合) 的排序去重，並確認結果一致。
+"""
+import os
+import random
+import time
+import tempfile
+
+import pandas as pd
+
+from benchmarks.synthetic_master import make_master_df
+from core.table_snapshot import SharedTable, write_table
+from services.master_api import add_status_columns, rank_master_rows, best_master_position, STATUS_COL, BASE_STATUS_COL, STATUS_COLUMNS
+from services import food_label_api
+
+ROWS = 60000
+DUPLICATES = 10000
+PAGES = 300
+
+
+def legacy_yummy_status(data_dict):
+    # 舊版 legacy_yummy_status (不含蟲蟲判斷)；服務端已改用 BASE_STATUS_COL，這裡留一份當對照
+    if not data_dict: return 'empty'
+    food_keywords = ['ingredient', 'energy', 'protein', 'fat', 'carb', 'sodium', 'serving']
+    for k, v in data_dict.items():
+        if any(fw in str(k).lower() for fw in food_keywords):
+            val = str(v).strip().lower()
+            if val and val not in ['nan', '0', 'none', '']: return 'food'
+    for k, v in data_dict.items():
+        if any(cw in str(k).lower() for cw in ['caution', 'warning']):
+            val = str(v).strip().lower()
+            if val and val not in ['nan', 'none', '']: return 'caution'
+    return 'empty'
+
+def legacy_best_results(results_df, check_data_status, scores_by_status):
+    # 舊版 get_best_results：逐列 iterrows() 呼叫 check_data_status
+    if results_df.empty: return results_df
+    scores = [scores_by_status.get(check_data_status(row.to_dict()), 0) for _, row in results_df.iterrows()]
+    results_df = results_df.copy()
+    results_df['__score'] = scores
+    results_df = results_df.sort_values(by='__score', ascending=False)
+    return results_df.drop_duplicates(subset=['Product_No'], keep='first')
+
+def timed_ms(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+def main():
+    raw = make_master_df(ROWS)
+    stale = raw.sample(DUPLICATES, random_state=1).copy()
+    stale[["Ingredients", "Energy", "FEATURES", "警告字眼"]] = ""
+    raw = pd.concat([raw, stale], ignore_index=True)
+
+    build_ms, df = timed_ms(lambda: add_status_columns(raw))
+    print(f"載入時計算狀態欄 {build_ms:.1f} ms ({len(df)} 列，每個主資料庫版本一次)")
+
+    sample = df.sample(3000, random_state=2)
+    for _, row in sample.iterrows():
+        data = {k: v for k, v in row.to_dict().items() if k not in STATUS_COLUMNS}
+        assert food_label_api.check_data_status(data) == row[STATUS_COL]
+        assert legacy_yummy_status(data) == row[BASE_STATUS_COL]
+
+    # 食品標籤搜尋：名稱含 "Noodles" 的列
+    hits = df[df["Name"].str.contains("Noodles")]
+    raw_hits = hits.drop(columns=list(STATUS_COLUMNS))
+    old_ms, expected = timed_ms(lambda: legacy_best_results(raw_hits, food_label_api.check_data_status, {'insect': 3, 'food': 2, 'caution': 1}))
+    new_ms, result = timed_ms(lambda: rank_master_rows(hits, STATUS_COL))
+    assert list(result.index) == list(expected.index)
+    print(f"食品標籤搜尋 ({len(hits)} 筆符合)  舊版 {old_ms:9.1f} ms | 預先算好 {new_ms:7.1f} ms")
+
+    # Yummy 揀貨單：每頁用貨號查到 1~2 列
+    rng = random.Random(3)
+    groups = list(df.groupby("Product_No").indices.values())
+    page_positions = [groups[rng.randrange(len(groups))] for _ in range(PAGES)]
+    raw_rows = [df.iloc[p].drop(columns=list(STATUS_COLUMNS)) for p in page_positions]
+    with tempfile.TemporaryDirectory() as tmp:
+        write_table(df, os.path.join(tmp, "master"))
+        table = SharedTable(os.path.join(tmp, "master"))
+        old_ms, expected = timed_ms(lambda: [legacy_best_results(r, legacy_yummy_status, {'food': 2, 'caution': 1}) for r in raw_rows])
+        new_ms, result = timed_ms(lambda: [best_master_position(table, p, BASE_STATUS_COL) for p in page_positions])
+        assert all(a.index[0] == b for a, b in zip(expected, result))
+        print(f"Yummy {PAGES} 頁                  舊版 {old_ms:9.1f} ms | 預先算好 {new_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+揀貨單解析引擎效能測試 (500 頁合成揀貨單)
+
+    cd backend && python -m benchmarks.bench_pick_list_parser
+
+比較舊版各供應商自帶的逐頁迴圈 (inline re 呼叫) 與 core.pick_list_parser，
+同時確認兩者解析結果完全一致。
+"""
+import random
+import re
+import time
+
+from core.pick_list_parser import PROFILES, iter_parsed_pages
+
+PAGES = 500
+ROUNDS = 5
+
+
+def make_page(i, rng):
+    p_no = f"SKU-{i:05d}"
+    qty = rng.randint(1, 48)
+    name = [f"Product name line {i}", "extra spec 500g"][: rng.randint(1, 2)]
+    barcode = rng.choice([f"489{rng.randint(10**9, 10**10 - 1)}", f"*{p_no}*", f"*AB{i:04d}X*", "N/A"])
+    layout = rng.random()
+    if layout < 0.4:
+        body = [p_no, *name, f"{qty}.0000", barcode]
+    elif layout < 0.7:
+        body = [p_no, *name, str(qty), ".0000", barcode]
+    else:
+        body = [p_no, *name, f"{name[-1]} {qty}", ".0000", barcode]
+    body += [f"Order date 2025{rng.randint(1, 12):02d}15", f"Page {i + 1} of {PAGES}", "[Image 1]"]
+    return "\n".join(body)
+
+
+# ================= 舊版迴圈 (供比對) =================
+
+def legacy_yummy(texts):
+    out = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip(): continue
+        lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
+        p_no = lines[0].strip() if lines else "Unknown"
+        t = text.replace('\n', ' ')
+        p_date = "未偵測到"
+        m = re.search(r"\b(20\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])\b", t)
+        if m: p_date = f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+        qty = 1
+        qty_line_index = -1
+        for idx, line in enumerate(lines):
+            if ".0000" in line:
+                qty_line_index = idx
+                match_inline = re.search(r"(\d+)\s*\.0000", line)
+                if match_inline and int(match_inline.group(1)) > 0:
+                    qty = int(match_inline.group(1))
+                elif idx > 0:
+                    prev_line = lines[idx-1].strip()
+                    if prev_line.isdigit():
+                        qty = int(prev_line)
+                        qty_line_index = idx - 1
+                    else:
+                        match_end = re.search(r"\s+(\d+)$", prev_line)
+                        if match_end:
+                            qty = int(match_end.group(1))
+                            lines[idx-1] = prev_line[:match_end.start()].strip()
+                            qty_line_index = idx - 1
+                break
+        p_name_pdf = ""
+        if qty_line_index > 1:
+            p_name_pdf = " ".join(lines[1:qty_line_index])
+        elif len(lines) > 1 and qty_line_index == -1:
+            name_parts = []
+            for line in lines[1:]:
+                if re.search(r"\d+\.0000|\b\d{12,14}\b", line): break
+                name_parts.append(line)
+            p_name_pdf = " ".join(name_parts)
+        barcode_val = "未偵測到"
+        search_start = qty_line_index + 1 if qty_line_index != -1 else 0
+        for line in lines[search_start:]:
+            if "N/A" in line or "PAGE" in line.upper() or "Page" in line: continue
+            clean_line = re.sub(r'[\s\*]', '', line)
+            if "*" in line:
+                barcode_val = clean_line
+                break
+            if clean_line.isdigit() and 12 <= len(clean_line) <= 15:
+                barcode_val = clean_line
+                break
+            if clean_line == p_no or clean_line == p_no.replace("-", ""):
+                barcode_val = clean_line
+                break
+        if barcode_val == "未偵測到": barcode_val = "(N/A)"
+        out.append((i, p_no, p_name_pdf, qty, barcode_val, p_date))
+    return out
+
+def legacy_hellobear(texts):
+    out = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip(): continue
+        lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
+        p_no = lines[0] if lines else "Unknown"
+        qty = 1
+        qty_line_index = -1
+        for idx, line in enumerate(lines):
+            if ".0000" in line:
+                qty_line_index = idx
+                match = re.search(r"(\d+)\s*\.0000", line)
+                if match and int(match.group(1)) > 0: qty = int(match.group(1))
+                elif idx > 0 and lines[idx-1].strip().isdigit():
+                    qty = int(lines[idx-1].strip())
+                    qty_line_index = idx - 1
+                break
+        p_name = ""
+        if qty_line_index > 1: p_name = " ".join(lines[1:qty_line_index])
+        elif len(lines) > 1 and qty_line_index == -1: p_name = lines[1]
+        barcode_val = ""
+        if qty_line_index != -1 and qty_line_index < len(lines) - 1:
+            raw_text = "".join(lines[qty_line_index+1:])
+            star_match = re.search(r'\*(.*?)\*', raw_text)
+            if star_match:
+                clean_extracted = re.sub(r'[\s\-]', '', star_match.group(1))
+                clean_extracted = re.sub(r'\(?N/?A\)?', '', clean_extracted, flags=re.IGNORECASE)
+                if clean_extracted: barcode_val = clean_extracted
+            else:
+                fallback_text = re.sub(r'[\s\-]', '', raw_text)
+                fallback_text = re.sub(r'\(?N/?A\)?', '', fallback_text, flags=re.IGNORECASE)
+                fallback_match = re.search(r'[A-Za-z0-9]{5,}', fallback_text)
+                if fallback_match: barcode_val = fallback_match.group(0)
+        if not barcode_val or len(barcode_val) < 4: barcode_val = p_no
+        out.append((i, p_no, p_name, qty, barcode_val, "N/A"))
+    return out
+
+
+def engine(texts, vendor):
+    return [(i, p["p_no"], p["name"], p["qty"], p["barcode"], p["date"])
+            for i, p in iter_parsed_pages(texts, PROFILES[vendor])]
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    rng = random.Random(42)
+    texts = [make_page(i, rng) for i in range(PAGES)]
+
+    for vendor, legacy in (("yummy", legacy_yummy), ("hellobear", legacy_hellobear)):
+        assert legacy(texts) == engine(texts, vendor), f"{vendor}: 解析結果與舊版不一致"
+        old_ms = best_of(legacy, texts)
+        new_ms = best_of(engine, texts, vendor)
+        print(f"{vendor:<10} {PAGES} 頁  舊版 {old_ms:7.2f} ms   新引擎 {new_ms:7.2f} ms   x{old_ms / new_ms:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+收貨掃一箱貨：每件打一次 GET /api/search/?q= vs 一次 POST /api/search/batch
+
+    cd backend && python -m benchmarks.bench_search_batch [列數] [每箱件數]
+
+合成搜尋資料庫 (預設 10 萬列)，在暫存資料夾裡上傳後用 TestClient 走完整的 HTTP 流程
+(路由、分層搜尋、JSON 序列化)，每箱隨機抽條碼 (約一成查無此條碼)，跑多箱取平均，
+並確認兩種做法找到的列相同。
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic_master import make_master_df
+
+CARTONS = 20
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    per_carton = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # unified_api 的資料夾是相對路徑 data/，在暫存資料夾裡跑才不會動到正式的搜尋資料庫
+        os.chdir(tmp)
+        try:
+            from services.unified_api import search_router
+            app = FastAPI()
+            app.include_router(search_router, prefix="/api/search")
+            client = TestClient(app)
+            df = make_master_df(rows)
+            client.post("/api/search/upload", files={"file": ("search.csv", df.to_csv(index=False).encode(), "text/csv")})
+            # 上傳後在背景建索引，等建好 (換上新版本) 再開始量
+            while client.get("/api/search/info").json()["build"]["state"] == "building": time.sleep(0.02)
+
+            rng = random.Random(11)
+            barcodes = df["Barcode"].dropna().tolist()
+            cartons = [[rng.choice(barcodes) if rng.random() > 0.1 else f"000{rng.randrange(10 ** 9)}" for _ in range(per_carton)]
+                       for _ in range(CARTONS)]
+
+            started = time.perf_counter()
+            single = [[client.get("/api/search/", params={"q": code}).json() for code in carton] for carton in cartons]
+            single_ms = (time.perf_counter() - started) * 1000 / CARTONS
+
+            started = time.perf_counter()
+            batch = [client.post("/api/search/batch", json={"codes": carton}).json() for carton in cartons]
+            batch_ms = (time.perf_counter() - started) * 1000 / CARTONS
+
+            for carton, answers, result in zip(cartons, single, batch):
+                for code, answer in zip(carton, answers):
+                    exact = [hit for hit in answer if hit["Barcode"] == code]
+                    assert result["results"].get(code, []) == exact and (code in result["not_found"]) == (not exact)
+            print(f"{rows} 列, 每箱 {per_carton} 件, {CARTONS} 箱")
+            print(f"逐件 GET {single_ms:8.1f} ms / 箱 | 批次 POST {batch_ms:7.1f} ms / 箱")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+/api/search 子字串查詢：pandas str.contains vs 掃整塊搜尋內容 vs trigram 倒排索引
+
+    cd backend && python -m benchmarks.bench_search_ngram [列數]
+
+合成搜尋資料庫 (預設 10 萬列)，每種查詢跑多次取平均，並確認掃描與索引的結果相同 (前 200 筆)。
+舊版是 str.contains(query) 預設 regex 模式，遇到 "(" 之類的字元直接出錯。
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+
+import pandas as pd
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from services.unified_api import _prepare_search_db, SEARCH_TEXT_COL
+
+LIMIT = 200
+ROUNDS = 20
+QUERIES = (
+    ("完整條碼", None),          # 由資料決定
+    ("完整貨號", None),
+    ("常見字 noodles", "noodles"),
+    ("短字串 48", "48"),
+    ("查無資料", "no such product"),
+    ("regex 字元", "(500g"),
+)
+
+
+def legacy_search(df, query_lower):
+    return df[df[SEARCH_TEXT_COL].str.contains(query_lower, na=False)].head(LIMIT)
+
+def avg_ms(fn, rounds=ROUNDS):
+    started = time.perf_counter()
+    for _ in range(rounds): result = fn()
+    return (time.perf_counter() - started) * 1000 / rounds, result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "search_data.csv"), rows)
+        scan_path = shutil.copy(csv_path, os.path.join(tmp, "scan_data.csv"))
+
+        df = _prepare_search_db(table_snapshot.read_table_file(csv_path))
+        started = time.perf_counter()
+        indexed = table_snapshot.build_snapshot(csv_path, _prepare_search_db, "bench", search_only=[SEARCH_TEXT_COL],
+                                                ngram_columns=[SEARCH_TEXT_COL])
+        build_ms = (time.perf_counter() - started) * 1000
+        scanned = table_snapshot.build_snapshot(scan_path, _prepare_search_db, "bench", search_only=[SEARCH_TEXT_COL])
+
+        sample = df.iloc[rows // 2]
+        queries = [(name, q if q is not None else str(sample["Barcode" if "條碼" in name else "ProductCode"]).lower())
+                   for name, q in QUERIES]
+        print(f"{rows} 列, 建快照 + trigram 索引 {build_ms:.0f} ms, 索引 {indexed.storage_bytes()['indexes'] / 1e6:.1f} MB")
+        print(f"{'查詢':<14} {'筆數':>5} {'str.contains':>13} {'掃描':>9} {'trigram':>9}  (ms / 次)")
+        for name, q in queries:
+            try: old_ms = f"{avg_ms(lambda: legacy_search(df, q), 3)[0]:13.2f}"
+            except re.error: old_ms = f"{'regex 錯誤':>13}"
+            scan_ms, expected = avg_ms(lambda: scanned.find(SEARCH_TEXT_COL, q, limit=LIMIT))
+            new_ms, result = avg_ms(lambda: indexed.find(SEARCH_TEXT_COL, q, limit=LIMIT))
+            assert list(result) == list(expected)
+            print(f"{name:<14} {len(result):>5} {old_ms} {scan_ms:9.3f} {new_ms:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+搜尋結果組裝與序列化：DataFrame + iterrows + 預設 JSON vs 整欄取值 + FastJSONResponse
+
+    cd backend && python -m benchmarks.bench_search_payload [列數]
+
+/api/search (200 筆) 與 /api/food_label/search (名稱含 noodles 的所有符合列，含 / 不含 matched_data)，
+從「已經找到的列位置」開始計時到 JSON bytes 為止。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import urllib.parse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from core.fast_json import FastJSONResponse
+from services.master_api import add_status_columns, master_indexes, master_search_columns, strip_status_columns, STATUS_COL
+from services.unified_api import _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, SEARCH_TEXT_COL, SEARCH_RESULT_FIELDS
+from services.food_label_api import get_best_results, clean_val, rank_positions, build_search_results, FOOD_SEARCH_FIELDS
+
+ROUNDS = 5
+
+
+def legacy_search_payload(df):
+    # 舊版 search_barcode：逐列 strip / "NAN" / urllib.parse.quote
+    results = []
+    for _, row in df.iterrows():
+        name_val = str(row.get("Name", row.get("Description", ""))).strip()
+        search_url = row.get("SearchUrl", "").strip()
+        if not search_url:
+            search_url = ("https://www.hktvmall.com/hktv/zh/search_a?keyword=" + urllib.parse.quote(name_val)
+                          if name_val and name_val.upper() != "NAN" else "#")
+        barcode_val = str(row.get("Barcode", "")).strip()
+        results.append({"ProductCode": row.get("ProductCode", row.get("Product_No", "")),
+                        "Barcode": barcode_val if barcode_val.upper() != "NAN" else "",
+                        "Name": name_val if name_val.upper() != "NAN" else "無名稱", "SearchUrl": search_url})
+    return JSONResponse(jsonable_encoder(results)).body
+
+def legacy_food_payload(table, positions):
+    best = get_best_results(table.take(positions)).fillna("")
+    output = []
+    for _, row in best.iterrows():
+        output.append({"Product_No": str(row.get("Product_No", "")), "Barcode": str(row.get("Barcode", "")),
+                       "Name": clean_val(row.get("Name", row.get("Description", ""))), "status": row[STATUS_COL],
+                       "matched_data": strip_status_columns(row.to_dict())})
+    return JSONResponse(jsonable_encoder(output)).body
+
+def new_food_payload(table, positions, fields):
+    return FastJSONResponse(build_search_results(table, rank_positions(table, positions), fields)).body
+
+def best_ms(fn):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "data.csv"), rows)
+        search_path = shutil.copy(csv_path, os.path.join(tmp, "search_data.csv"))
+        master = table_snapshot.build_snapshot(csv_path, add_status_columns, "bench", master_indexes, master_search_columns)
+        search = table_snapshot.build_snapshot(search_path, _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, search_only=[SEARCH_TEXT_COL])
+        raw = table_snapshot.read_table_file(search_path).fillna("")
+
+        positions = search.find(SEARCH_TEXT_COL, "noodles", limit=200)
+        old_ms, old = best_ms(lambda: legacy_search_payload(raw.iloc[positions]))
+        new_ms, new = best_ms(lambda: FastJSONResponse([dict(zip(SEARCH_RESULT_FIELDS, v)) for v in
+                                                         zip(*[search.values(f, positions) for f in SEARCH_RESULT_FIELDS])]).body)
+        assert old == new
+        print(f"/api/search 200 筆                    舊版 {old_ms:8.1f} ms | 新版 {new_ms:7.1f} ms ({len(new) / 1e3:.0f} KB)")
+
+        positions = master.find("Name", "noodles")
+        old_ms, old = best_ms(lambda: legacy_food_payload(master, positions))
+        for fields in (FOOD_SEARCH_FIELDS, [f for f in FOOD_SEARCH_FIELDS if f != "matched_data"]):
+            new_ms, new = best_ms(lambda: new_food_payload(master, positions, fields))
+            label = "含 matched_data" if "matched_data" in fields else "fields=列表欄位"
+            print(f"/api/food_label/search {len(positions)} 筆 {label:<14} 舊版 {old_ms:8.1f} ms | 新版 {new_ms:7.1f} ms "
+                  f"({len(old) / 1e6:.1f} MB → {len(new) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
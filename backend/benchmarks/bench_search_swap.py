@@ -0,0 +1,73 @@
+"""
+更新搜尋資料庫期間的搜尋：背景建索引 + 原子換上
+
+    cd backend && python -m benchmarks.bench_search_swap [列數]
+
+在暫存資料夾裡先上傳一份小的搜尋資料庫，再上傳一份大的 (預設 15 萬列)，
+建置期間另一個 thread 不停地搜尋，統計失敗次數、最長延遲，以及換上新版本前後各回答了幾次。
+上一版在上傳請求裡先刪舊檔再建快照，這段期間的搜尋看到「請先上傳資料庫檔案」，
+下一個搜尋還要自己整份重新載入 (等於下面的建置時間)。
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic_master import make_master_df
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 150000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # unified_api 的資料夾是相對路徑 data/，在暫存資料夾裡跑才不會動到正式的搜尋資料庫
+        os.chdir(tmp)
+        try:
+            from services.unified_api import search_router
+            app = FastAPI()
+            app.include_router(search_router, prefix="/api/search")
+            client = TestClient(app)
+
+            def upload(df, name):
+                client.post("/api/search/upload", files={"file": (name, df.to_csv(index=False).encode(), "text/csv")})
+                while client.get("/api/search/info").json()["build"]["state"] == "building": time.sleep(0.02)
+
+            upload(make_master_df(2000), "old.csv")
+            big = make_master_df(rows)
+            big["Name"] = big["Name"] + " new"
+            body = big.to_csv(index=False).encode()
+
+            stats = {"old": 0, "new": 0, "errors": 0, "max_ms": 0.0}
+            done = threading.Event()
+
+            def searcher():
+                while not done.is_set():
+                    started = time.perf_counter()
+                    response = client.get("/api/search/", params={"q": "product 1", "limit": 1})
+                    stats["max_ms"] = max(stats["max_ms"], (time.perf_counter() - started) * 1000)
+                    if response.status_code != 200 or not response.json(): stats["errors"] += 1
+                    else: stats["new" if response.json()[0]["Name"].endswith(" new") else "old"] += 1
+
+            thread = threading.Thread(target=searcher)
+            thread.start()
+            started = time.perf_counter()
+            client.post("/api/search/upload", files={"file": ("new.csv", body, "text/csv")})
+            upload_ms = (time.perf_counter() - started) * 1000
+            while (info := client.get("/api/search/info").json())["build"]["state"] == "building": time.sleep(0.02)
+            time.sleep(0.2)
+            done.set()
+            thread.join()
+
+            print(f"{rows} 列, 上傳請求 {upload_ms:.0f} ms 就回應, 背景建置 {info['build']['elapsed_ms']:.0f} ms ({info['build']['state']})")
+            print(f"建置期間搜尋：舊版本回答 {stats['old']} 次、新版本 {stats['new']} 次、失敗 {stats['errors']} 次，"
+                  f"最長 {stats['max_ms']:.1f} ms")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
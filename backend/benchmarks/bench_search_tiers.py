@@ -0,0 +1,56 @@
+"""
+分層搜尋 (完全相同 → 開頭相同 → 包含) vs 只有子字串搜尋：掃描器貼上完整條碼 / 貨號
+
+    cd backend && python -m benchmarks.bench_search_tiers [列數]
+
+合成搜尋資料庫 (預設 20 萬列)，隨機抽 200 個完整條碼與貨號，每個查詢的平均耗時 (µs)：
+  子字串      上一版的 /api/search：搜尋字串包含查詢的前 200 筆 (trigram 索引)
+  分層 200    /api/search：條碼 / 貨號完全相同 → 開頭相同 → 包含，湊滿 200 筆
+  分層 1      /api/search?limit=1：完全相同的那一列找到就停
+並確認分層結果的第一筆就是條碼 / 貨號完全相同的那一列。
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from core.search_tiers import tiered_positions
+from services.unified_api import _prepare_search_db, SEARCH_TEXT_COL, SEARCH_KEY_COLUMNS, SEARCH_LIMIT
+
+SAMPLES = 200
+
+
+def avg_us(fn, queries):
+    started = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - started) * 1e6 / len(queries), results
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "search_data.csv"), rows)
+        started = time.perf_counter()
+        table = table_snapshot.build_snapshot(csv_path, _prepare_search_db, "bench", search_only=[SEARCH_TEXT_COL],
+                                              ngram_columns=[SEARCH_TEXT_COL], key_columns=SEARCH_KEY_COLUMNS)
+        build_ms = (time.perf_counter() - started) * 1000
+        print(f"{rows} 列, 建快照 {build_ms:.0f} ms")
+
+        rng = random.Random(7)
+        picked = sorted(rng.sample(range(rows), SAMPLES))
+        for col in SEARCH_KEY_COLUMNS:
+            queries = [v for v in table.values(col, picked) if v]
+            substring = lambda q, n: table.find(SEARCH_TEXT_COL, q.lower(), limit=n)
+            old_us, _ = avg_us(lambda q: substring(q, SEARCH_LIMIT), queries)
+            tiered_us, tiered = avg_us(lambda q: tiered_positions(table, q, SEARCH_KEY_COLUMNS, lambda n: substring(q, n), SEARCH_LIMIT), queries)
+            first_us, first = avg_us(lambda q: tiered_positions(table, q, SEARCH_KEY_COLUMNS, lambda n: substring(q, n), 1), queries)
+            for q, hits, top in zip(queries, tiered, first):
+                assert table.values(col, hits[:1])[0].strip().lower() == q.strip().lower() and list(top) == list(hits[:1])
+            print(f"完整{col:<12} 子字串 {old_us:8.1f} µs | 分層 200 {tiered_us:8.1f} µs | 分層 1 {first_us:6.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
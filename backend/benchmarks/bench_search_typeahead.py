@@ -0,0 +1,54 @@
+"""
+條碼搜尋邊打字邊查：每個按鍵都重新查詢 vs typeahead 快取 (前綴縮小範圍)
+
+    cd backend && python -m benchmarks.bench_search_typeahead [列數]
+
+合成搜尋資料庫 (預設 10 萬列)，模擬 50 位使用者逐字輸入條碼或商品名稱 (每個按鍵一次查詢)，
+比較每次按鍵的平均耗時，並確認兩者回傳的列相同。
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from core.search_cache import TypeaheadCache, SEARCH_CACHE_SIZE
+from services.unified_api import _prepare_search_db, SEARCH_TEXT_COL
+
+LIMIT = 200
+SESSIONS = 50
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "search_data.csv"), rows)
+        table = table_snapshot.build_snapshot(csv_path, _prepare_search_db, "bench", search_only=[SEARCH_TEXT_COL],
+                                              ngram_columns=[SEARCH_TEXT_COL])
+        rng = random.Random(5)
+        sample = table.take(sorted(rng.sample(range(rows), SESSIONS)))
+        typed = []
+        for k, (_, row) in enumerate(sample.iterrows()):
+            text = (row["Barcode"] if k % 2 else row["Name"]).lower()
+            typed += [text[:end] for end in range(1, len(text) + 1)]
+
+        started = time.perf_counter()
+        expected = [table.find(SEARCH_TEXT_COL, q, limit=LIMIT) for q in typed]
+        plain_ms = (time.perf_counter() - started) * 1000 / len(typed)
+
+        cache = TypeaheadCache(SEARCH_CACHE_SIZE)
+        started = time.perf_counter()
+        result = [cache.find(table, "bench", SEARCH_TEXT_COL, q, LIMIT) for q in typed]
+        cached_ms = (time.perf_counter() - started) * 1000 / len(typed)
+
+        assert all(list(a) == list(b) for a, b in zip(expected, result))
+        print(f"{rows} 列, {SESSIONS} 次輸入共 {len(typed)} 個按鍵")
+        print(f"每個按鍵重新查詢 {plain_ms:7.3f} ms | typeahead 快取 {cached_ms:7.3f} ms")
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
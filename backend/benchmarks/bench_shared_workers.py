@@ -0,0 +1,129 @@
+"""
+多個 worker 的記憶體用量：每個 worker 各自一份 pandas 資料表 vs 共用 mmap 快照 (主資料庫與搜尋資料庫)
+
+    cd backend && python -m benchmarks.bench_shared_workers [列數]
+
+開 1 / 2 / 4 個子行程 (spawn，跟 uvicorn --workers 一樣是全新的直譯器) 模擬多個 worker，
+每個行程載入資料表後做 300 次貨號查詢與 3 次子字串搜尋；
+共用快照的 worker 最後再把快照的每個 mmap 分頁都讀一遍 (最壞情況：整份快照都進了每個 worker 的分頁表)。
+所有 worker 都停在查詢完的狀態時，由父行程讀各 worker 的 /proc/<pid>/smaps_rollup：
+  Pss      共用分頁依共用的行程數平分後的用量，加總就是這些 worker 實際佔用的記憶體
+  Private  Private_Clean + Private_Dirty，只有這個 worker 用到的分頁
+兩者都扣掉「只 import、什麼都不載入」的 worker 的基準值 (直譯器與套件本身)。Linux 限定。
+"""
+import gc
+import os
+import sys
+import random
+import tempfile
+import multiprocessing as mp
+
+import numpy as np
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from core.search_tiers import exact_positions
+from services.master_api import (add_status_columns, master_indexes, master_search_columns, master_key_columns,
+                                 MASTER_SNAPSHOT_VARIANT, STATUS_COL)
+from services.unified_api import _prepare_search_db, _load_search_table, SEARCH_TEXT_COL, SEARCH_KEY_COLUMNS, SEARCH_RESULT_FIELDS
+
+LOOKUPS = 300
+QUERIES = ("noodles", "489", "sku-01")
+PAGE = 4096
+
+
+def smaps_rollup_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB": fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"pss": fields["Pss"], "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def dir_mb(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 1e6
+
+def touch_pages(table):
+    # pin() 把快照裡的檔案全部 mmap 起來，再每個分頁讀一個 byte
+    table.pin()
+    for value in table._cache.values():
+        if isinstance(value, np.ndarray): value.reshape(-1).view(np.uint8)[::PAGE].sum()
+        elif value: value[::PAGE]
+
+def load_master(mode, csv_path, rng):
+    if mode == "pandas":
+        # 舊版：每個 worker 自己解析一份完整 DataFrame
+        df = add_status_columns(table_snapshot.read_table_file(csv_path))
+        keys = df["Product_No"].astype(str).str.strip()
+        for _ in range(LOOKUPS): df[keys == f"SKU-{rng.randrange(len(df)):05d}"]
+        for q in QUERIES: df[df["Name"].str.lower().str.contains(q, regex=False)]
+        return df
+    table = table_snapshot.load_table(csv_path, add_status_columns, MASTER_SNAPSHOT_VARIANT, master_indexes, master_search_columns,
+                                      ngram_columns=master_search_columns, key_columns=master_key_columns)
+    for _ in range(LOOKUPS):
+        for pos in table.lookup("product_no", f"SKU-{rng.randrange(len(table)):05d}"): table.row(pos)
+    for q in QUERIES: table.values(STATUS_COL, table.find("Name", q))
+    touch_pages(table)
+    return table
+
+def load_search(mode, csv_path, rng):
+    if mode == "pandas":
+        # 舊版：每個 worker 解析原始檔、組搜尋字串，留著整個 DataFrame
+        df = _prepare_search_db(table_snapshot.read_table_file(csv_path))
+        for _ in range(LOOKUPS): df[df["ProductCode"].str.strip() == f"SKU-{rng.randrange(len(df)):05d}"]
+        for q in QUERIES: df[df[SEARCH_TEXT_COL].str.contains(q, regex=False)]
+        return df
+    table = _load_search_table(csv_path)
+    for _ in range(LOOKUPS):
+        positions = exact_positions(table, f"SKU-{rng.randrange(len(table)):05d}", SEARCH_KEY_COLUMNS)
+        for field in SEARCH_RESULT_FIELDS: table.values(field, positions)
+    for q in QUERIES: table.values("Name", table.find(SEARCH_TEXT_COL, q))
+    touch_pages(table)
+    return table
+
+def worker(kind, mode, csv_path, snapshot_dir, ready, done):
+    table_snapshot.SNAPSHOT_DIR = snapshot_dir
+    loaded = None
+    if mode != "idle":
+        loaded = (load_master if kind == "master" else load_search)(mode, csv_path, random.Random(os.getpid()))
+    ready.release()
+    done.wait()
+    del loaded
+
+def run(kind, mode, csv_path, workers):
+    ctx = mp.get_context("spawn")
+    ready, done = ctx.Semaphore(0), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(kind, mode, csv_path, table_snapshot.SNAPSHOT_DIR, ready, done)) for _ in range(workers)]
+    for p in procs: p.start()
+    for _ in procs: ready.acquire()
+    usage = [smaps_rollup_kb(p.pid) for p in procs]
+    done.set()
+    for p in procs: p.join()
+    return {key: sum(u[key] for u in usage) / 1024 for key in ("pss", "private")}
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        # 上傳時建好一次快照，worker 只負責掛上；同一個檔名只保留一份快照，主資料庫與搜尋資料庫各用一個檔案
+        paths, sizes = {}, {}
+        for kind in ("master", "search"):
+            paths[kind] = write_master_csv(os.path.join(tmp, f"{kind}.csv"), rows)
+            table = load_master("shared", paths[kind], random.Random(0)) if kind == "master" else _load_search_table(paths[kind])
+            sizes[kind] = dir_mb(table.directory)
+            # 父行程不留著 mmap，免得 Pss 也分到父行程頭上
+            del table
+        gc.collect()
+
+        print(f"{rows} 列資料，所有 worker 合計 (MB，已扣掉空 worker 的基準)")
+        for kind in ("master", "search"):
+            print(f"\n[{kind}] 快照大小 {sizes[kind]:.1f} MB")
+            print(f"{'workers':>8} {'pandas Pss':>11} {'pandas Private':>15} {'共用 Pss':>10} {'共用 Private':>13}")
+            for workers in (1, 2, 4):
+                idle, pandas, shared = (run(kind, mode, paths[kind], workers) for mode in ("idle", "pandas", "shared"))
+                print(f"{workers:>8} {pandas['pss'] - idle['pss']:11.1f} {pandas['private'] - idle['private']:15.1f} "
+                      f"{shared['pss'] - idle['pss']:10.1f} {shared['private'] - idle['private']:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+主資料庫 / 搜尋資料庫佔用的記憶體：pandas object 欄位 vs 精簡後的共用快照
+
+    cd backend && python -m benchmarks.bench_table_memory [列數]
+
+舊版每個 worker 各自一份 dtype=str 的 DataFrame (搜尋資料庫再多一欄把整列接起來的 _combined_search_text，
+等於第二份資料表)，以 memory_usage(deep=True) 估算；快照則是 storage_bytes() 回報的檔案大小
+(字典編碼、uint32 起點、搜尋字串只存一份小寫內容、搜尋資料庫只留回傳用的欄位)，由所有 worker 共用。
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import pandas as pd
+
+from benchmarks.synthetic_master import write_master_csv
+from core import table_snapshot
+from services.master_api import add_status_columns, master_indexes, master_search_columns
+from services.unified_api import _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, SEARCH_TEXT_COL
+
+
+def legacy_search(path):
+    df = pd.read_csv(path, dtype=str, encoding='utf-8-sig').fillna("")
+    df[SEARCH_TEXT_COL] = df.astype(str).agg(' '.join, axis=1).str.lower()
+    return df
+
+def mb(n):
+    return f"{n / 1e6:8.1f}"
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    with tempfile.TemporaryDirectory() as tmp:
+        table_snapshot.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+        csv_path = write_master_csv(os.path.join(tmp, "data.csv"), rows)
+        print(f"{rows} 列, CSV {os.path.getsize(csv_path) / 1e6:.1f} MB (單位 MB)")
+        print(f"{'':<6} {'pandas':>8} {'快照合計':>8} {'欄位':>8} {'搜尋':>8} {'索引':>8}")
+
+        master_df = add_status_columns(table_snapshot.read_table_file(csv_path))
+        master = table_snapshot.build_snapshot(csv_path, add_status_columns, "bench", master_indexes, master_search_columns)
+        # 同一份原始檔的其他快照會被當成舊版本刪掉，搜尋資料庫用另一個檔名
+        search_path = shutil.copy(csv_path, os.path.join(tmp, "search_data.csv"))
+        search_df = legacy_search(search_path)
+        search = table_snapshot.build_snapshot(search_path, _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, search_only=[SEARCH_TEXT_COL])
+        for name, df, table in (("主資料庫", master_df, master), ("搜尋資料庫", search_df, search)):
+            sizes = table.storage_bytes()
+            print(f"{name:<6} {mb(df.memory_usage(deep=True).sum())} {mb(sizes['total'])} {mb(sizes['columns'])} {mb(sizes['search'])} {mb(sizes['indexes'])}")
+
+
+if __name__ == "__main__":
+    main()
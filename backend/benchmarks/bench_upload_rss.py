@@ -0,0 +1,66 @@
+"""
+上傳落地方式的記憶體高峰 (peak RSS) 比較
+
+    cd backend && python -m benchmarks.bench_upload_rss
+
+每種模式在獨立的子 Process 中執行，模擬 Starlette 已經收好的 UploadFile，
+比較「await file.read() + BytesIO」與「core.uploads.save_upload 串流落地」兩種做法
+打開一份約 80 MB 的揀貨單並萃取所有頁面文字時的 RSS 高峰。
+"""
+import asyncio
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+PAGES = 300
+PADDING_MB = 80
+
+
+def _rss_mb():
+    # ru_maxrss 會繼承父 Process 的高峰，Linux 上優先讀 /proc 的 VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def _run(mode, pdf_path):
+    from fastapi import UploadFile
+    from pypdf import PdfReader
+    from core.uploads import save_upload, remove_quietly
+
+    before = _rss_mb()
+    upload = UploadFile(file=open(pdf_path, "rb"), filename="pick_list.pdf")
+    if mode == "bytes":
+        file_bytes = await upload.read()
+        reader = PdfReader(io.BytesIO(file_bytes))
+        texts = [p.extract_text() for p in reader.pages]
+    else:
+        tmp_path, _ = await save_upload(upload, "bench")
+        with open(tmp_path, "rb") as f:
+            reader = PdfReader(f)
+            texts = [p.extract_text() for p in reader.pages]
+        remove_quietly(tmp_path)
+    print(f"{mode:<8} pages={len(texts)}  peak RSS 增加 {_rss_mb() - before:7.1f} MB")
+
+def main():
+    if len(sys.argv) == 3:
+        asyncio.run(_run(sys.argv[1], sys.argv[2]))
+        return
+
+    from benchmarks.synthetic_pdf import write_pick_list
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = write_pick_list(os.path.join(tmp, "pick_list.pdf"), PAGES, padding_mb=PADDING_MB)
+        print(f"測試檔案 {os.path.getsize(pdf_path) / 1024 / 1024:.1f} MB, {PAGES} 頁")
+        env = dict(os.environ, MAX_UPLOAD_MB_BENCH="500")
+        for mode in ("bytes", "stream"):
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_upload_rss", mode, pdf_path], check=True, env=env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+揀貨單上傳：第一筆 item 出現的時間 (time-to-first-item) vs 整份解析完成的時間
+
+    cd backend && python -m benchmarks.bench_upload_stream
+
+直接呼叫各供應商的 process_*_pdf (不經過快取)，用 on_item 記錄第一筆 item 的時間。
+一次性回應要等 total 才看得到任何結果；?stream=true 的 NDJSON 回應在 first item 就開始送出。
+"""
+import os
+import shutil
+import tempfile
+import time
+
+PAGES = 300
+
+
+def _measure(process, src_pdf, tmp):
+    pdf_path = os.path.join(tmp, "upload.pdf")
+    shutil.copyfile(src_pdf, pdf_path)
+    first = []
+    started = time.perf_counter()
+    items, _, out_token = process(pdf_path, None, lambda item: first or first.append(time.perf_counter()))
+    total = time.perf_counter() - started
+    return (first[0] - started) * 1000, total * 1000, len(items)
+
+def main():
+    from benchmarks.synthetic_pdf import write_pick_list
+    from services.download_api import _src_path
+    from services.yummy_api import process_yummy_pdf
+    from services.homey_api import process_homey_pdf
+    from services.anymall_api import process_anymall_pdf
+    from services.hello_api import process_hellobear_pdf
+
+    vendors = [("yummy", process_yummy_pdf), ("homey", process_homey_pdf),
+               ("anymall", process_anymall_pdf), ("hellobear", process_hellobear_pdf)]
+    with tempfile.TemporaryDirectory() as tmp:
+        src_pdf = write_pick_list(os.path.join(tmp, "pick_list.pdf"), PAGES)
+        print(f"{PAGES} 頁揀貨單 (不使用解析快取)")
+        for vendor, process in vendors:
+            first_ms, total_ms, count = _measure(process, src_pdf, tmp)
+            print(f"{vendor:<10} items={count:<4} first item {first_ms:8.1f} ms   total {total_ms:8.1f} ms")
+    # content_hash=None 時下載來源檔固定叫 src_None.pdf，測完順手清掉
+    if os.path.exists(_src_path(None)): os.remove(_src_path(None))
+
+
+if __name__ == "__main__":
+    main()
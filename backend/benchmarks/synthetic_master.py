@@ -0,0 +1,41 @@
+"""
+產生效能測試用的合成主資料庫 / 搜尋資料庫 (欄位與實際 3PL 主資料庫相同)。
+貨號 SKU-00000 起跳，與 bench_pick_list_parser.make_page 的揀貨單貨號對得上。
+"""
+import random
+
+import pandas as pd
+
+COLUMNS = ["Product_No", "Barcode", "Name", "Description", "Label_Type", "Serving_Size", "Energy", "Protein",
+           "Total_Fat", "Carb", "Sodium", "Ingredients", "Net Content", "Expiry_Date_Format", "Madeby",
+           "Cautions", "FEATURES", "警告字眼"]
+
+
+def make_master_df(rows, seed=7):
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        kind = rng.random()
+        row = dict.fromkeys(COLUMNS, "")
+        row.update({
+            "Product_No": f"SKU-{i:05d}",
+            "Barcode": f"489{rng.randint(10**9, 10**10 - 1)}",
+            "Name": f"Product {i} {rng.choice(['Cookies', 'Shampoo', 'Noodles', 'Spray', 'Tea'])} {rng.randint(50, 900)}g",
+            "Description": f"Description of item {i}",
+            "Net Content": f"{rng.randint(50, 900)}g",
+        })
+        if kind < 0.35:
+            row.update({"Label_Type": "Food", "Serving_Size": "30g", "Energy": f"{rng.randint(50, 500)}kcal",
+                        "Protein": "2g", "Total_Fat": "5g", "Carb": "20g", "Sodium": "60mg",
+                        "Ingredients": "Wheat flour, sugar, palm oil, salt", "Expiry_Date_Format": "DD/MM/YYYY",
+                        "Madeby": "Sample Foods Ltd."})
+        elif kind < 0.45:
+            row.update({"Label_Type": "蟲蟲", "FEATURES": "Lasts 8 hours", "警告字眼": "Flammable"})
+        elif kind < 0.6:
+            row.update({"Cautions": "Keep out of reach of children"})
+        records.append(row)
+    return pd.DataFrame(records, columns=COLUMNS)
+
+def write_master_csv(path, rows, seed=7):
+    make_master_df(rows, seed).to_csv(path, index=False, encoding="utf-8-sig")
+    return path
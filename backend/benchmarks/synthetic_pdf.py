@@ -0,0 +1,47 @@
+"""
+產生效能測試用的合成揀貨單 PDF (純文字頁面，不需要額外套件)。
+"""
+import random
+
+from benchmarks.bench_pick_list_parser import make_page
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def build_pdf(page_texts, padding_bytes=0):
+    """
+    把每個字串畫成一頁 PDF，回傳 bytes。
+    padding_bytes > 0 時附加一個未被引用的二進位 stream，用來模擬夾帶大量圖片的大檔。
+    """
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        ops = ["BT /F1 10 Tf 20 800 Td 12 TL"] + [f"({_escape(l)}) Tj T*" for l in text.split("\n")] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objs.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objs)} 0 R "
+                     f"/Resources << /Font << /F1 3 0 R >> >> >>").encode())
+        kids.append(len(objs))
+    if padding_bytes:
+        objs.append(b"<< /Length %d >>\nstream\n" % padding_bytes + random.randbytes(padding_bytes) + b"\nendstream")
+    objs[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+def write_pick_list(path, pages, padding_mb=0, seed=42):
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        f.write(build_pdf([make_page(i, rng) for i in range(pages)], int(padding_mb * 1024 * 1024)))
+    return path
@@ -0,0 +1,73 @@
+import io
+import os
+import base64
+from functools import lru_cache
+import barcode
+from barcode.writer import ImageWriter
+
+# ========================================================
+# 🌟 共用條碼服務
+# 以前 anymall / hellobear / homey 每個要列印的 item 都重新用 Pillow 畫一次 Code128 PNG 再 base64，
+# 同一個 SKU 出現在很多張揀貨單上也一樣重畫。現在統一走這裡：
+#   - 以 (條碼內容, 格式, 參數) 為 key 的 LRU 快取 (BARCODE_CACHE_SIZE，預設 4096 個)
+#   - svg 模式 (預設)：直接由條碼的黑白模組組出一條 <path>，比 PNG base64 小、列印也不會糊
+#   - png 模式：與舊版完全相同的 ImageWriter 輸出 (BARCODE_IMAGE_FORMAT=png)
+# barcode_cache_stats() 提供命中率，掛在 /api/cache_stats。
+# ========================================================
+
+BARCODE_IMAGE_FORMAT = os.getenv("BARCODE_IMAGE_FORMAT", "svg").lower()
+BARCODE_CACHE_SIZE = int(os.getenv("BARCODE_CACHE_SIZE", "4096"))
+
+# 與舊版 ImageWriter 的預設一致 (單位 mm)
+MODULE_WIDTH = 0.2
+MARGIN_TOP = 1.0
+
+def _png_data_uri(value, module_height, quiet_zone):
+    rv = io.BytesIO()
+    barcode.get_barcode_class('code128')(value, writer=ImageWriter()).write(
+        rv, options={"write_text": False, "module_height": module_height, "quiet_zone": quiet_zone})
+    return "data:image/png;base64," + base64.b64encode(rv.getvalue()).decode("utf-8")
+
+def _svg_data_uri(value, module_height, quiet_zone):
+    modules = barcode.get_barcode_class('code128')(value).build()[0]
+    # viewBox 以「一個模組寬」為單位；每條黑線用 h 畫、白色間隔用 m 跳過，一個 <path> 畫完整個條碼
+    quiet = quiet_zone / MODULE_WIDTH
+    bar_height = module_height / MODULE_WIDTH
+    margin = MARGIN_TOP / MODULE_WIDTH
+    width = len(modules) + 2 * quiet
+    height = bar_height + 2 * margin
+
+    def fmt(n): return f"{n:g}"
+
+    parts = [f"M{fmt(quiet)} {fmt(margin + bar_height / 2)}"]
+    run_char, run_len = modules[0], 0
+    for ch in modules + "x":
+        if ch == run_char:
+            run_len += 1
+            continue
+        parts.append(f"h{run_len}" if run_char == "1" else f"m{run_len} 0")
+        run_char, run_len = ch, 1
+    svg = (f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {fmt(width)} {fmt(height)}' shape-rendering='crispEdges'>"
+           f"<path d='{''.join(parts)}' stroke='#000' stroke-width='{fmt(bar_height)}'/></svg>")
+    # SVG 是純文字，只跳脫 data URI 裡不安全的字元，不必 base64 (省 1/3 大小)
+    return "data:image/svg+xml," + svg.replace("%", "%25").replace("#", "%23").replace("<", "%3C").replace(">", "%3E")
+
+@lru_cache(maxsize=BARCODE_CACHE_SIZE)
+def _cached_data_uri(value, image_format, module_height, quiet_zone):
+    try:
+        if image_format == "png": return _png_data_uri(value, module_height, quiet_zone)
+        return _svg_data_uri(value, module_height, quiet_zone)
+    except: return ""
+
+def barcode_data_uri(value, image_format=None, module_height=10.0, quiet_zone=1.0):
+    """回傳可直接放進 <img src> 的 Code128 條碼 data URI；無法編碼時回傳空字串 (與舊版相同)。"""
+    return _cached_data_uri(str(value), (image_format or BARCODE_IMAGE_FORMAT).lower(), float(module_height), float(quiet_zone))
+
+def barcode_cache_stats():
+    info = _cached_data_uri.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+        "image_format": BARCODE_IMAGE_FORMAT,
+    }
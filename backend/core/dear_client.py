@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from typing import Dict, Any, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ========================================================
+# 🌟 共用的 DEAR 庫存 API 連線 (keep-alive 連線池)
+# 以前 /api/inventory 每個請求都 new 一個 DearAPIClient，裡面直接呼叫 requests.get：
+# 每次呼叫都重新做一次 TCP + TLS 握手，查一個 SKU 要呼叫兩次 (Product + 庫存) 就握手兩次。
+# 現在整個 process 共用一個 requests.Session：
+#   - 連線用完放回連線池，下一次呼叫直接沿用 (DEAR_POOL_SIZE 條，預設 10，與 threadpool 併發數相近)
+#   - 連線 / 讀取各自有逾時 (DEAR_CONNECT_TIMEOUT / DEAR_READ_TIMEOUT 秒)，不會因為 DEAR 卡住而無限等待
+#   - DEAR_API_BASE_URL 可以換成本機的假伺服器 (測試 / benchmark 用)
+# dear_client_stats() 提供每個 endpoint 的呼叫次數、平均 / 最長耗時，以及實際開了幾條連線，
+# 掛在 /api/cache_stats。
+# ========================================================
+
+DEAR_API_BASE_URL = os.getenv("DEAR_API_BASE_URL", "https://inventory.dearsystems.com/ExternalApi/v2/")
+DEAR_POOL_SIZE = int(os.getenv("DEAR_POOL_SIZE", "10"))
+DEAR_CONNECT_TIMEOUT = float(os.getenv("DEAR_CONNECT_TIMEOUT", "5"))
+DEAR_READ_TIMEOUT = float(os.getenv("DEAR_READ_TIMEOUT", "30"))
+# 觸發速率限制 (429 / 503) 時等待幾秒再重試
+DEAR_RETRY_WAIT = float(os.getenv("DEAR_RETRY_WAIT", "2"))
+
+class DearAPIClient:
+    BASE_URL = DEAR_API_BASE_URL
+
+    def __init__(self, account_id: str, application_key: str, base_url: str = None,
+                 pool_size: int = DEAR_POOL_SIZE, timeout=(DEAR_CONNECT_TIMEOUT, DEAR_READ_TIMEOUT)):
+        self.base_url = base_url or self.BASE_URL
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.headers = {
+            "api-auth-accountid": account_id,
+            "api-auth-applicationkey": application_key,
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._adapter = adapter
+        self._lock = threading.Lock()
+        self._calls = {}   # endpoint -> {"calls", "errors", "retries", "total_ms", "max_ms"}
+
+    def _record(self, endpoint, elapsed, retries, error):
+        ms = elapsed * 1000
+        with self._lock:
+            entry = self._calls.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["retries"] += retries
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        url = f"{self.base_url}{endpoint}"
+        if params is None:
+            params = {}
+
+        started, retries, error = time.perf_counter(), 0, False
+        try:
+            while True:
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+
+                    if response.status_code == 429 or response.status_code == 503:
+                        print(f"⚠️ 觸發 API 速率限制，等待 {DEAR_RETRY_WAIT:g} 秒後重試...")
+                        retries += 1
+                        time.sleep(DEAR_RETRY_WAIT)
+                        continue
+
+                    response.raise_for_status()
+
+                    if not response.text.strip():
+                        return {}
+
+                    try:
+                        return response.json()
+                    except ValueError:
+                        print(f"⚠️ API 回傳了非 JSON 格式的內容: {response.text[:100]}")
+                        return {}
+
+                except requests.exceptions.HTTPError as e:
+                    if response.status_code == 404:
+                        return {}
+                    error = True
+                    raise Exception(f"DEAR API 錯誤 ({response.status_code}): {response.text}")
+                except Exception as e:
+                    error = True
+                    raise Exception(f"連線失敗: {str(e)}")
+        finally:
+            self._record(endpoint, time.perf_counter() - started, retries, error)
+
+    def get_product_info(self, sku: str) -> dict:
+        params = {"SKU": sku}
+        response_data = self._make_request("Product", params)
+        products = response_data.get("Products", [])
+
+        if products:
+            p = products[0]
+            barcode_val = (
+                p.get("Barcode") or
+                p.get("UPC") or
+                p.get("AdditionalAttribute1") or
+                p.get("AdditionalAttribute2") or
+                p.get("AdditionalAttribute3")
+            )
+
+            return {
+                "Name": p.get("Name", "-"),
+                "SKU": p.get("SKU", "-"),
+                "UPC": str(barcode_val).strip() if barcode_val else "-",
+                "UOM": p.get("UOM", "個")
+            }
+        return {}
+
+    def get_inventory_by_sku(self, sku: str) -> List[Dict[str, Any]]:
+        params = {"SKU": sku}
+        response_data = self._make_request("ref/productavailability", params)
+
+        if isinstance(response_data, dict):
+            return response_data.get("ProductAvailabilityList", [])
+        elif isinstance(response_data, list):
+            return response_data
+        return []
+
+    def stats(self):
+        # urllib3 每個 host 一個連線池：num_connections = 實際開過幾條連線，num_requests = 送出幾個請求
+        pools = self._adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys())
+        sent = sum(pools[key].num_requests for key in pools.keys())
+        with self._lock:
+            return {
+                "base_url": self.base_url, "pool_size": self.pool_size,
+                "timeout": list(self.timeout), "connections_opened": opened, "requests_sent": sent,
+                "endpoints": {endpoint: {"calls": e["calls"], "errors": e["errors"], "retries": e["retries"],
+                                         "avg_ms": round(e["total_ms"] / e["calls"], 3), "max_ms": round(e["max_ms"], 3)}
+                              for endpoint, e in self._calls.items()},
+            }
+
+    def close(self):
+        self.session.close()
+
+# 整個 process 共用一個 client；金鑰換了 (環境變數更新) 才重建
+_dear_client = None
+_dear_client_lock = threading.Lock()
+
+def get_dear_client(account_id: str, application_key: str) -> DearAPIClient:
+    global _dear_client
+    with _dear_client_lock:
+        client, old = _dear_client, None
+        if client is None or client.headers["api-auth-accountid"] != account_id \
+                or client.headers["api-auth-applicationkey"] != application_key:
+            old, client = client, DearAPIClient(account_id=account_id, application_key=application_key)
+            _dear_client = client
+    # 換掉的 client 關閉連線池：閒置連線立刻關掉，還在途的請求照常跑完，連線用完不再放回池裡
+    if old is not None: old.close()
+    return client
+
+def dear_client_stats():
+    client = _dear_client
+    return client.stats() if client is not None else {"base_url": DEAR_API_BASE_URL, "pool_size": DEAR_POOL_SIZE,
+                                                       "timeout": [DEAR_CONNECT_TIMEOUT, DEAR_READ_TIMEOUT],
+                                                       "connections_opened": 0, "requests_sent": 0, "endpoints": {}}
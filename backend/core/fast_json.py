@@ -0,0 +1,28 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ========================================================
+# 🌟 搜尋結果的快速 JSON 回應
+# 直接回傳 list[dict] 時，FastAPI 會先跑一次 jsonable_encoder (逐個值檢查型別、複製一份)，
+# 再用標準 json 序列化；搜尋一次幾百筆、每筆還帶整列 matched_data 時很明顯。
+# FastJSONResponse 跳過 jsonable_encoder，有安裝 orjson 就用它 (沒有時退回標準 json，輸出相同)。
+# ========================================================
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        if orjson is not None: return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return super().render(content)
+
+def select_fields(fields, allowed):
+    """?fields=a,b 的欄位投影：未指定時回傳全部 allowed，有不認得的欄位時回傳 400。"""
+    if not fields: return list(allowed)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"fields 只能是 {', '.join(allowed)} 的組合")
+    return selected
@@ -0,0 +1,74 @@
+import os
+import base64
+import hashlib
+import threading
+
+# ========================================================
+# 🌟 標籤字體
+# 以前每次 /api/yummy/upload、/api/food_label/generate_html、Homey 解析都重新讀 font1.ttf 再 base64，
+# 中文字體好幾 MB，CPU 與回應大小都浪費在同一份資料上。現在：
+#   - 字體內容的指紋 (SHA-256 前 16 碼) 與 base64 CSS 都依檔案 mtime 快取，換字體時自動重算
+#   - 預設 (FONT_CSS_MODE=url) 的 CSS 只引用 /api/fonts/<指紋>.ttf，瀏覽器下載一次後長期快取
+#   - FONT_CSS_MODE=inline 時維持舊版把整個字體 base64 嵌進 CSS 的做法
+# ========================================================
+
+DATA_DIR = "data"
+# 🌟 修改預設字體為 msyh.ttf
+DEFAULT_FONT_PATH = os.path.join(DATA_DIR, "font1.ttf")
+FONT_CSS_MODE = os.getenv("FONT_CSS_MODE", "url").lower()
+# 前端的列印視窗是 about:blank，字體網址必須是後端的完整網址；未設定時由請求推算
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+# 標籤 HTML 裡留給前端替換字體 CSS 的位置
+FONT_CSS_PLACEHOLDER = "/* FONT_CSS_PLACEHOLDER */"
+
+_FONT_FAMILY_CSS = "body, .label-container, .label-box, div, span { font-family: 'CustomLabelFont', 'Microsoft YaHei', 'PingFang SC', 'Heiti SC', Helvetica, Arial, sans-serif !important; }"
+
+_lock = threading.Lock()
+_cache = {}   # (路徑, 種類) -> (mtime_ns, size, 值)
+
+def _cached(font_path, kind, build):
+    try:
+        st = os.stat(font_path)
+    except OSError:
+        return None
+    key = (font_path, kind)
+    with _lock:
+        hit = _cache.get(key)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size: return hit[2]
+    value = build()
+    with _lock:
+        _cache[key] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+def _read(font_path):
+    with open(font_path, "rb") as f: return f.read()
+
+def font_fingerprint(font_path=DEFAULT_FONT_PATH):
+    """字體內容的指紋；字體不存在時回傳 None。"""
+    return _cached(font_path, "fingerprint", lambda: hashlib.sha256(_read(font_path)).hexdigest()[:16])
+
+def font_to_base64_css(font_path=DEFAULT_FONT_PATH):
+    def build():
+        b64_str = base64.b64encode(_read(font_path)).decode('utf-8')
+        # 🌟 加上微軟雅黑與蘋方作為 Fallback 字型
+        return f"@font-face {{ font-family: 'CustomLabelFont'; src: url(data:font/ttf;base64,{b64_str}) format('truetype'); font-weight: bold; font-style: normal; }} {_FONT_FAMILY_CSS}"
+    try: return _cached(font_path, "base64_css", build) or ""
+    except: return ""
+
+def public_base_url(request):
+    if PUBLIC_BASE_URL: return PUBLIC_BASE_URL
+    # Render 等反向代理後面 request.url 是 http，依 X-Forwarded-Proto 還原成 https，避免混合內容被擋
+    proto = request.headers.get("x-forwarded-proto", request.url.scheme).split(",")[0].strip()
+    host = request.headers.get("x-forwarded-host", request.headers.get("host", request.url.netloc))
+    return f"{proto}://{host}"
+
+def font_url(font_path=DEFAULT_FONT_PATH):
+    fingerprint = font_fingerprint(font_path)
+    return f"/api/fonts/{fingerprint}.ttf" if fingerprint else None
+
+def font_face_css(request, font_path=DEFAULT_FONT_PATH):
+    """回傳標籤用的字體 CSS：預設只引用指紋網址，FONT_CSS_MODE=inline 時嵌入整個字體。"""
+    if FONT_CSS_MODE == "inline": return font_to_base64_css(font_path)
+    url = font_url(font_path)
+    if not url: return ""
+    return f"@font-face {{ font-family: 'CustomLabelFont'; src: url({public_base_url(request)}{url}) format('truetype'); font-weight: bold; font-style: normal; font-display: block; }} {_FONT_FAMILY_CSS}"
@@ -0,0 +1,55 @@
+import os
+import hashlib
+
+# ========================================================
+# 🌟 標籤回應格式
+# 以前每個 item 的 print_html 都是一份完整的 <html><style>...</style> 文件，
+# 而且同一張標籤重複 qty 次，300 行的揀貨單動輒好幾 MB。
+# 現在解析時只保留「一張」標籤：{"style": <head>, "body": 單張內容, "repeat": qty} (由 core.label_templates 產生)，
+# 回應時再決定格式：
+#   compact (預設) → 相同的 <head>/CSS 只在 label_styles 送一次，前端列印時才展開 repeat
+#   full           → 跟以前一樣在 print_html 放完整文件 (?label_format=full，方便比較大小)
+# ========================================================
+
+LABEL_FORMATS = ("compact", "full")
+DEFAULT_LABEL_FORMAT = os.getenv("LABEL_RESPONSE_FORMAT", "compact")
+LABEL_TAIL = "</body></html>"
+
+def render_label(label):
+    """展開成舊版的完整 HTML 文件 (內容重複 repeat 次)。"""
+    if not label: return ""
+    if not label["style"]: return label["body"]
+    return label["style"] + label["body"] * label["repeat"] + LABEL_TAIL
+
+def style_id(style):
+    return hashlib.sha1(style.encode("utf-8")).hexdigest()[:12]
+
+def resolve_label_format(label_format):
+    label_format = (label_format or DEFAULT_LABEL_FORMAT).lower()
+    return label_format if label_format in LABEL_FORMATS else "compact"
+
+def format_item(item, label_format, styles):
+    """
+    依 label_format 轉成回應用的 item (不修改快取裡的原始 item)。
+    compact 模式下第一次遇到的樣式會寫進 styles {id: <head>}。
+    """
+    if "label" not in item: return item   # 舊版快取或沒有標籤欄位，原樣回傳
+    out = dict(item)
+    label = out.pop("label")
+    if label_format == "full":
+        out["print_html"] = render_label(label)
+        return out
+    if not label:
+        out["label"] = None
+        return out
+    sid = style_id(label["style"])
+    if sid not in styles: styles[sid] = label["style"]
+    out["label"] = {"style": sid, "body": label["body"], "repeat": label["repeat"]}
+    return out
+
+def format_items(items, label_format):
+    """回傳 (items, label_styles)；full 模式 label_styles 為 None。"""
+    label_format = resolve_label_format(label_format)
+    styles = {}
+    formatted = [format_item(item, label_format, styles) for item in items]
+    return formatted, (styles if label_format == "compact" else None)
@@ -0,0 +1,378 @@
+import os
+import re
+from functools import lru_cache
+
+# ========================================================
+# 🌟 標籤樣板 (食品 / 警告 / 蟲蟲 / Repack / Anymall / HelloBear)
+# 以前每個 item 都重新格式化一整份 f-string，再用 regex 找出 <body> 並對整份文件 replace 才能重複 qty 次。
+# 現在每個樣板在載入時就拆好：
+#   - <head> 只有 ${font_css} 一個空位，依 (樣板, font_css) 放進 LRU 快取，同一種標籤共用同一個字串
+#     (font_css 含請求推算出的字體網址，Host / scheme 不同就是不同的 key，所以快取有上限 LABEL_STYLE_CACHE_SIZE)
+#   - <body> 預先切成「固定文字 / 空位」的 list，render 時只把欄位值接起來
+# 重複 qty 次交給 core.label_format (回應時或前端列印時才展開)，不再需要 regex。
+# 空位寫法是 ${欄位名稱}，與 CSS 的大括號不會衝突。
+# 揀貨單的解析結果會連同標籤一起快取，改了樣板或標籤結構請一併更換 core.parse_cache 的 PARSED_ITEMS_FORMAT。
+# ========================================================
+
+_SLOT = re.compile(r"\$\{(\w+)\}")
+LABEL_STYLE_CACHE_SIZE = int(os.getenv("LABEL_STYLE_CACHE_SIZE", "64"))
+
+class LabelTemplate:
+    def __init__(self, name, source):
+        self.name = name
+        head, sep, rest = source.partition("<body>")
+        body, _, _ = rest.rpartition("</body>")
+        self._head = _SLOT.split(head + sep)
+        self._body = _SLOT.split(body)
+        # split 後偶數位置是固定文字、奇數位置是欄位名稱
+        self.fields = tuple(self._body[1::2])
+
+    def style(self, font_css=""):
+        return _cached_style(self, font_css)
+
+    def body(self, values):
+        parts = self._body[:]
+        parts[1::2] = [str(values[name]) for name in self.fields]
+        return "".join(parts)
+
+    def render(self, qty, font_css="", **values):
+        """回傳 core.label_format 的標籤格式 {"style", "body", "repeat"}。"""
+        return {"style": self.style(font_css), "body": self.body(values), "repeat": max(int(qty), 0)}
+
+# 食品標籤 (70x50mm，營養標示 + 成分 + 最佳食用日期)
+FOOD_TEMPLATE = """
+    <html><head><style>
+        ${font_css}
+        @page { size: auto; margin: 0mm; }
+        
+        body { 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+        }
+        
+        .label-container { 
+            width: 70mm; 
+            height: 50mm; 
+            position: relative; 
+            box-sizing: border-box; 
+            border: 1px solid #ddd; 
+            page-break-after: always; 
+            overflow: hidden; 
+            font-weight: bold; 
+        }
+        
+        .barcode-text { 
+            position: absolute; 
+            left: 2mm; 
+            top: 2mm; 
+            font-size: 5pt; 
+            font-weight: bold; 
+        }
+        
+        .desc-text { 
+            position: absolute; 
+            left: 2mm; 
+            top: 4.5mm; 
+            width: 59mm; 
+            font-size: 5pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+        }
+        
+        .line1 { 
+            position: absolute; 
+            left: 0; 
+            top: 9mm; 
+            width: 70mm; 
+            border-top: 1.42pt solid black; 
+        }
+        
+        .nutri-box {   
+            position: absolute; 
+            left: 2mm; 
+            top: 10mm; 
+            width: 23mm; 
+            font-size: 4.5pt; /* 统一改字体大小 */
+            line-height: 1.25; /* 统一改行距 */
+            font-weight: bold; 
+        }
+        
+        .nutri-title { 
+            font-weight: bold; 
+            margin-bottom: 1px; 
+        }
+        
+        .nutri-row { 
+            display: flex; 
+            justify-content: space-between; 
+        }
+        
+        .indent { 
+            padding-left: 3px; 
+        }
+        
+        .vline { 
+            position: absolute; 
+            left: 26mm; 
+            top: 9mm; 
+            height: 29mm; 
+            border-left: 1.42pt solid black; 
+        }
+        
+        .line2 { 
+            position: absolute; 
+            left: 0; 
+            top: 38mm; 
+            width: 70mm; 
+            border-top: 1.42pt solid black; 
+        }
+        
+        .mfr-box { 
+            position: absolute; 
+            left: 2mm; 
+            top: 40mm; 
+            width: 35mm; 
+            font-size: 4.76pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+        }
+        
+        .bb-box { 
+            position: absolute; 
+            left: 47mm; 
+            top: 40mm; 
+            width: 27mm; 
+            font-size: 4.2pt; 
+            line-height: 1.2; 
+            font-weight: bold; 
+            white-space: nowrap; 
+        }
+        
+        .ing-box { 
+            position: absolute; 
+            left: 27mm; 
+            top: 10mm; 
+            width: 41mm; 
+            height: 28mm; 
+            font-size: 3.5pt; 
+            line-height: 1.1; 
+            overflow: hidden; 
+            text-align: left; /* 🌟 1. 改成靠左對齊，避免單字被亂拉長 */
+            font-weight: bold; 
+            letter-spacing: 0.2pt; /* 🌟 2. 調整字母與字母之間的距離 (可調 0.1pt ~ 0.5pt) */
+            word-spacing: 0.5pt;   /* 🌟 3. (可選) 調整英文單字與單字之間的距離 */
+        }
+
+        /* 強制全域粗體 */
+        .label-container, .label-container * { 
+            font-weight: 900 !important; 
+        }
+    </style></head><body>
+        <div class="label-container">
+            <div class="barcode-text">${barcode}</div>
+            <div class="desc-text">${desc}</div>
+            <div class="line1"></div>
+            <div class="nutri-box">
+                <div class="nutri-title">Nutrition Information</div>
+                <br>
+                <div class="nutri-row"><span>Serving Size:</span><span>${Serving_Size}</span></div>
+                <div class="nutri-row"><span>Energy:</span><span>${Energy}</span></div>
+                <div class="nutri-row"><span>Protein:</span><span>${Protein}</span></div>
+                <div class="nutri-row"><span>Total fat:</span><span>${Total_Fat}</span></div>
+                <div class="nutri-row indent"><span>- Saturated fat:</span><span>${Sat_Fat}</span></div>
+                <div class="nutri-row indent"><span>- Trans fat:</span><span>${Trans_Fat}</span></div>
+                <div class="nutri-row"><span>Carbohydrates:</span><span>${Carb}</span></div>
+                <div class="nutri-row indent"><span>- Sugars:</span><span>${Sugar}</span></div>
+                <div class="nutri-row"><span>Sodium:</span><span>${Sodium}</span></div>
+                <div class="nutri-row"><span>Net Content:</span><span>${Net_Content}</span></div>
+                <div class="nutri-row"><span>Country Of Origin:</span><span>${Country_Of_Origin}</span></div>
+            </div>
+            <div class="vline"></div>
+            <div class="ing-box">${ingredients}</div>
+            <div class="line2"></div>
+            <div class="mfr-box">${manufacturer}</div>
+            <div class="bb-box">Best before(${en_expiry}):<br>此日期前最佳(${ch_expiry})<br>Show on package(見包裝)</div>
+        </div>
+    </body></html>
+    """
+
+# 警告標籤 (大字置中)
+CAUTION_TEMPLATE = """
+    <html><head><style>
+        ${font_css}
+        @page { size: auto; margin: 0mm; }
+        
+        body { 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+        }
+        
+        .label-container { 
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            padding: 2mm; 
+            page-break-after: always; 
+            display: flex; 
+            align-items: center; 
+            justify-content: center; 
+            text-align: center; 
+        }
+        
+        .caution-text { 
+            font-size: 15pt; 
+            font-weight: 900; 
+            line-height: 1.2; 
+            word-wrap: break-word; 
+            color: black; 
+        }
+        
+        /* 強制全域粗體 */
+        .label-container, .label-container * { 
+            font-weight: 900 !important; 
+        }
+    </style></head><body>
+        <div class="label-container"><div class="caution-text">${text}</div></div>
+    </body></html>
+    """
+
+# 蟲蟲標籤
+INSECT_TEMPLATE = """
+    <html><head><style>
+        ${font_css}
+        @page { size: 70mm 50mm; margin: 0; }
+        
+        body { 
+            margin: 0; 
+            padding: 0; 
+            font-family: Helvetica, Arial, sans-serif; 
+            background-color: white;
+        }
+        
+        .label-box {
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            padding: 3mm 4mm; 
+            overflow: hidden; 
+            background-color: white; 
+            color: black; 
+            font-size: 4pt; 
+            line-height: 1.1; 
+            page-break-after: always;
+        }
+        
+        .insect-row {
+            margin-bottom: 6pt; 
+            word-wrap: break-word; 
+            font-weight: bold; 
+            min-height: 6pt;
+        }
+
+        .label-box, .label-box * { 
+            font-weight: 900 !important; 
+        }
+    </style></head><body>
+        <div class="label-box">
+            <div class="insect-row">
+                <div>${barcode}</div>
+                <div>${desc}</div>
+            </div>
+            <div class="insect-row">${features}</div>
+            <div class="insect-row">${cautions}</div>
+            <div class="insect-row">${net_content}</div>
+            <div class="insect-row">${ingredients}</div>
+            <div style="word-wrap: break-word; font-weight: bold; min-height: 6pt;">${warnings}</div>
+        </div>
+    </body></html>
+    """
+
+# Homey Repack 標籤 (條碼 + 名稱)
+REPACK_TEMPLATE = """
+    <html><head><style>
+        ${font_css}
+        @page { size: 70mm 50mm; margin: 0; }
+        
+        body { 
+            margin: 0; 
+            padding: 0; 
+            background-color: white; 
+        }
+        
+        .label-container {
+            width: 70mm; 
+            height: 50mm; 
+            box-sizing: border-box; 
+            page-break-after: always; 
+            display: flex; 
+            flex-direction: column; 
+            justify-content: center; 
+            align-items: center; 
+            padding-top: 3mm; 
+            overflow: hidden; 
+            text-align: center;
+        }
+        
+        .barcode-text {
+            font-family: monospace; 
+            font-weight: bold; 
+            font-size: 14pt; 
+            margin-top: 2px; 
+            letter-spacing: 1px; 
+            color: black;
+        }
+        
+        .name-text {
+            font-size: 10pt; 
+            font-weight: bold; 
+            margin-top: 6px; 
+            width: 95%; 
+            word-wrap: break-word; 
+            line-height: 1.2; 
+            color: black;
+        }
+
+        .label-container, .label-container * { 
+            font-weight: 900 !important; 
+        }
+    </style></head><body>
+        <div class="label-container">
+            <img src="${barcode_img}" style="height: 18mm; width: 90%; object-fit: contain;">
+            <div class="barcode-text">${barcode}</div>
+            <div class="name-text">${name}</div>
+        </div>
+    </body></html>
+    """
+
+# Anymall 條碼標籤
+ANYMALL_TEMPLATE = """<html><head><style>@page { size: 70mm 50mm; margin: 0; } body { margin: 0; padding: 0; background-color: white; }</style></head><body>
+    <div style="width: 70mm; height: 50mm; box-sizing: border-box; page-break-after: always; display: flex; flex-direction: column; justify-content: center; align-items: center; padding-top: 3mm; overflow: hidden;">
+        <img src="${barcode_img}" style="height: 25mm; width: 90%; object-fit: contain;">
+        <div style="font-family: monospace; font-weight: bold; font-size: 17pt; margin-top: 3px; letter-spacing: 1px; color: black;">${barcode}</div>
+    </div></body></html>"""
+
+# HelloBear 條碼標籤 (條碼 + 名稱)
+HELLOBEAR_TEMPLATE = """<html><head><style>@page { size: 70mm 50mm; margin: 0; } body { margin: 0; padding: 0; background-color: white; }</style></head><body>
+    <div style="width: 70mm; height: 50mm; box-sizing: border-box; page-break-after: always; display: flex; flex-direction: column; justify-content: center; align-items: center; padding-top: 3mm; overflow: hidden; text-align: center;">
+        <img src="${barcode_img}" style="height: 22mm; width: 90%; object-fit: contain;">
+        <div style="font-family: monospace; font-weight: bold; font-size: 14pt; margin-top: 2px; letter-spacing: 1px; color: black;">${barcode}</div>
+        <div style="font-size: 8pt; font-weight: bold; margin-top: 6px; width: 95%; word-wrap: break-word; line-height: 1.2; color: black;">${name}</div>
+    </div></body></html>"""
+
+@lru_cache(maxsize=LABEL_STYLE_CACHE_SIZE)
+def _cached_style(template, font_css):
+    parts = template._head[:]
+    parts[1::2] = [font_css] * (len(parts) // 2)
+    return "".join(parts)
+
+LABEL_TEMPLATES = {
+    name: LabelTemplate(name, source) for name, source in [
+        ("food", FOOD_TEMPLATE), ("caution", CAUTION_TEMPLATE), ("insect", INSECT_TEMPLATE),
+        ("repack", REPACK_TEMPLATE), ("anymall", ANYMALL_TEMPLATE), ("hellobear", HELLOBEAR_TEMPLATE),
+    ]
+}
+
+def render_label_template(template, qty, font_css="", **values):
+    return LABEL_TEMPLATES[template].render(qty, font_css, **values)
@@ -0,0 +1,124 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from core.barcodes import BARCODE_IMAGE_FORMAT
+
+# ========================================================
+# 🌟 揀貨單解析快取 (以上傳檔案的 SHA-256 為 key)
+# 同一份 PDF 重新整理後再上傳、或同時上傳到 /api/yummy 與 /api/inspection，
+# 都直接取回上次萃取的逐頁文字與解析結果，不必再跑一次 pypdf。
+# 資料存在硬碟 (有總大小上限)，記憶體只保留 LRU 索引。
+# ========================================================
+
+PARSE_CACHE_DIR = os.path.join("data", "parse_cache")
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "200"))
+# 快取內容的格式版本，寫進檔名：舊格式的檔案不會再被讀到，由 LRU 自然淘汰
+#   PAGE_TEXTS_FORMAT   逐頁文字的萃取方式 (core.pdf_text) 改變時更換
+#   PARSED_ITEMS_FORMAT 解析規則 (core.pick_list_parser 的 PROFILES)、item 欄位或標籤結構 (core.label_templates) 改變時更換
+# 條碼圖格式 (BARCODE_IMAGE_FORMAT) 是執行期設定，直接併進解析結果的 key
+PAGE_TEXTS_FORMAT = "t1"
+PARSED_ITEMS_FORMAT = "i1"
+
+class ParseCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()   # 檔名 -> 檔案大小，越後面越新
+        self._total = 0
+        self._master_version = None
+        os.makedirs(directory, exist_ok=True)
+        # 重啟後沿用硬碟上既有的快取，依修改時間排出 LRU 順序
+        entries = []
+        for name in os.listdir(directory):
+            if not name.endswith(".pkl"): continue
+            path = os.path.join(directory, name)
+            try: entries.append((os.path.getmtime(path), name, os.path.getsize(path)))
+            except OSError: pass
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total += size
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._index: return None
+            self._index.move_to_end(name)
+        try:
+            with open(self._path(name), "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            self._discard(name)
+            return None
+
+    def put(self, name, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes: return
+        tmp_path = self._path(name) + f".{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f: f.write(data)
+            os.replace(tmp_path, self._path(name))
+        except OSError:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            return
+        with self._lock:
+            self._total -= self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._total += len(data)
+            evicted = []
+            while self._total > self.max_bytes and self._index:
+                old, size = self._index.popitem(last=False)
+                self._total -= size
+                evicted.append(old)
+        for old in evicted:
+            try: os.remove(self._path(old))
+            except OSError: pass
+
+    def _discard(self, name):
+        with self._lock:
+            self._total -= self._index.pop(name, 0)
+        try: os.remove(self._path(name))
+        except OSError: pass
+
+    def invalidate_items(self, master_version):
+        """主資料庫版本改變時，清掉所有依賴主資料庫的解析結果 (逐頁文字不受影響)。"""
+        with self._lock:
+            if master_version == self._master_version: return
+            self._master_version = master_version
+            stale = [n for n in self._index if n.startswith("items_m_") and not n.endswith(f"_{master_version}.pkl")]
+        for name in stale:
+            self._discard(name)
+
+parse_cache = ParseCache(PARSE_CACHE_DIR, int(PARSE_CACHE_MAX_MB * 1024 * 1024))
+
+
+def _safe(value):
+    return "".join(c if c.isalnum() else "-" for c in str(value))
+
+def _texts_name(content_hash):
+    return f"texts_{PAGE_TEXTS_FORMAT}_{content_hash}.pkl"
+
+def _items_name(content_hash, vendor, master_version):
+    # 依賴主資料庫的結果以 items_m_ 開頭，並把版本寫在檔名最後
+    fmt = _safe(f"{PARSED_ITEMS_FORMAT}-{BARCODE_IMAGE_FORMAT}")
+    if master_version is None:
+        return f"items_{fmt}_{vendor}_{content_hash}.pkl"
+    return f"items_m_{fmt}_{vendor}_{content_hash}_{_safe(master_version)}.pkl"
+
+def get_page_texts(content_hash):
+    if not content_hash: return None
+    return parse_cache.get(_texts_name(content_hash))
+
+def put_page_texts(content_hash, texts):
+    if content_hash: parse_cache.put(_texts_name(content_hash), texts)
+
+def get_parsed_items(content_hash, vendor, master_version=None):
+    if not content_hash: return None
+    if master_version is not None: parse_cache.invalidate_items(_safe(master_version))
+    return parse_cache.get(_items_name(content_hash, vendor, master_version))
+
+def put_parsed_items(content_hash, vendor, master_version, value):
+    if content_hash: parse_cache.put(_items_name(content_hash, vendor, master_version), value)
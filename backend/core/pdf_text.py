@@ -0,0 +1,94 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from core.parse_cache import get_page_texts, put_page_texts
+
+# ========================================================
+# 🌟 PDF 逐頁文字萃取 (支援多核心)
+# page.extract_text() 是純 CPU 工作，被 GIL 鎖在單核心上；
+# 大型揀貨單改為切成多段，交給 Process Pool 平行萃取，再依頁碼順序組回。
+# ========================================================
+
+# 平行萃取使用的 Process 數量 (設為 1 即完全關閉多核心模式)
+PDF_EXTRACT_WORKERS = max(1, int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1))))
+# 頁數少於此值的小檔案直接在原本的 thread 裡萃取，省去跨 Process 的成本
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "60"))
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # 用 spawn 避免在 uvicorn 多 thread 的狀態下 fork
+        _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _open_reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        return PdfReader(io.BytesIO(source))
+    return PdfReader(source)
+
+def _extract_range(source, start, end):
+    # 在子 Process 中執行：各自開一份 reader，只萃取自己負責的頁面
+    reader = _open_reader(source)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+def _chunk_ranges(total, workers):
+    # 每個 worker 分到約兩段，讓慢的頁面不會拖住整批
+    chunks = min(total, workers * 2)
+    size, extra = divmod(total, chunks)
+    ranges, start = [], 0
+    for c in range(chunks):
+        end = start + size + (1 if c < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def extract_page_texts(source, reader=None, workers=None, content_hash=None):
+    """
+    回傳每一頁的文字 (list，順序與 reader.pages 相同)。
+    source 可以是檔案路徑或 PDF bytes；reader 若已開好可直接傳入，供小檔案使用。
+    有 content_hash 時先查解析快取，萃取完也會寫回快取供其他端點共用。
+    """
+    return list(iter_page_texts(source, reader, workers, content_hash))
+
+def iter_page_texts(source, reader=None, workers=None, content_hash=None):
+    """與 extract_page_texts 相同，但每萃取完一頁 (多核心模式為一段) 就先交出，供串流回應使用。"""
+    cached = get_page_texts(content_hash)
+    if cached is not None:
+        yield from cached
+        return
+    texts = []
+    for text in _iter_extract(source, reader, workers):
+        texts.append(text)
+        yield text
+    put_page_texts(content_hash, texts)
+
+def _iter_extract(source, reader, workers):
+    global _pool
+    if reader is None: reader = _open_reader(source)
+    total = len(reader.pages)
+    workers = PDF_EXTRACT_WORKERS if workers is None else max(1, workers)
+
+    if workers == 1 or total < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages: yield page.extract_text()
+        return
+
+    done, pool = 0, None
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(_extract_range, source, s, e) for s, e in _chunk_ranges(total, workers)]
+        for fut in futures:
+            for text in fut.result():
+                yield text
+                done += 1
+    except Exception as e:
+        # 子 Process 出問題時，從中斷的頁面開始改用單核心，確保上傳不會因此失敗；
+        # 壞掉的 pool 先關掉 (取消還沒跑的工作、不等子 Process)，下一次萃取再重建
+        if pool is not None:
+            if _pool is pool: _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        print(f"⚠️ 多核心 PDF 萃取失敗，改用單核心: {e}")
+        for i in range(done, total): yield reader.pages[i].extract_text()
@@ -0,0 +1,134 @@
+import json
+import time
+import asyncio
+from pypdf import PdfReader
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from core.parse_cache import get_parsed_items, put_parsed_items
+from core.uploads import remove_quietly
+from core.label_format import format_item, format_items, resolve_label_format
+from services.download_api import register_download, download_url, schedule_download_expiry
+
+try:
+    from services.stats_api import log_action
+except ImportError:
+    def log_action(name): pass
+
+# ========================================================
+# 🌟 揀貨單上傳共用流程
+# 各供應商只需提供 iter_pages(pdf_path, reader, content_hash)，逐頁產生 (頁碼, item)；
+# 快取、重複貨號統計、下載登記與 NDJSON 串流回應都在這裡統一處理。
+# ========================================================
+
+def run_pick_list_job(pdf_path, content_hash, vendor, master_version, iter_pages, on_item=None):
+    """
+    解析整份揀貨單並回傳 (items, product_no_tracker, out_token)。
+    on_item 有值時，每完成一筆 item 就立刻呼叫一次 (串流模式用)。
+    """
+    # 🌟 同一份檔案 (+ 同一版主資料庫) → 直接沿用上次的解析結果
+    parsed = get_parsed_items(content_hash, vendor, master_version)
+    if parsed is not None:
+        temp_items, product_no_tracker, kept_pages = parsed
+        if on_item:
+            for item in temp_items: on_item(item)
+    else:
+        temp_items = []
+        product_no_tracker = {}
+        kept_pages = []
+        # 🌟 直接讀上傳的暫存檔，pypdf 依需要 seek，不把整份 PDF 複製進記憶體
+        with open(pdf_path, "rb") as pdf_file:
+            reader = PdfReader(pdf_file)
+            total_pages = len(reader.pages)
+            for i, item in iter_pages(pdf_path, reader, content_hash):
+                kept_pages.append(i)
+                if item is None: continue
+                p_no = item["Product_No"]
+                if p_no not in product_no_tracker: product_no_tracker[p_no] = []
+                product_no_tracker[p_no].append(i + 1)
+                temp_items.append(item)
+                if on_item: on_item(item)
+        # 沒有略過任何頁面時以 None 表示，下載時可直接回傳原檔
+        if len(kept_pages) == total_pages: kept_pages = None
+        put_parsed_items(content_hash, vendor, master_version, (temp_items, product_no_tracker, kept_pages))
+
+    # 🌟 不在上傳時重寫整份 PDF，等第一次下載才產生 (沒有略過頁面就直接給原檔)
+    out_token = register_download(pdf_path, content_hash, vendor, kept_pages)
+    return temp_items, product_no_tracker, out_token
+
+def find_duplicates(product_no_tracker):
+    return [{"Product_No": k, "Count": len(v), "Pages": ", ".join(map(str, v))} for k, v in product_no_tracker.items() if len(v) > 1]
+
+def build_upload_summary(items, product_no_tracker, out_token, **extra):
+    """一次性回應與串流最後一行共用的欄位 (不含 items)。"""
+    duplicates = find_duplicates(product_no_tracker)
+    return {
+        "status": "success", "duplicates": duplicates,
+        "summary": {"total_pages": len(items), "has_duplicates": len(duplicates) > 0},
+        "download_url": download_url(out_token), **extra
+    }
+
+def build_upload_response(items, product_no_tracker, out_token, label_format=None, **extra):
+    """一次性 JSON 回應：items 依 label_format 輸出 (compact 另附 label_styles)。"""
+    formatted, label_styles = format_items(items, label_format)
+    response = {"items": formatted, **build_upload_summary(items, product_no_tracker, out_token, **extra)}
+    if label_styles is not None: response["label_styles"] = label_styles
+    return response
+
+async def _ndjson_events(run_job, action_name, label_format, extra):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    styles = {}
+
+    def on_item(item):
+        loop.call_soon_threadsafe(queue.put_nowait, ("item", item))
+
+    def job():
+        items, tracker, out_token = run_job(on_item)
+        # 🌟 下載一登記好就排程到期 (不等串流送完)：用戶端中途斷線時來源檔與登記檔也會照常清掉
+        schedule_download_expiry(out_token, loop)
+        return items, tracker, out_token
+
+    async def runner():
+        try:
+            queue.put_nowait(("done", await asyncio.to_thread(job)))
+        except Exception as e:
+            queue.put_nowait(("error", str(e)))
+
+    started = time.perf_counter()
+    first_item_ms = None
+    task = asyncio.create_task(runner())
+    try:
+        while True:
+            kind, payload = await queue.get()
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            if kind == "item":
+                if first_item_ms is None: first_item_ms = elapsed_ms
+                known = len(styles)
+                item = format_item(payload, label_format, styles)
+                # 🌟 compact 模式：新的樣式先送一行 {"type": "style"}，之後的 item 只帶樣式 id
+                if len(styles) > known:
+                    sid, style = list(styles.items())[-1]
+                    yield json.dumps({"type": "style", "id": sid, "style": style}, ensure_ascii=False) + "\n"
+                yield json.dumps({"type": "item", "item": item}, ensure_ascii=False) + "\n"
+            elif kind == "done":
+                items, tracker, out_token = payload
+                log_action(action_name)
+                final = build_upload_summary(items, tracker, out_token, **extra)
+                final.update({"type": "done", "timing": {"first_item_ms": first_item_ms, "total_ms": elapsed_ms}})
+                yield json.dumps(final, ensure_ascii=False) + "\n"
+                return
+            else:
+                yield json.dumps({"type": "error", "detail": payload}, ensure_ascii=False) + "\n"
+                return
+    finally:
+        await task
+
+def stream_pick_list_job(run_job, pdf_path, action_name, label_format=None, **extra):
+    """
+    🌟 NDJSON 串流回應：每解析完一頁就送出一行 {"type": "item", ...}，
+    compact 格式時，新樣式第一次出現前會先送一行 {"type": "style", "id", "style"}；
+    最後一行 {"type": "done", ...} 帶重複清單、下載網址與 first_item_ms / total_ms。
+    run_job(on_item) 會在背景 thread 執行，登記好下載檔就排程到期；串流結束後才清理暫存檔。
+    """
+    return StreamingResponse(_ndjson_events(run_job, action_name, resolve_label_format(label_format), extra),
+                             media_type="application/x-ndjson", background=BackgroundTask(remove_quietly, pdf_path))
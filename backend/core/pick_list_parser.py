@@ -0,0 +1,204 @@
+import re
+
+# ========================================================
+# 🌟 共用揀貨單 (Pick List) 解析引擎
+# 所有供應商 (Yummy / Homey / Anymall / HelloBear / 驗貨區) 共用同一套逐頁解析，
+# 正則表達式只在載入時編譯一次，各家差異全部寫在下方的 PROFILES 設定裡。
+# ========================================================
+
+QTY_MARKER = ".0000"
+
+RE_QTY_INLINE = re.compile(r"(\d+)\s*\.0000")
+RE_QTY_TRAILING = re.compile(r"\s+(\d+)$")
+RE_NAME_STOP = re.compile(r"\d+\.0000|\b\d{12,14}\b")
+RE_IMAGE_TAG = re.compile(r"\[Image \d+\]")
+RE_STAR_BLOCK = re.compile(r"\*(.*?)\*")
+RE_STRIP_SPACE_STAR = re.compile(r"[\s\*]")
+RE_STRIP_SPACE = re.compile(r"\s")
+RE_STRIP_SPACE_DASH = re.compile(r"[\s\-]")
+RE_NA_TOKEN = re.compile(r"\(?N/?A\)?", re.IGNORECASE)
+RE_ALNUM_5 = re.compile(r"[A-Za-z0-9]{5,}")
+RE_ALNUM_DASH_5 = re.compile(r"[A-Za-z0-9\-]{5,}")
+RE_HAS_LETTER = re.compile(r"[A-Za-z]")
+
+RE_DATE_COMPACT = re.compile(r"\b(20\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])\b")
+RE_DATE_DMY_SLASH = re.compile(r"\b(0[1-9]|[12]\d|3[01])/(0[1-9]|1[0-2])/(20\d{2})\b")
+RE_DATE_STANDARD = re.compile(r"\b(20\d{2})[./-](0[1-9]|1[0-2])[./-](0[1-9]|[12]\d|3[01])\b")
+
+NA_TOKENS = {"N/A", "(N/A)", "NA", "-"}
+
+
+def extract_date_from_text(text):
+    text = text.replace('\n', ' ')
+    m = RE_DATE_COMPACT.search(text)
+    if m: return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+    m = RE_DATE_DMY_SLASH.search(text)
+    if m: return f"{m.group(3)}-{m.group(2)}-{m.group(1)}"
+    m = RE_DATE_STANDARD.search(text)
+    if m: return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+    return "未偵測到"
+
+
+# ================= 各家條碼清洗規則 =================
+
+def _barcode_joined(lines, qty_idx, p_no):
+    # Anymall：數量行之後的所有文字合併，去掉空白與星星
+    if qty_idx == -1 or qty_idx >= len(lines) - 1: return ""
+    raw = "".join(l for l in lines[qty_idx + 1:] if "N/A" not in l and "PAGE" not in l)
+    return RE_STRIP_SPACE_STAR.sub('', raw)
+
+def _barcode_star(lines, qty_idx, p_no, strip_re, fallback_re):
+    # HelloBear / 驗貨區：先找 *...* 包圍的內容，找不到才掃描長度足夠的英數字串
+    if qty_idx == -1 or qty_idx >= len(lines) - 1: return ""
+    raw_text = "".join(lines[qty_idx + 1:])
+    star_match = RE_STAR_BLOCK.search(raw_text)
+    if star_match:
+        cleaned = RE_NA_TOKEN.sub('', strip_re.sub('', star_match.group(1)))
+        return cleaned
+    fallback_text = RE_NA_TOKEN.sub('', strip_re.sub('', raw_text))
+    fallback_match = fallback_re.search(fallback_text)
+    return fallback_match.group(0) if fallback_match else ""
+
+def _barcode_line_scan(lines, qty_idx, p_no):
+    # Yummy / Homey：逐行掃描，遇到星星、12-15 位純數字或等於貨號的行就停
+    search_start = qty_idx + 1 if qty_idx != -1 else 0
+    p_no_plain = p_no.replace("-", "")
+    for line in lines[search_start:]:
+        if "N/A" in line or "PAGE" in line.upper(): continue
+        clean_line = RE_STRIP_SPACE_STAR.sub('', line)
+        if "*" in line: return clean_line
+        if clean_line.isdigit() and 12 <= len(clean_line) <= 15: return clean_line
+        if clean_line == p_no or clean_line == p_no_plain: return clean_line
+    return ""
+
+BARCODE_RULES = {
+    "joined": _barcode_joined,
+    "star": lambda lines, qty_idx, p_no: _barcode_star(lines, qty_idx, p_no, RE_STRIP_SPACE_DASH, RE_ALNUM_5),
+    "star_keep_dash": lambda lines, qty_idx, p_no: _barcode_star(lines, qty_idx, p_no, RE_STRIP_SPACE, RE_ALNUM_DASH_5),
+    "line_scan": _barcode_line_scan,
+}
+
+
+# ================= 各家是否需要列印標籤 =================
+# Yummy / Homey 需要比對主資料庫，由各自的模組決定，這裡設為 None
+
+def _anymall_needs_print(page):
+    return page["barcode"] != "(N/A)" and page["barcode"] == page["p_no"]
+
+def _hellobear_needs_print(page):
+    return bool(RE_HAS_LETTER.search(page["barcode"]))
+
+
+# ================= 🌟 供應商設定檔 =================
+# drop_image_lines : 是否過濾 pypdf 產生的 "[Image N]" 行
+# qty_trailing     : 數量行前一行結尾的數字是否也算數量 (例如 "商品名稱 12")
+# name_scan        : 找不到數量行時，是否往下收集多行名稱直到遇到數量/條碼
+# barcode_rule     : 使用 BARCODE_RULES 中的哪一套清洗規則
+# barcode_default  : 清洗後仍為空時的預設值 ("@p_no" 代表改用貨號)
+# extract_date     : 是否從整頁文字中抓日期
+# needs_print      : 純文字即可判斷是否列印的規則 (None 代表交給呼叫端)
+# 修改這裡的規則後請一併更換 core.parse_cache 的 PARSED_ITEMS_FORMAT，讓舊的解析結果失效
+PROFILES = {
+    "anymall": {
+        "drop_image_lines": False, "qty_trailing": False, "name_scan": False,
+        "barcode_rule": "joined", "barcode_default": "(N/A)",
+        "extract_date": False, "needs_print": _anymall_needs_print,
+    },
+    "hellobear": {
+        "drop_image_lines": False, "qty_trailing": False, "name_scan": False,
+        "barcode_rule": "star", "barcode_default": "@p_no",
+        "extract_date": False, "needs_print": _hellobear_needs_print,
+    },
+    "yummy": {
+        "drop_image_lines": False, "qty_trailing": True, "name_scan": True,
+        "barcode_rule": "line_scan", "barcode_default": "(N/A)",
+        "extract_date": True, "needs_print": None,
+    },
+    "homey": {
+        "drop_image_lines": True, "qty_trailing": True, "name_scan": True,
+        "barcode_rule": "line_scan", "barcode_default": "",
+        "extract_date": False, "needs_print": None,
+    },
+    "inspection": {
+        "drop_image_lines": True, "qty_trailing": False, "name_scan": False,
+        "barcode_rule": "star_keep_dash", "barcode_default": "@p_no",
+        "extract_date": False, "needs_print": None,
+    },
+}
+
+
+def is_blank_page(text, profile):
+    if not text: return True
+    if profile["drop_image_lines"]:
+        return not RE_IMAGE_TAG.sub('', text).strip()
+    return not text.strip()
+
+def parse_page(text, profile):
+    """把單頁文字一次掃描解析成 dict；沒有可用內容時回傳 None。"""
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    if profile["drop_image_lines"]:
+        lines = [l for l in lines if not l.startswith("[Image")]
+    if not lines: return None
+
+    p_no = lines[0]
+
+    # 1. 找數量行 (只找第一個 ".0000")
+    qty = 1
+    qty_idx = -1
+    for idx, line in enumerate(lines):
+        if QTY_MARKER not in line: continue
+        qty_idx = idx
+        m = RE_QTY_INLINE.search(line)
+        if m and int(m.group(1)) > 0:
+            qty = int(m.group(1))
+        elif idx > 0:
+            prev_line = lines[idx - 1]
+            if prev_line.isdigit():
+                qty = int(prev_line)
+                qty_idx = idx - 1
+            elif profile["qty_trailing"]:
+                m_end = RE_QTY_TRAILING.search(prev_line)
+                if m_end:
+                    qty = int(m_end.group(1))
+                    qty_idx = idx - 1
+        break
+
+    # 2. 商品名稱
+    name = ""
+    if qty_idx > 1:
+        name = " ".join(lines[1:qty_idx])
+    elif len(lines) > 1 and qty_idx == -1:
+        if profile["name_scan"]:
+            name_parts = []
+            for line in lines[1:]:
+                if RE_NAME_STOP.search(line): break
+                name_parts.append(line)
+            name = " ".join(name_parts)
+        else:
+            name = lines[1]
+
+    # 3. 條碼
+    barcode_val = BARCODE_RULES[profile["barcode_rule"]](lines, qty_idx, p_no)
+    default = profile["barcode_default"]
+    if default == "@p_no":
+        if not barcode_val or len(barcode_val) < 4 or barcode_val.strip().upper() in NA_TOKENS:
+            barcode_val = p_no
+    elif not barcode_val:
+        barcode_val = default
+
+    page = {
+        "p_no": p_no, "name": name, "qty": qty, "barcode": barcode_val,
+        "date": extract_date_from_text(text) if profile["extract_date"] else "N/A",
+    }
+    rule = profile["needs_print"]
+    page["needs_print"] = rule(page) if rule else False
+    return page
+
+def iter_parsed_pages(page_texts, profile):
+    """
+    逐頁產生 (頁碼 index, 解析結果)。空白頁直接略過；
+    非空白但沒有可用行的頁面會產生 (index, None)，呼叫端仍需保留該頁。
+    """
+    for i, text in enumerate(page_texts):
+        if is_blank_page(text, profile): continue
+        yield i, parse_page(text, profile)
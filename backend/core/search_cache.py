@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ========================================================
+# 🌟 條碼搜尋的 typeahead 快取 (以 (搜尋資料庫版本, 小寫查詢字串) 為 key 的 LRU)
+# 前端邊打字邊打 /api/search/?q=，連續的查詢通常是前一個的延伸 ("48" → "489" → "4891")。
+# 每個查詢記下找到的列位置，以及「查到第幾列為止」(through；None = 整個資料庫都看過了)：
+# through 之前所有符合的列都在裡面。
+#   - 同一個查詢再來一次：直接回傳 (不夠 limit 筆而且還沒看完時，從 through 之後接著找)
+#   - 更長的查詢、而它的某個前綴有快取：更長的查詢符合的列一定也符合前綴，
+#     所以只在前綴的列裡驗證，不夠 limit 筆時才從 through 之後接著找，不必從頭重掃
+#   - 其他：照常查詢
+# 版本寫在 key 裡，上傳新的搜尋資料庫後舊結果自然不會再命中 (上傳時也會整個清掉)。
+# search_cache_stats() 提供命中率與各種情況的平均耗時，掛在 /api/cache_stats。
+# ========================================================
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+
+class TypeaheadCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (版本, 查詢) -> (列位置, through)，越後面越新
+        self._counts = {"hit": 0, "narrowed": 0, "miss": 0}
+        self._elapsed = {"hit": 0.0, "narrowed": 0.0, "miss": 0.0}
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None: self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _extend(table, col, query, positions, through, limit):
+        """positions 是 through 之前所有符合的列；不夠 limit 筆時從 through 之後接著找。"""
+        if through is None or len(positions) >= limit: return positions, through
+        more = table.find(col, query, limit=limit - len(positions), start=through + 1)
+        positions = np.concatenate([positions, more])
+        return positions, (None if len(positions) < limit else int(positions[-1]))
+
+    def find(self, table, version, col, query, limit):
+        """跟 table.find(col, query, limit) 相同的結果，能用快取就用快取。"""
+        started = time.perf_counter()
+        query = str(query).lower()
+        key = (version, query)
+        entry, kind = self._get(key), "hit"
+        if entry is None:
+            kind = "miss"
+            for end in range(len(query) - 1, 0, -1):
+                prefix = self._get((version, query[:end]))
+                if prefix is not None:
+                    entry, kind = (table.filter(col, query, prefix[0]), prefix[1]), "narrowed"
+                    break
+        if entry is None:
+            positions = table.find(col, query, limit=limit)
+            entry = (positions, None if len(positions) < limit else int(positions[-1]))
+        extended = self._extend(table, col, query, *entry, limit)
+        if kind != "hit" or extended[1] != entry[1]: self._put(key, extended)
+        with self._lock:
+            self._counts[kind] += 1
+            self._elapsed[kind] += time.perf_counter() - started
+        return extended[0][:limit]
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._counts.values())
+            return {
+                **self._counts, "size": len(self._entries), "max_size": self.max_entries,
+                "hit_rate": round((self._counts["hit"] + self._counts["narrowed"]) / lookups, 4) if lookups else 0.0,
+                "avg_ms": {kind: round(self._elapsed[kind] * 1000 / n, 3) if n else 0.0 for kind, n in self._counts.items()},
+            }
+
+search_cache = TypeaheadCache(SEARCH_CACHE_SIZE)
+
+def search_cache_stats():
+    return search_cache.stats()
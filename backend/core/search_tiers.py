@@ -0,0 +1,60 @@
+import numpy as np
+
+# ========================================================
+# 🌟 分層搜尋：完全相同 → 開頭相同 → 包含
+# 掃描器使用者幾乎都是貼上完整的條碼或貨號，以前每個查詢都當成子字串掃整個資料表，
+# 完整條碼跟其他「剛好包含這串數字」的列混在一起，只依列順序或標籤狀態排。
+# 現在依序查三層，前一層的結果排在前面，湊滿需要的筆數就不再查下一層：
+#   exact     條碼 / 貨號的正規化鍵 (去空白、小寫) 完全相同：排序好的鍵二分搜尋
+#   prefix    鍵以查詢開頭：同一段排序好的鍵，也是二分搜尋
+#   substring 搜尋欄位包含查詢 (trigram 索引 / 掃描 / typeahead 快取，由呼叫端決定)
+# 各層彼此不重複 (前面的層出現過的列不再出現)。
+# ========================================================
+
+TIERS = ("exact", "prefix", "substring")
+
+# 比這個少的列用 Python set 去重 (np.unique / np.isin 對幾列的小陣列反而慢)
+SMALL_HITS = 1024
+
+def _new_hits(hits, seen):
+    """hits 去掉重複的列與 seen 裡已經有的列，保留原本的順序。"""
+    if len(hits) <= SMALL_HITS:
+        skip, out = set(seen.tolist()), []
+        for row in hits.tolist():
+            if row not in skip:
+                skip.add(row)
+                out.append(row)
+        return np.array(out, dtype=np.int64)
+    _, first = np.unique(hits, return_index=True)
+    hits = hits[np.sort(first)]
+    return hits[~np.isin(hits, seen)] if len(seen) else hits
+
+def iter_tiers(table, needle, key_columns, substring, limit=None):
+    """
+    依序產生 (層級, 列位置)。key_columns：有正規化鍵的欄位 (沒有鍵的欄位略過)；
+    substring(n)：包含 needle 的前 n 列 (n 為 None 時全部)。
+    limit 有值時每層只找還缺的筆數，湊滿就停；呼叫端也可以拿到足夠的層就不再往下取。
+    """
+    key_columns = [col for col in key_columns if table.has_keys(col)]
+    seen = np.empty(0, dtype=np.int64)
+    for tier in TIERS:
+        wanted = None if limit is None else limit - len(seen)
+        if wanted is not None and wanted <= 0: return
+        # 前面的層出現過的列會被剔除，多找 len(seen) 列才保證湊得到 wanted 筆
+        fetch = None if wanted is None else wanted + len(seen)
+        if tier == "substring":
+            hits = np.asarray(substring(fetch), dtype=np.int64)
+        else:
+            hits = np.concatenate([np.empty(0, dtype=np.int64)] +
+                                  [table.key_hits(col, needle, prefix=tier == "prefix", limit=fetch) for col in key_columns])
+        hits = _new_hits(hits, seen)[:wanted]
+        seen = np.concatenate([seen, hits])
+        yield tier, hits
+
+def tiered_positions(table, needle, key_columns, substring, limit=None):
+    """iter_tiers 各層接起來的列位置 (最多 limit 列)。"""
+    return np.concatenate([np.empty(0, dtype=np.int64)] + [hits for _, hits in iter_tiers(table, needle, key_columns, substring, limit)])
+
+def exact_positions(table, needle, key_columns):
+    """只要第一層：正規化鍵完全相同的列 (掃描器批次查詢條碼用)。"""
+    return next(iter_tiers(table, needle, key_columns, substring=None))[1]
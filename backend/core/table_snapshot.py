@@ -0,0 +1,711 @@
+import io
+import os
+import glob
+import json
+import mmap
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+# ========================================================
+# 🌟 主資料庫 / 搜尋資料庫的共用唯讀快照 (memory-mapped 欄式檔案)
+# 以前每次冷啟動或檔案更新，都要重新解析整份 CSV / XLSX (openpyxl 解析幾萬列很慢)，
+# 而且 utf-8-sig → big5 → Excel 逐一嘗試，失敗一次就整份重讀一次；
+# 開多個 uvicorn worker 時，每個 worker 還各自留一份完整的 pandas 副本。
+# 現在上傳時轉換一次，存成 data/snapshots/<檔名>-<大小>-<修改時間>[-<版本>]/ 資料夾：
+#   c<欄>.dat / c<欄>.off.npy   每欄的 UTF-8 內容與每列起點 (空值另存 c<欄>.na.npy)
+#   c<欄>.dict.* / .codes.npy    重複值多的欄位 (品牌、空白的營養欄...) 改存不重複值 + 每列代碼
+#   c<欄>.low.dat / .low.off.npy 搜尋欄位的小寫內容 (列之間以 \x00 分隔)，給 find() 直接掃
+#   s<n>.low.dat / .low.off.npy  只用來搜尋、不會回傳的欄位 (例如組合搜尋字串)，只存這一份
+#   <搜尋欄>.tri.*.npy           小寫內容的三字元 (UTF-8 bytes) 倒排索引：trigram → 含有它的列
+#   i<索引>.keys.npy / .pos.npy  排序好的鍵 → 列位置，給 lookup() 二分搜尋
+#   c<欄>.key.npy / .key.pos.npy 排序好的正規化鍵 (去空白、小寫) → 列位置，給 key_hits() 找完全相同 / 開頭相同的列
+#   rowhash.npy                  原始檔每一列的雜湊，增量更新 (build_delta_snapshot) 時比對用
+# 所有 worker 都 mmap 同一份檔案，由作業系統共用分頁快取，記憶體不會隨 worker 數倍增；
+# 原始檔一變 (大小或修改時間不同) 資料夾名稱就對不上，任何一個 worker 重建後其他 worker 直接掛上。
+# ========================================================
+
+SNAPSHOT_DIR = os.path.join("data", "snapshots")
+# 檔案格式改變時遞增，讓舊格式的快照失效
+SNAPSHOT_LAYOUT = 2
+# 不重複值不超過列數的這個比例時，改用字典編碼
+DICT_ENCODE_RATIO = 0.25
+# trigram 交集剩下這麼多候選列時就不再交集，直接驗證；最短的 posting 每次取這麼多列來交集
+NGRAM_VERIFY_DIRECTLY = 64
+NGRAM_CHUNK = 2048
+# 要全部符合的列 (沒有 limit) 時，候選列 × 這個 bytes 數超過整塊內容大小，就改用 numpy 掃整塊 (逐列驗證反而比較慢)
+SCAN_BYTES_PER_CANDIDATE = 1024
+_write_lock = threading.Lock()
+
+def read_table_file(path):
+    """解析原始 CSV / XLSX (全部欄位當字串)；CSV 只讀一次檔案，編碼在記憶體裡逐一嘗試。"""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xls'):
+        return pd.read_excel(path, dtype=str)
+    with open(path, "rb") as f: raw = f.read()
+    for encoding in ('utf-8-sig', 'big5'):
+        try: return pd.read_csv(io.StringIO(raw.decode(encoding)), dtype=str)
+        except (UnicodeDecodeError, pd.errors.ParserError): continue
+    # 副檔名是 .csv 但其實是 Excel (上傳時不認得的副檔名一律存成 .csv)
+    return pd.read_excel(io.BytesIO(raw), dtype=str)
+
+def snapshot_path(src_path, variant="", as_name=None):
+    """as_name：src_path 是還沒就位的暫存檔時，用它最終的檔名 (os.replace 不會改變修改時間與大小)。"""
+    stat = os.stat(src_path)
+    name = f"{os.path.basename(as_name or src_path)}-{stat.st_size}-{stat.st_mtime_ns}-v{SNAPSHOT_LAYOUT}"
+    if variant: name += f"-{variant}"
+    return os.path.join(SNAPSHOT_DIR, name)
+
+# ================= 寫入 =================
+
+def _write_blob(directory, stem, values, separator=b""):
+    """values (已編碼的 bytes) 依序寫成 <stem>.dat，起點寫成 <stem>.off.npy (最後一格是總長度)。"""
+    lengths = np.fromiter((len(v) + len(separator) for v in values), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # 4 GB 以下的欄位用 uint32 起點，省一半
+    if offsets[-1] < 2 ** 32: offsets = offsets.astype(np.uint32)
+    data = separator.join(values) + (separator if values else b"")
+    with open(os.path.join(directory, f"{stem}.dat"), "wb") as f:
+        f.write(data)
+    np.save(os.path.join(directory, f"{stem}.off.npy"), offsets)
+    return data, offsets
+
+def _trigrams(data):
+    """每個位置開始的 3 bytes 編成一個 24 位元整數。"""
+    a = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return (a[:-2] << 16) | (a[1:-1] << 8) | a[2:], a
+
+def _write_ngram_index(directory, stem, data, offsets):
+    """
+    搜尋內容 (列之間以 \\x00 分隔) 的 trigram 倒排索引，CSR 格式：
+    tri.keys 排序好的 trigram、tri.start 每個 trigram 在 tri.rows 的起點、tri.rows 含有它的列 (由小到大)。
+    """
+    grams, a = _trigrams(data) if len(data) >= 3 else (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32))
+    # 跨列 (含分隔字元) 的 trigram 不算
+    at = np.flatnonzero((a[:-2] != 0) & (a[1:-1] != 0) & (a[2:] != 0)) if len(grams) else np.empty(0, dtype=np.int64)
+    rows = np.searchsorted(offsets, at, side="right") - 1
+    # (trigram, 列) 排序後去掉同一列重複的 trigram (排序 + 比前一個，比 np.unique 的雜湊快得多)
+    pairs = (grams[at].astype(np.uint64) << np.uint64(32)) | rows.astype(np.uint64)
+    pairs.sort()
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))] if len(pairs) else pairs
+    all_keys = (pairs >> np.uint64(32)).astype(np.uint32)
+    first = np.flatnonzero(np.concatenate(([True], all_keys[1:] != all_keys[:-1]))) if len(pairs) else np.empty(0, dtype=np.int64)
+    keys = all_keys[first]
+    np.save(os.path.join(directory, f"{stem}.tri.keys.npy"), keys)
+    np.save(os.path.join(directory, f"{stem}.tri.start.npy"), np.append(first, len(pairs)).astype(np.int64))
+    np.save(os.path.join(directory, f"{stem}.tri.rows.npy"), (pairs & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False, categorize=False).to_numpy()
+
+def _texts(series, na):
+    return ["" if missing else str(v) for v, missing in zip(series.tolist(), na)]
+
+def _write_key_index(directory, stem, series, na):
+    """去掉前後空白、轉小寫後的值排序好 (同一個鍵依列順序)；空值與空字串不算。"""
+    normalized = [t.strip().lower().encode("utf-8") for t in _texts(series, na)]
+    positions = np.array([k for k, key in enumerate(normalized) if key], dtype=np.int64)
+    keys = np.array([normalized[k] for k in positions.tolist()], dtype=bytes)
+    if keys.dtype.itemsize == 0: keys = keys.astype("S1")
+    order = np.argsort(keys, kind="stable")
+    np.save(os.path.join(directory, f"{stem}.key.npy"), keys[order])
+    np.save(os.path.join(directory, f"{stem}.key.pos.npy"), positions[order])
+
+def write_table(df, directory, indexes=None, search_columns=(), hashes=None, extra_meta=None, search_only=(), ngram_columns=(),
+                key_columns=()):
+    """
+    把 DataFrame (全部欄位當字串) 寫成快照資料夾。
+    indexes: {索引名稱: 欄位}，值去掉前後空白後建成可二分搜尋的鍵；
+    search_columns: 需要 find() 子字串搜尋的欄位；hashes: 原始檔每列的雜湊 (row_hashes)；
+    search_only: 只寫搜尋用的小寫內容、不當成一般欄位回傳的欄位；
+    ngram_columns: 另外建 trigram 索引的搜尋欄位 (查詢只驗證候選列，不必掃整塊內容)；
+    key_columns: 另外存排序好的正規化鍵的欄位 (條碼、貨號)，完全相同 / 開頭相同的查詢二分搜尋即可。
+    """
+    os.makedirs(directory)
+    if hashes is not None: np.save(os.path.join(directory, "rowhash.npy"), np.asarray(hashes, dtype=np.uint64))
+    columns, search, key_stems = [], {}, {}
+    for col in df.columns:
+        series = df[col]
+        na = series.isna().to_numpy()
+        if col in search_only:
+            stem = f"s{len(search)}"
+        else:
+            stem = f"c{len(columns)}"
+            columns.append(str(col))
+            codes, uniques = pd.factorize(series)
+            if 0 < len(uniques) <= DICT_ENCODE_RATIO * len(df):
+                # 字典編碼：每列只存 uint16 / uint32 代碼 (空值的代碼隨便指一個，另有 na 標記)
+                _write_blob(directory, f"{stem}.dict", [str(v).encode("utf-8") for v in uniques.tolist()])
+                np.save(os.path.join(directory, f"{stem}.codes.npy"),
+                        np.where(na, 0, codes).astype(np.uint16 if len(uniques) < 2 ** 16 else np.uint32))
+            else:
+                _write_blob(directory, stem, [t.encode("utf-8") for t in _texts(series, na)])
+        if na.any(): np.save(os.path.join(directory, f"{stem}.na.npy"), na)
+        if col in search_columns or col in search_only:
+            lowered = [t.lower().replace("\x00", "").encode("utf-8") for t in _texts(series, na)]
+            data, offsets = _write_blob(directory, f"{stem}.low", lowered, separator=b"\x00")
+            if col in ngram_columns: _write_ngram_index(directory, stem, data, offsets)
+            search[str(col)] = stem
+        if col in key_columns:
+            _write_key_index(directory, stem, series, na)
+            key_stems[str(col)] = stem
+
+    for name, col in (indexes or {}).items():
+        series = df[col]
+        keep = ~series.isna().to_numpy()
+        keys = np.array([str(v).strip().encode("utf-8") for v in series[keep].tolist()], dtype=bytes)
+        if keys.dtype.itemsize == 0: keys = keys.astype("S1")
+        positions = np.flatnonzero(keep)
+        order = np.argsort(keys, kind="stable")
+        np.save(os.path.join(directory, f"i{name}.keys.npy"), keys[order])
+        np.save(os.path.join(directory, f"i{name}.pos.npy"), positions[order])
+
+    meta = {"rows": len(df), "columns": columns, "indexes": sorted(indexes or {}),
+            "search": search, "keys": key_stems, **(extra_meta or {})}
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+# ================= 讀取 =================
+
+class SharedTable:
+    """唯讀的快照資料表；欄位內容都是 mmap，只有用到的列才解碼成 Python 字串。"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.meta = meta
+        self.root = self
+        self.columns = meta["columns"]
+        self._rows = meta["rows"]
+        self._col_no = {c: j for j, c in enumerate(self.columns)}
+        self._indexes = set(meta["indexes"])
+        self._search = meta["search"]   # 搜尋欄位 → 檔名前綴
+        self._keys = meta.get("keys", {})   # 有正規化鍵的欄位 → 檔名前綴
+        # 掛上時就記下快照裡有哪些檔案：na / codes / trigram 這類可有可無的 .npy 不在清單裡才算「沒有」，
+        # 在清單裡卻開不到 (快照被刪掉了) 時直接報錯，不會默默當成沒有空值 / 沒有字典編碼
+        self._files = set(os.listdir(directory))
+        self._cache = {}
+        self._storage = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def empty(self):
+        return self._rows == 0 or not self.columns
+
+    def _open(self, name):
+        if name in self._cache: return self._cache[name]
+        with self._lock:
+            if name in self._cache: return self._cache[name]
+            path = os.path.join(self.directory, name)
+            if name.endswith(".npy"):
+                # 轉成一般 ndarray (底下還是同一塊 mmap)：np.memmap 每次取值都多一層 Python 的 __getitem__
+                value = np.load(path, mmap_mode="r").view(np.ndarray) if name in self._files else None
+            elif os.path.getsize(path) == 0:
+                value = b""
+            else:
+                with open(path, "rb") as f: value = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._cache[name] = value
+            return value
+
+    def values(self, col, positions):
+        """欄位 col 在指定列位置的值 (list，空值為 None)。"""
+        positions = np.asarray(positions, dtype=np.int64)
+        j = self._col_no[col]
+        na, codes = self._open(f"c{j}.na.npy"), self._open(f"c{j}.codes.npy")
+        stem, entries = f"c{j}", positions
+        if codes is not None: stem, entries = f"c{j}.dict", codes[positions].astype(np.int64)
+        blob, offsets = self._open(f"{stem}.dat"), self._open(f"{stem}.off.npy")
+        starts, ends = offsets[entries].tolist(), offsets[entries + 1].tolist()
+        values = [blob[s:e].decode("utf-8") for s, e in zip(starts, ends)]
+        if na is not None:
+            for k in np.flatnonzero(na[positions]).tolist(): values[k] = None
+        return values
+
+    def take(self, positions):
+        """取出指定列位置的 DataFrame (index 就是列位置，跟原本整份 DataFrame 的 RangeIndex 一致)。"""
+        positions = np.asarray(positions, dtype=np.int64)
+        data = {col: self.values(col, positions) for col in self.columns}
+        return pd.DataFrame(data, index=positions, columns=self.columns, dtype=str)
+
+    def row(self, position, na_value=""):
+        """單一列轉成 dict (空值換成 na_value)；逐頁查詢時比建一個 DataFrame 快得多。"""
+        positions = np.array([position], dtype=np.int64)
+        row = {}
+        for col in self.columns:
+            value = self.values(col, positions)[0]
+            row[col] = na_value if value is None else value
+        return row
+
+    def positions(self):
+        """所有 (未刪除) 列的位置。"""
+        return np.arange(self._rows)
+
+    def to_pandas(self):
+        return self.take(self.positions())
+
+    def row_hashes(self):
+        return self._open("rowhash.npy")
+
+    def index_keys(self, name):
+        """每一列在索引 name 的鍵 (object array，空值為 None)。"""
+        keys = np.char.decode(np.asarray(self._open(f"i{name}.keys.npy")), "utf-8")
+        out = np.full(self._rows, None, dtype=object)
+        out[np.asarray(self._open(f"i{name}.pos.npy"))] = keys
+        return out
+
+    def has_index(self, name):
+        return name in self._indexes
+
+    def storage_bytes(self):
+        """快照檔案大小 (bytes)，依用途分類：欄位內容、搜尋用小寫內容、索引 (含增量比對用的雜湊)。"""
+        # 快照寫好後不會再改，算一次就記住 (資料夾被新版本換掉後也還答得出來)
+        if self._storage is not None: return dict(self._storage)
+        sizes = {"columns": 0, "search": 0, "indexes": 0}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file(): continue
+            kind = ("search" if ".low." in entry.name else
+                    "indexes" if entry.name[0] == "i" or ".tri." in entry.name or ".key." in entry.name
+                    or entry.name == "rowhash.npy" else "columns")
+            sizes[kind] += entry.stat().st_size
+        sizes["total"] = sum(sizes.values())
+        self._storage = sizes
+        return dict(sizes)
+
+    def lookup(self, name, value):
+        """索引 name 的鍵等於 str(value).strip() 的列位置 (依原檔順序)；沒有索引或找不到時回傳空 array。"""
+        if name not in self._indexes: return np.empty(0, dtype=np.int64)
+        keys = self._open(f"i{name}.keys.npy")
+        key = str(value).strip().encode("utf-8")
+        if len(key) > keys.dtype.itemsize or len(keys) == 0: return np.empty(0, dtype=np.int64)
+        lo = int(np.searchsorted(keys, key, side="left"))
+        hi = int(np.searchsorted(keys, key, side="right"))
+        return np.array(self._open(f"i{name}.pos.npy")[lo:hi])
+
+    def has_keys(self, col):
+        return col in self._keys
+
+    def pin(self):
+        """
+        先把快照裡的檔案全部 mmap 起來 (平常是用到才開)：之後快照資料夾被刪掉 (換上新版本) 時，
+        還在用這個版本的請求照樣讀得到，作業系統等所有 mmap 放手才真正釋放。回傳 self。
+        """
+        for name in sorted(self._files):
+            if name != "meta.json": self._open(name)
+        self.storage_bytes()
+        return self
+
+    def _key_range(self, col, needle, prefix):
+        """正規化鍵等於 needle (prefix=True：以 needle 開頭) 的 (鍵, 列位置) mmap 片段，依鍵排序。"""
+        keys, positions = self._open(f"{self._keys[col]}.key.npy"), self._open(f"{self._keys[col]}.key.pos.npy")
+        needle = str(needle).strip().lower().encode("utf-8")
+        if not needle or len(needle) > keys.dtype.itemsize or len(keys) == 0: return keys[:0], positions[:0]
+        lo = int(np.searchsorted(keys, needle, side="left"))
+        if prefix:
+            # 以 needle 開頭的鍵都小於「最後一個 byte 加一」(UTF-8 不會出現 0xff，不會進位)，長度相同不必轉型
+            hi = int(np.searchsorted(keys, needle[:-1] + bytes([needle[-1] + 1]), side="left"))
+        else:
+            hi = int(np.searchsorted(keys, needle, side="right"))
+        return keys[lo:hi], positions[lo:hi]
+
+    def key_hits(self, col, needle, prefix=False, limit=None):
+        """
+        col 的正規化鍵 (去空白、小寫) 等於 needle 的列位置；prefix=True 時是以 needle 開頭的列
+        (完全相同的排在最前面)。依鍵排序、同一個鍵依列順序，只做兩次二分搜尋。
+        """
+        if col not in self._keys: raise KeyError(f"{col} 沒有正規化鍵")
+        return np.array(self._key_range(col, needle, prefix)[1][:limit], dtype=np.int64)
+
+    def find(self, col, needle, limit=None, start=0):
+        """小寫內容包含 needle 的列位置 (由小到大，空值不算)；limit 有值時找到那麼多列就停，start 之前的列不看。"""
+        if col not in self._search: raise KeyError(f"{col} 不是搜尋欄位")
+        stem = self._search[col]
+        blob, starts = self._open(f"{stem}.low.dat"), self._open(f"{stem}.low.off.npy")
+        na = self._open(f"{stem}.na.npy")
+        needle = str(needle).lower().replace("\x00", "").encode("utf-8")
+        if not needle:
+            rows = np.arange(start, self._rows) if na is None else start + np.flatnonzero(~np.asarray(na[start:]))
+            return rows[:limit] if limit is not None else rows
+        postings = self._ngram_postings(stem, needle)
+        if postings and limit is None and len(postings[0]) * SCAN_BYTES_PER_CANDIDATE > len(blob):
+            return self._scan_all(blob, starts, na, needle, start)
+        if postings is not None:
+            # 🌟 有 trigram 索引：依列順序一段一段交集出候選列再驗證，找滿 limit 就停
+            # (常見字的 posting 很長，整份交集反而比找到前 200 筆還花時間)
+            hits = []
+            first = int(np.searchsorted(postings[0], postings[0].dtype.type(start))) if postings else 0
+            for lo in range(first, len(postings[0]) if postings else 0, NGRAM_CHUNK):
+                if self._verify(stem, needle, self._ngram_chunk(postings, lo), hits, limit): break
+            return np.array(hits, dtype=np.int64)
+        if limit is None: return self._scan_all(blob, starts, na, needle, start)
+        hits = []
+        pos = blob.find(needle, int(starts[start])) if blob and start < self._rows else -1
+        while pos != -1:
+            # 用跟 starts 相同的型別查，否則 numpy 會先把整個 uint32 陣列轉成 int64
+            row = int(np.searchsorted(starts, starts.dtype.type(pos), side="right")) - 1
+            if na is None or not na[row]:
+                hits.append(row)
+                if limit is not None and len(hits) >= limit: break
+            pos = blob.find(needle, int(starts[row + 1]))
+        return np.array(hits, dtype=np.int64)
+
+    def _scan_all(self, blob, starts, na, needle, start):
+        """
+        沒有 limit、又不能用 (或不值得用) trigram 索引時要找出全部符合的列：
+        用 numpy 一次比對整塊內容，不必每個符合的位置都 blob.find + searchsorted 一次。
+        """
+        data = np.frombuffer(blob, dtype=np.uint8) if blob and start < self._rows else np.empty(0, dtype=np.uint8)
+        lo = int(starts[start]) if len(data) else 0
+        n = len(data) - lo - len(needle) + 1
+        if n <= 0: return np.empty(0, dtype=np.int64)
+        match = data[lo:lo + n] == needle[0]
+        for k in range(1, len(needle)): match &= data[lo + k:lo + k + n] == needle[k]
+        # 內容之間以 \x00 分隔、needle 不含 \x00，所以不會跨列符合
+        rows = np.searchsorted(starts, (lo + np.flatnonzero(match)).astype(starts.dtype), side="right") - 1
+        rows = rows[np.r_[True, rows[1:] != rows[:-1]]] if len(rows) else rows.astype(np.int64)
+        if na is not None: rows = rows[~np.asarray(na)[rows]]
+        return rows.astype(np.int64)
+
+    def _verify(self, stem, needle, rows, hits, limit):
+        """rows 之中小寫內容真的包含 needle 的列依序加進 hits；找滿 limit 時回傳 True。"""
+        blob, starts, na = self._open(f"{stem}.low.dat"), self._open(f"{stem}.low.off.npy"), self._open(f"{stem}.na.npy")
+        for row in rows.tolist():
+            if na is not None and na[row]: continue
+            if blob.find(needle, int(starts[row]), int(starts[row + 1])) == -1: continue
+            hits.append(row)
+            if limit is not None and len(hits) >= limit: return True
+        return False
+
+    def filter(self, col, needle, positions, limit=None):
+        """positions (由小到大) 之中小寫內容包含 needle 的列；用來在已知的候選列裡縮小範圍，不必重掃整個欄位。"""
+        if col not in self._search: raise KeyError(f"{col} 不是搜尋欄位")
+        hits = []
+        needle = str(needle).lower().replace("\x00", "").encode("utf-8")
+        self._verify(self._search[col], needle, np.asarray(positions, dtype=np.int64), hits, limit)
+        return np.array(hits, dtype=np.int64)
+
+    def _ngram_postings(self, stem, needle):
+        """
+        needle 每個 trigram 的 posting (含有它的列，由小到大)，由短到長排好；
+        有 trigram 不存在時回傳空 list，沒有索引或 needle 不到 3 bytes 時回傳 None。
+        """
+        keys = self._open(f"{stem}.tri.keys.npy")
+        if keys is None or len(needle) < 3: return None
+        grams = np.unique(_trigrams(needle)[0])
+        at = np.searchsorted(keys, grams)
+        if (at >= len(keys)).any() or (keys[np.minimum(at, len(keys) - 1)] != grams).any(): return []
+        bounds, rows = self._open(f"{stem}.tri.start.npy"), self._open(f"{stem}.tri.rows.npy")
+        return sorted((rows[bounds[k]:bounds[k + 1]] for k in at.tolist()), key=len)
+
+    @staticmethod
+    def _ngram_chunk(postings, lo):
+        """最短 posting 的第 lo 段，跟其他 posting 同一範圍的部分交集後的候選列。"""
+        chunk = np.asarray(postings[0][lo:lo + NGRAM_CHUNK])
+        for posting in postings[1:]:
+            # 候選列夠少時直接逐列驗證，比再交集一次快
+            if len(chunk) <= NGRAM_VERIFY_DIRECTLY: break
+            a = int(np.searchsorted(posting, chunk[0], side="left"))
+            b = int(np.searchsorted(posting, chunk[-1], side="right"))
+            chunk = np.intersect1d(chunk, posting[a:b], assume_unique=True)
+        return chunk
+
+class DeltaTable(SharedTable):
+    """
+    增量更新後的資料表：完整的基底快照 (root) + 只含新增 / 修改列的小快照 (delta)。
+    列位置沿用基底：修改的列位置不變、內容改讀 delta；新增的列接在最後；刪除的列被隱藏。
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.meta = meta
+        self.root = SharedTable(os.path.join(os.path.dirname(directory), meta["base"]))
+        self.delta = SharedTable(os.path.join(directory, "delta"))
+        self.columns = self.root.columns
+        self.changes = meta["changes"]
+        self._rows = meta["rows"]
+        self._source = np.load(os.path.join(directory, "source.npy"), mmap_mode="r")    # 列位置 → delta 列 (-1 = 讀基底)
+        self._virtual = np.load(os.path.join(directory, "virtual.npy"), mmap_mode="r")  # delta 列 → 列位置
+        self._hidden = np.load(os.path.join(directory, "hidden.npy"), mmap_mode="r")    # 已刪除的列
+        self._storage = None
+
+    def has_index(self, name):
+        return self.root.has_index(name)
+
+    def positions(self):
+        return np.flatnonzero(~np.asarray(self._hidden))
+
+    def values(self, col, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        source = np.asarray(self._source[positions])
+        from_delta = source >= 0
+        out = np.empty(len(positions), dtype=object)
+        base_at, delta_at = np.flatnonzero(~from_delta), np.flatnonzero(from_delta)
+        if len(base_at): out[base_at] = self.root.values(col, positions[base_at])
+        if len(delta_at): out[delta_at] = self.delta.values(col, source[delta_at])
+        return out.tolist()
+
+    def _merge(self, base_hits, delta_hits, limit=None):
+        # 基底裡已被修改 (改讀 delta) 或刪除的列不算
+        base_hits = self._live_base(base_hits)
+        hits = np.sort(np.concatenate([base_hits, np.asarray(self._virtual[delta_hits])]))
+        return hits[:limit] if limit is not None else hits
+
+    def lookup(self, name, value):
+        return self._merge(self.root.lookup(name, value), self.delta.lookup(name, value))
+
+    def has_keys(self, col):
+        return self.root.has_keys(col)
+
+    def pin(self):
+        self.root.pin()
+        self.delta.pin()
+        self.storage_bytes()
+        return self
+
+    def key_hits(self, col, needle, prefix=False, limit=None):
+        if not self.root.has_keys(col): raise KeyError(f"{col} 沒有正規化鍵")
+        base_keys, base_pos = self.root._key_range(col, needle, prefix)
+        if limit is not None:
+            # 基底裡最多只有 changed + removed 列失效，多取這麼多列一定湊得到 limit 筆
+            stale = self.changes["changed"] + self.changes["removed"]
+            base_keys, base_pos = base_keys[:limit + stale], base_pos[:limit + stale]
+        base_pos = np.asarray(base_pos, dtype=np.int64)
+        keep = (np.asarray(self._source[base_pos]) < 0) & ~np.asarray(self._hidden[base_pos])
+        delta_keys, delta_pos = self.delta._key_range(col, needle, prefix)
+        keys = np.concatenate([np.asarray(base_keys)[keep], np.asarray(delta_keys)])
+        positions = np.concatenate([base_pos[keep], np.asarray(self._virtual[np.asarray(delta_pos, dtype=np.int64)])])
+        # 跟完整快照相同的順序：依鍵、同一個鍵依列位置
+        return positions[np.lexsort((positions, keys))][:limit].astype(np.int64)
+
+    def _live_base(self, hits):
+        hits = np.asarray(hits, dtype=np.int64)
+        return hits[(np.asarray(self._source[hits]) < 0) & ~np.asarray(self._hidden[hits])]
+
+    def find(self, col, needle, limit=None, start=0):
+        # delta 只有變動的列，整個找完；基底只找到湊滿 limit 筆「還有效」的列為止，被修改 / 刪除的列剔除後不夠再往後補
+        delta_hits = np.asarray(self._virtual[self.delta.find(col, needle)], dtype=np.int64)
+        delta_hits = delta_hits[delta_hits >= start]
+        pos = min(start, len(self.root))
+        if limit is None: base_hits = self._live_base(self.root.find(col, needle, start=pos))
+        else:
+            parts, found = [], 0
+            while found < limit:
+                wanted = limit - found
+                chunk = self.root.find(col, needle, limit=wanted, start=pos)
+                live = self._live_base(chunk)
+                parts.append(live)
+                found += len(live)
+                if len(chunk) < wanted: break
+                pos = int(chunk[-1]) + 1
+            base_hits = np.concatenate([np.empty(0, dtype=np.int64)] + parts)
+        hits = np.sort(np.concatenate([base_hits, delta_hits]))
+        return hits[:limit] if limit is not None else hits
+
+    def filter(self, col, needle, positions, limit=None):
+        positions = np.asarray(positions, dtype=np.int64)
+        source = np.asarray(self._source[positions])
+        base_hits = self.root.filter(col, needle, positions[source < 0])
+        delta_hits = np.asarray(self._virtual[self.delta.filter(col, needle, source[source >= 0])], dtype=np.int64)
+        hits = np.sort(np.concatenate([base_hits, delta_hits]))
+        return hits[:limit] if limit is not None else hits
+
+    def row_hashes(self):
+        """每個列位置的原始列雜湊 (修改 / 新增的列取 delta 的，已刪除的列為 0)；舊版增量快照沒存雜湊時回傳 None。"""
+        base, delta = self.root.row_hashes(), self.delta.row_hashes()
+        if base is None or delta is None: return None
+        out = np.zeros(len(self._source), dtype=np.uint64)
+        out[:len(base)] = base
+        out[np.asarray(self._virtual)] = delta
+        out[np.asarray(self._hidden)] = 0
+        return out
+
+    def storage_bytes(self):
+        # 基底 + 增量 + 位置對照表 (對照表算在索引)
+        if self._storage is not None: return dict(self._storage)
+        base, delta = self.root.storage_bytes(), self.delta.storage_bytes()
+        sizes = {kind: base[kind] + delta[kind] for kind in ("columns", "search", "indexes")}
+        sizes["indexes"] += sum(os.path.getsize(os.path.join(self.directory, f)) for f in ("source.npy", "virtual.npy", "hidden.npy"))
+        sizes["total"] = sum(sizes.values())
+        self._storage = sizes
+        return dict(sizes)
+
+    def index_keys(self, name):
+        """每個列位置在索引 name 的鍵 (修改 / 新增的列取 delta 的，已刪除的列與空值為 None)。"""
+        out = np.full(len(self._source), None, dtype=object)
+        out[:len(self.root)] = self.root.index_keys(name)
+        out[np.asarray(self._virtual)] = self.delta.index_keys(name)
+        out[np.asarray(self._hidden)] = None
+        return out
+
+def open_table(directory):
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    return DeltaTable(directory) if "base" in meta else SharedTable(directory)
+
+# ================= 建立 / 掛上快照 =================
+
+def _remove_old_snapshots(src_path, keep):
+    prefix = os.path.join(SNAPSHOT_DIR, os.path.basename(src_path) + "-")
+    keep_paths = {keep}
+    # 增量快照要連它的基底一起留著
+    if keep is not None:
+        try:
+            with open(os.path.join(keep, "meta.json"), encoding="utf-8") as f: base = json.load(f).get("base")
+            if base: keep_paths.add(os.path.join(SNAPSHOT_DIR, base))
+        except (OSError, ValueError): pass
+    for old in glob.glob(glob.escape(prefix) + "*"):
+        # 其他 worker 若還 mmap 著舊檔，刪掉後內容仍保留到它們放手為止
+        if old in keep_paths or old.endswith(".tmp"): continue
+        if os.path.isdir(old): shutil.rmtree(old, ignore_errors=True)
+        else:
+            try: os.remove(old)
+            except OSError: pass
+
+def _publish(tmp_path, path, write, src_path):
+    """在 tmp_path 寫好快照再改名成 path (寫入中途失敗不會留下半成品)，並刪除同一份原始檔的舊快照。"""
+    with _write_lock:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        try:
+            write(tmp_path)
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            # 別的 worker 剛好先建好同一版本 → 直接用它的
+            if not os.path.exists(os.path.join(path, "meta.json")): raise
+        _remove_old_snapshots(src_path, keep=path)
+    return open_table(path)
+
+def build_snapshot(src_path, prepare=None, variant="", indexes=None, search_columns=(), as_name=None, search_only=(),
+                   ngram_columns=(), key_columns=(), progress=None, allow_empty=True):
+    """
+    解析原始檔 (可再經過 prepare 前處理)、寫成快照資料夾並回傳掛上的 SharedTable；
+    同一份原始檔的舊快照一併刪除。indexes / search_columns / ngram_columns / key_columns 可以是依 DataFrame 決定的函式。
+    progress：每進入一個步驟 (parsing / preparing / writing) 時以步驟名稱呼叫，背景建置回報進度用。
+    allow_empty=False：解析出來沒有任何資料列 (或欄位) 時丟出 ValueError，不寫快照、也不刪舊快照 (上傳新檔時用)。
+    """
+    report = progress or (lambda stage: None)
+    report("parsing")
+    raw = read_table_file(src_path)
+    hashes = row_hashes(raw)
+    report("preparing")
+    df = prepare(raw) if prepare is not None else raw
+    if not allow_empty and (len(df) == 0 or len(df.columns) == 0): raise ValueError("新檔案沒有任何資料列，請確認檔案格式")
+    if callable(indexes): indexes = indexes(df)
+    if callable(search_columns): search_columns = search_columns(df)
+    if callable(ngram_columns): ngram_columns = ngram_columns(df)
+    if callable(key_columns): key_columns = key_columns(df)
+    path = snapshot_path(src_path, variant, as_name)
+    extra_meta = {"raw_columns": [str(c) for c in raw.columns]}
+    report("writing")
+    return _publish(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp", path,
+                    lambda tmp: write_table(df, tmp, indexes, search_columns, hashes, extra_meta, search_only, ngram_columns,
+                                              key_columns),
+                    as_name or src_path)
+
+# ================= 增量更新 =================
+
+def _key_occurrences(keys, positions=None):
+    """(鍵, 第幾次出現) → 列位置；空值也當成一個鍵，依出現順序配對。positions：keys 各自的列位置 (預設 0, 1, 2, ...)。"""
+    seen, out = {}, {}
+    for pos, key in zip(range(len(keys)) if positions is None else positions, keys):
+        occ = seen.get(key, 0)
+        seen[key] = occ + 1
+        out[(key, occ)] = pos
+    return out
+
+def diff_by_key(table, raw, key_index, key_col, raw_hashes=None):
+    """
+    以鍵 (同一個鍵出現多次時依出現順序配對) 比對快照 (完整快照或增量快照目前的內容，已刪除的列不算) 與新檔。
+    回傳 (changed: [(快照列位置, 新檔列)], added: [新檔列], removed: [快照列位置])。
+    """
+    live = table.positions()
+    base = _key_occurrences(table.index_keys(key_index)[live].tolist(), live.tolist())
+    new = _key_occurrences([None if k is None or k is pd.NA or k != k else str(k).strip() for k in raw[key_col].tolist()])
+    paired = [(b, new[k]) for k, b in base.items() if k in new]
+    bpos = np.array([b for b, _ in paired], dtype=np.int64)
+    npos = np.array([n for _, n in paired], dtype=np.int64)
+    if raw_hashes is None: raw_hashes = row_hashes(raw)
+    differs = np.asarray(table.row_hashes())[bpos] != raw_hashes[npos]
+    changed = sorted(zip(bpos[differs].tolist(), npos[differs].tolist()))
+    added = sorted(n for k, n in new.items() if k not in base)
+    removed = sorted(b for k, b in base.items() if k not in new)
+    return changed, added, removed
+
+def build_delta_snapshot(src_path, current, key_index, prepare=None, variant="", indexes=None, search_columns=(),
+                         as_name=None, max_ratio=0.25, key_columns=(), max_overlay_ratio=0.5):
+    """
+    以 current 的基底快照為準，只把新檔裡新增 / 修改的列寫成 delta，刪除的列標記隱藏。
+    回傳 (table, {"added", "changed", "removed"})，筆數是跟 current 目前的內容 (被取代的那一版) 比；
+    欄位不同、沒有鍵索引、變動超過 current 的 max_ratio，或累積的 delta 超過基底的 max_overlay_ratio
+    (連續多次增量更新後 delta 越疊越大，不如整份重建) 時回傳 None，請改用 build_snapshot 整份重建。
+    current 沒有雜湊 (舊版增量快照) 時也回傳 None。
+    """
+    root = current.root
+    raw = read_table_file(src_path)
+    if [str(c) for c in raw.columns] != root.meta.get("raw_columns") or not root.has_index(key_index): return None
+    df_indexes = indexes(raw) if callable(indexes) else indexes
+    key_col = (df_indexes or {}).get(key_index)
+    if key_col is None: return None
+
+    if current.row_hashes() is None: return None
+    raw_hashes = row_hashes(raw)
+    # 回報的筆數與 max_ratio 都以目前這一版為準；寫進快照的 delta 則一律相對基底 (列位置沿用基底)
+    vs_current = diff_by_key(current, raw, key_index, key_col, raw_hashes)
+    if sum(len(part) for part in vs_current) > max_ratio * max(len(current), 1): return None
+    changed, added, removed = vs_current if current is root else diff_by_key(root, raw, key_index, key_col, raw_hashes)
+    if len(changed) + len(added) + len(removed) > max_overlay_ratio * max(len(root), 1): return None
+
+    n = len(root)
+    changed_base = np.array([b for b, _ in changed], dtype=np.int64)
+    delta_rows = [p for _, p in changed] + added
+    delta_raw = raw.iloc[delta_rows].reset_index(drop=True)
+    delta_df = prepare(delta_raw) if prepare is not None else delta_raw
+    if callable(indexes): indexes = indexes(delta_df)
+    if callable(search_columns): search_columns = search_columns(delta_df)
+    if callable(key_columns): key_columns = key_columns(delta_df)
+
+    source = np.full(n + len(added), -1, dtype=np.int64)
+    source[changed_base] = np.arange(len(changed))
+    source[n:] = np.arange(len(changed), len(delta_rows))
+    virtual = np.concatenate([changed_base, np.arange(n, n + len(added))]).astype(np.int64)
+    hidden = np.zeros(n + len(added), dtype=bool)
+    hidden[np.array(removed, dtype=np.int64)] = True
+    changes = {"added": len(added), "changed": len(changed), "removed": len(removed)}   # 相對基底，DeltaTable 內部用
+
+    def write(tmp):
+        os.makedirs(tmp)
+        write_table(delta_df, os.path.join(tmp, "delta"), indexes, search_columns, row_hashes(delta_raw), key_columns=key_columns)
+        np.save(os.path.join(tmp, "source.npy"), source)
+        np.save(os.path.join(tmp, "virtual.npy"), virtual)
+        np.save(os.path.join(tmp, "hidden.npy"), hidden)
+        meta = {"base": os.path.basename(root.directory), "rows": int(n + len(added) - len(removed)), "changes": changes}
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f: json.dump(meta, f, ensure_ascii=False)
+
+    path = snapshot_path(src_path, variant, as_name)
+    table = _publish(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp", path, write, as_name or src_path)
+    changed, added, removed = vs_current
+    return table, {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+def load_table(src_path, prepare=None, variant="", indexes=None, search_columns=(), search_only=(), ngram_columns=(),
+               key_columns=()):
+    """
+    掛上原始檔目前版本的快照；還沒有 (或損毀) 時解析原始檔並建立。
+    prepare / indexes / search_columns 的邏輯改變時請一併更換 variant，讓舊快照失效。
+    """
+    path = snapshot_path(src_path, variant)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        try: return open_table(path)
+        except Exception as e:
+            print(f"⚠️ 快照損毀，重新解析原始檔 ({path}): {e}")
+            shutil.rmtree(path, ignore_errors=True)
+    return build_snapshot(src_path, prepare, variant, indexes, search_columns, search_only=search_only, ngram_columns=ngram_columns,
+                          key_columns=key_columns)
+
+def remove_snapshots(src_path):
+    _remove_old_snapshots(src_path, keep=None)
@@ -0,0 +1,59 @@
+import os
+import hashlib
+import tempfile
+from fastapi import UploadFile, HTTPException
+
+# ========================================================
+# 🌟 上傳檔案串流落地 (不再整份 await file.read() 放進記憶體)
+# 每次只讀 1MB 寫到暫存檔，PdfReader / pandas 之後直接讀檔案，
+# 避免 bytes + BytesIO 兩份完整副本同時佔用 Render 小機器的記憶體。
+# ========================================================
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_TMP_DIR = os.path.join(tempfile.gettempdir(), "letech_uploads")
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+
+# 預設上限 (MB)；個別端點可用 MAX_UPLOAD_MB_<名稱> 覆寫，例如 MAX_UPLOAD_MB_YUMMY=150
+DEFAULT_MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "100"))
+
+def upload_limit_bytes(name, default_mb=None):
+    mb = os.getenv(f"MAX_UPLOAD_MB_{name.upper()}")
+    if mb is None: mb = default_mb if default_mb is not None else DEFAULT_MAX_UPLOAD_MB
+    return int(float(mb) * 1024 * 1024)
+
+async def save_upload(file: UploadFile, limit_name, dest_path=None, suffix=".pdf"):
+    """
+    把上傳檔案分段寫入 dest_path (未指定時寫入暫存資料夾)，
+    回傳 (檔案路徑, 內容 SHA-256)，雜湊在寫檔的同時順便算好，不必再讀一次。
+    超過該端點的大小上限時刪除半成品並回傳 413。
+    """
+    max_bytes = upload_limit_bytes(limit_name)
+    if dest_path is None:
+        fd, dest_path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_TMP_DIR)
+        out = os.fdopen(fd, "wb")
+    else:
+        out = open(dest_path, "wb")
+
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk: break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"檔案超過上限 {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        remove_quietly(dest_path)
+        raise
+    finally:
+        await file.close()
+    return dest_path, digest.hexdigest()
+
+def remove_quietly(path):
+    if path and os.path.exists(path):
+        try: os.remove(path)
+        except: pass
@@ -1,8 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os
-import shutil # 🌟 引入檔案清理工具
+import asyncio
 from routers import inspection 
 
 # 匯入各個模組
@@ -16,6 +14,11 @@ from services.master_api import router as master_router
 # 👇 這是唯一需要修改的地方！把原本的兩個 import 換成這一個
 from services.unified_api import search_router, inventory_router 
 from services.hktvmall_api import router as hktvmall_router 
+from services.download_api import router as download_router, cleanup_downloads, expire_download_later
+from services.font_api import router as font_router
+from core.barcodes import barcode_cache_stats
+from core.search_cache import search_cache_stats
+from core.dear_client import dear_client_stats
 
 app = FastAPI()
 
@@ -26,18 +29,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Has-More"],  # 🌟 食品標籤搜尋的總筆數 / 是否還有下一頁 (分頁用)
 )
 
 # =====================================================================
-# 🌟 終極硬碟防護：每次 Render 啟動時，無情清空所有舊的 PDF 殘留檔案！
+# 🌟 硬碟防護：每次啟動時清掉已到期的下載檔 (以前整個 generated_pdfs 砍掉重建，
+# 開多個 worker 時會把別的 worker 剛登記的下載刪掉)；還沒到期的重新排程到期刪除。
+# PDF 一律經過 /api/download/{token}.pdf 下載，不再把 generated_pdfs 整個資料夾掛成靜態檔案。
 # =====================================================================
-PDF_DIR = "generated_pdfs"
-if os.path.exists(PDF_DIR):
-    shutil.rmtree(PDF_DIR) # 砍掉整個資料夾與裡面的所有檔案
-os.makedirs(PDF_DIR, exist_ok=True) # 重新建立一個乾淨的空資料夾
-
-# 掛載乾淨的資料夾，讓前端可以下載檔案
-app.mount("/generated_pdfs", StaticFiles(directory=PDF_DIR), name="generated_pdfs")
+@app.on_event("startup")
+async def clean_generated_pdfs():
+    for token in await asyncio.to_thread(cleanup_downloads):
+        asyncio.create_task(expire_download_later(token))
 
 
 # 註冊路由
@@ -53,8 +56,15 @@ app.include_router(master_router, prefix="/api/master", tags=["MasterDB"])
 app.include_router(inspection.router, prefix="/api/inspection", tags=["Inspection"])
 app.include_router(inventory_router, prefix="/api/inventory", tags=["Inventory"]) 
 app.include_router(hktvmall_router, prefix="/api/hktvmall", tags=["HKTVmall"])
+app.include_router(download_router, prefix="/api/download", tags=["Download"])
+app.include_router(font_router, prefix="/api/fonts", tags=["Fonts"])
 
 
 @app.get("/")
 def read_root():
-    return {"message": "Letech 3PL System Backend is Running!"}
\ No newline at end of file
+    return {"message": "Letech 3PL System Backend is Running!"}
+
+# 🌟 各種記憶體快取的命中率，方便觀察是否需要調整大小 (dear：DEAR API 連線池與每次呼叫的耗時)
+@app.get("/api/cache_stats")
+def read_cache_stats():
+    return {"barcode": barcode_cache_stats(), "search": search_cache_stats(), "dear": dear_client_stats()}
\ No newline at end of file
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
 from pypdf import PdfReader
-import io
-import re
 import uuid
 import os
+import asyncio
 import gc
 import random  # 🌟 新增：用於生成 5 位數任務碼
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from core.pick_list_parser import PROFILES, iter_parsed_pages
+from core.pdf_text import extract_page_texts
+from core.uploads import save_upload, remove_quietly
 
 load_dotenv()
 
@@ -53,10 +55,12 @@ async def upload_inspection_pdf(zone: str, file: UploadFile = File(...)):
     if zone_key not in valid_zones:
         raise HTTPException(status_code=400, detail="未知的區域")
 
+    pdf_path = None
+    pdf_file = None
     try:
-        # 讀取檔案至記憶體
-        file_bytes = await file.read()
-        pdf_file = io.BytesIO(file_bytes)
+        # 🌟 串流寫入暫存檔，PdfReader 直接讀檔案 (不再整份載入記憶體)
+        pdf_path, content_hash = await save_upload(file, "inspection")
+        pdf_file = open(pdf_path, "rb")
         reader = PdfReader(pdf_file)
 
         # 🌟 生成 5 位數任務碼
@@ -66,61 +70,15 @@ async def upload_inspection_pdf(zone: str, file: UploadFile = File(...)):
         items_dict = {} 
         seq_counter = 1 
 
-        # 解析 PDF
-        for page in reader.pages:
-            text = page.extract_text()
-            if not text or not text.strip(): continue
-
-            raw_lines = [line.strip() for line in text.split('\n') if line.strip()]
-            lines = [l for l in raw_lines if not l.startswith("[Image")]
-            if not lines: continue
-
-            p_no = lines[0] if lines else "Unknown"
-
-            qty_line_idx = -1
-            qty = 1
-            for idx, line in enumerate(lines):
-                if ".0000" in line:
-                    qty_line_idx = idx
-                    match = re.search(r"(\d+)\s*\.0000", line)
-                    if match and int(match.group(1)) > 0:
-                        qty = int(match.group(1))
-                    elif idx > 0 and lines[idx-1].strip().isdigit():
-                        qty = int(lines[idx-1].strip())
-                        qty_line_idx = idx - 1
-                    break
-
-            p_name = ""
-            if qty_line_idx > 1:
-                p_name = " ".join(lines[1:qty_line_idx])
-            elif len(lines) > 1 and qty_line_idx == -1:
-                p_name = lines[1]
-
-            # 條碼萃取與淨化邏輯
-            barcode_val = ""
-            if qty_line_idx != -1 and qty_line_idx < len(lines) - 1:
-                raw_lines_after_qty = lines[qty_line_idx+1:]
-                raw_text = "".join(raw_lines_after_qty)
-                star_match = re.search(r'\*(.*?)\*', raw_text)
-                
-                if star_match:
-                    extracted = star_match.group(1)
-                    # 🌟 修正：只移除空白，保留橫線 (-)
-                    clean_extracted = re.sub(r'[\s]', '', extracted)
-                    clean_extracted = re.sub(r'\(?N/?A\)?', '', clean_extracted, flags=re.IGNORECASE)
-                    if clean_extracted:
-                        barcode_val = clean_extracted
-                else:
-                     # 🌟 修正：只移除空白，保留橫線 (-)
-                     fallback_text = re.sub(r'[\s]', '', raw_text)
-                     fallback_text = re.sub(r'\(?N/?A\)?', '', fallback_text, flags=re.IGNORECASE)
-                     # 🌟 修正：允許匹配橫線 (-)
-                     fallback_match = re.search(r'[A-Za-z0-9\-]{5,}', fallback_text)
-                     if fallback_match:
-                         barcode_val = fallback_match.group(0)
-
-            if not barcode_val or barcode_val.strip().upper() in ["N/A", "(N/A)", "NA", "-"] or len(barcode_val) < 4: 
-                barcode_val = p_no
+        # 解析 PDF (共用揀貨單解析引擎)
+        # 逐頁萃取文字是同步的 CPU 工作 (多核心時還要等子 Process)，丟到 thread 裡跑，不卡住 event loop
+        page_texts = await asyncio.to_thread(extract_page_texts, pdf_path, reader, content_hash=content_hash)
+        for _, parsed in iter_parsed_pages(page_texts, PROFILES["inspection"]):
+            if parsed is None: continue
+            p_no = parsed["p_no"]
+            p_name = parsed["name"]
+            qty = parsed["qty"]
+            barcode_val = parsed["barcode"]
 
             if p_no in items_dict:
                 items_dict[p_no]["Target_Qty"] += qty
@@ -149,17 +107,20 @@ async def upload_inspection_pdf(zone: str, file: UploadFile = File(...)):
             supabase.table("inspection_items").insert(items_list).execute()
 
         # 核心防護：釋放記憶體
-        del file_bytes
-        del pdf_file
         del reader
         gc.collect() 
 
         # 🌟 回傳 task_code 給前端
         return {"status": "success", "task_code": task_code, "task": {"filename": file.filename, "items": items_list}}
 
+    except HTTPException:
+        raise
     except Exception as e:
         gc.collect() 
         raise HTTPException(status_code=500, detail=f"PDF 解析或資料庫寫入失敗: {str(e)}")
+    finally:
+        if pdf_file: pdf_file.close()
+        remove_quietly(pdf_path)
 
 
 # ================= 3. 員工更新數量 =================
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from pypdf import PdfReader, PdfWriter
-import re
-import io
-import os
 import asyncio
-import barcode
-from barcode.writer import ImageWriter
-import uuid
 import gc
+from functools import partial
+from core.pick_list_parser import PROFILES, iter_parsed_pages
+from core.pdf_text import iter_page_texts
+from core.uploads import save_upload, remove_quietly
+from core.pick_list_job import run_pick_list_job, build_upload_response, stream_pick_list_job
+from core.label_templates import render_label_template
+from core.barcodes import barcode_data_uri
+from services.download_api import expire_download_later
 
 try:
     from services.stats_api import log_action
@@ -15,114 +16,56 @@ except ImportError:
     def log_action(name): pass
 
 router = APIRouter()
-PDF_OUT_DIR = "generated_pdfs"
-os.makedirs(PDF_OUT_DIR, exist_ok=True)
-
-# 🌟 20分鐘後自動毀滅任務
-async def delete_file_later(file_path: str):
-    await asyncio.sleep(300)  # 1200秒 = 20分鐘
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-        except:
-            pass
-    gc.collect() # 刪除後順手清理記憶體
-
-def generate_barcode_b64(data: str):
-    try:
-        Code128 = barcode.get_barcode_class('code128')
-        rv = io.BytesIO()
-        Code128(data, writer=ImageWriter()).write(rv, options={"write_text": False, "module_height": 10.0, "quiet_zone": 1.0})
-        import base64
-        b64 = base64.b64encode(rv.getvalue()).decode("utf-8")
-        return f"data:image/png;base64,{b64}"
-    except: return ""
 
 def create_anymall_label_html(barcode_val, qty):
-    barcode_img_src = generate_barcode_b64(barcode_val)
-    single_label = f"""
-    <div style="width: 70mm; height: 50mm; box-sizing: border-box; page-break-after: always; display: flex; flex-direction: column; justify-content: center; align-items: center; padding-top: 3mm; overflow: hidden;">
-        <img src="{barcode_img_src}" style="height: 25mm; width: 90%; object-fit: contain;">
-        <div style="font-family: monospace; font-weight: bold; font-size: 17pt; margin-top: 3px; letter-spacing: 1px; color: black;">{barcode_val}</div>
-    </div>"""
-    return f"<html><head><style>@page {{ size: 70mm 50mm; margin: 0; }} body {{ margin: 0; padding: 0; background-color: white; }}</style></head><body>{single_label * qty}</body></html>"
+    barcode_img_src = barcode_data_uri(barcode_val)
+    return render_label_template("anymall", qty, barcode_img=barcode_img_src, barcode=barcode_val)
 
-def process_anymall_pdf(file_bytes):
-    pdf_file = io.BytesIO(file_bytes)
-    reader = PdfReader(pdf_file)
-    writer = PdfWriter()
-    temp_items = []
-    product_no_tracker = {}
+def iter_anymall_pages(pdf_path, reader, content_hash=None):
+    """逐頁產生 (頁碼, item)，交給 run_pick_list_job 統一處理快取、重複統計與下載。"""
     
-    for i, page in enumerate(reader.pages):
-        text = page.extract_text()
-        if not text or not text.strip(): continue
-        writer.add_page(page)
-        lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
-        p_no = lines[0] if lines else "Unknown"
-        
-        qty = 1
-        qty_line_index = -1
-        for idx, line in enumerate(lines):
-            if ".0000" in line:
-                qty_line_index = idx
-                match = re.search(r"(\d+)\s*\.0000", line)
-                if match and int(match.group(1)) > 0: qty = int(match.group(1))
-                elif idx > 0 and lines[idx-1].strip().isdigit(): 
-                    qty = int(lines[idx-1].strip())
-                    qty_line_index = idx - 1
-                break
-        
-        p_name = ""
-        if qty_line_index > 1: p_name = " ".join(lines[1:qty_line_index])
-        elif len(lines) > 1 and qty_line_index == -1: p_name = lines[1]
-            
-        barcode_val = ""
-        if qty_line_index != -1 and qty_line_index < len(lines) - 1:
-            raw = lines[qty_line_index+1:]
-            bc_text = re.sub(r'[\s\*]', '', "".join([l for l in raw if "N/A" not in l and "PAGE" not in l]))
-            if bc_text: barcode_val = bc_text
-        if not barcode_val: barcode_val = "(N/A)"
+    page_texts = iter_page_texts(pdf_path, reader, content_hash=content_hash)
+    for i, parsed in iter_parsed_pages(page_texts, PROFILES["anymall"]):
+        p_no = parsed["p_no"]
+        barcode_val = parsed["barcode"]
 
-        if p_no not in product_no_tracker: product_no_tracker[p_no] = []
-        product_no_tracker[p_no].append(i + 1)
-        
-        needs_print = (barcode_val and barcode_val != "(N/A)" and barcode_val == p_no)
+        needs_print = parsed["needs_print"]
         data_status = 'print' if needs_print else 'no_print'
-        final_html = create_anymall_label_html(barcode_val, qty) if needs_print else ""
+        label = create_anymall_label_html(barcode_val, parsed["qty"]) if needs_print else None
 
-        temp_items.append({
-            "id": f"{p_no}_{i}", "Product_No": p_no, "Name": p_name,
-            "Barcode": barcode_val, "Qty": qty, "Date": "N/A",
-            "status": data_status, "print_html": final_html 
-        })
+        yield i, {
+            "id": f"{p_no}_{i}", "Product_No": p_no, "Name": parsed["name"],
+            "Barcode": barcode_val, "Qty": parsed["qty"], "Date": parsed["date"],
+            "status": data_status, "label": label 
+        }
 
-    out_filename = f"anymall_{uuid.uuid4().hex}.pdf"
-    out_path = os.path.join(PDF_OUT_DIR, out_filename)
-    with open(out_path, "wb") as f: writer.write(f)
-    return temp_items, product_no_tracker, out_filename
+def process_anymall_pdf(pdf_path, content_hash=None, on_item=None):
+    return run_pick_list_job(pdf_path, content_hash, "anymall", None, iter_anymall_pages, on_item)
 
 @router.post("/upload")
-async def upload_anymall_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_anymall_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...), stream: bool = False, label_format: str = None):
+    pdf_path = None
     try:
-        file_bytes = await file.read()
-        items, tracker, out_filename = await asyncio.to_thread(process_anymall_pdf, file_bytes)
+        pdf_path, content_hash = await save_upload(file, "anymall")
+        if stream:
+            # 🌟 串流模式 (?stream=true)：每解析完一頁就先送出 NDJSON，暫存檔交給串流結束後清理
+            response = stream_pick_list_job(partial(process_anymall_pdf, pdf_path, content_hash), pdf_path, "Anymall_Upload", label_format)
+            pdf_path = None
+            return response
+
+        items, tracker, out_token = await asyncio.to_thread(process_anymall_pdf, pdf_path, content_hash)
         
-        # 🌟 立刻釋放巨大的變數記憶體
-        del file_bytes
         gc.collect()
 
         # 🌟 加入自動毀滅任務
-        out_path = os.path.join(PDF_OUT_DIR, out_filename)
-        background_tasks.add_task(delete_file_later, out_path)
+        background_tasks.add_task(expire_download_later, out_token)
 
-        duplicates = [{"Product_No": k, "Count": len(v), "Pages": ", ".join(map(str, v))} for k, v in tracker.items() if len(v) > 1]
         log_action("Anymall_Upload")
-        return {
-            "status": "success", "items": items, "duplicates": duplicates,
-            "summary": {"total_pages": len(items), "has_duplicates": len(duplicates) > 0},
-            "download_url": f"/generated_pdfs/{out_filename}"
-        }
+        return build_upload_response(items, tracker, out_token, label_format)
+    except HTTPException:
+        raise
     except Exception as e: 
         gc.collect() # 報錯也要清記憶體
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        remove_quietly(pdf_path)
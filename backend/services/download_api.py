@@ -0,0 +1,182 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from pypdf import PdfReader, PdfWriter
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows 開發機：只有單一 process，thread lock 就夠了
+    fcntl = None
+
+# ========================================================
+# 🌟 揀貨單 PDF 下載 (延遲產生)
+# 上傳時不再把每一頁重新寫進 PdfWriter；只記下「保留哪些頁」，
+# 第一次按下載時才產生。大部分揀貨單沒有空白頁，直接回傳原檔 (零複製)。
+# 以上傳檔案的 SHA-256 為 key，同一份檔案重複上傳共用同一個來源檔。
+# 登記內容 (來源檔、保留哪些頁、到期時間) 寫在來源檔旁邊的 {token}.json：
+# 開 uvicorn --workers 時，下載請求不一定會打到處理上傳的那個 worker，每個 worker 都要查得到。
+# 登記 / 到期刪檔 / 啟動清理都在 _registry_lock 裡做 (thread lock + 檔案鎖，跨 worker 也不會一邊登記一邊刪)。
+# 下載一律經過 /api/download/{token}.pdf 檢查登記與期限，generated_pdfs 不再整個資料夾公開。
+# ========================================================
+
+router = APIRouter()
+PDF_OUT_DIR = "generated_pdfs"
+os.makedirs(PDF_OUT_DIR, exist_ok=True)
+
+DOWNLOAD_TTL_SECONDS = int(os.getenv("DOWNLOAD_TTL_SECONDS", "300"))
+
+_lock = threading.Lock()
+_build_locks = {}
+
+@contextmanager
+def _registry_lock():
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(PDF_OUT_DIR, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try: yield
+            finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _src_path(content_hash):
+    return os.path.join(PDF_OUT_DIR, f"src_{content_hash}.pdf")
+
+def _built_path(token):
+    return os.path.join(PDF_OUT_DIR, f"{token}.pdf")
+
+def _entry_path(token):
+    return os.path.join(PDF_OUT_DIR, f"{token}.json")
+
+def _write_entry(token, entry):
+    # 先寫暫存檔再改名，其他 worker 不會讀到寫到一半的內容
+    tmp_path = f"{_entry_path(token)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f: json.dump(entry, f)
+    os.replace(tmp_path, _entry_path(token))
+
+def _read_entry(token):
+    """token 的登記內容 {"src", "kept_pages", "expires"}；沒有登記 (或已被清掉) 時回傳 None。"""
+    try:
+        with open(_entry_path(token), encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def _src_in_use(src, except_token):
+    """還有其他未到期的 token 共用這個來源檔 (同一份 PDF 上傳到不同供應商)。"""
+    now = time.time()
+    for name in os.listdir(PDF_OUT_DIR):
+        if not name.endswith(".json") or name == f"{except_token}.json": continue
+        entry = _read_entry(name[:-5])
+        if entry is not None and entry["src"] == src and entry["expires"] > now: return True
+    return False
+
+def register_download(pdf_path, content_hash, vendor, kept_pages):
+    """
+    把上傳的暫存檔搬到下載區 (同一顆硬碟上只是改名，不會複製)，回傳下載用的 token。
+    kept_pages 為 None 代表沒有略過任何頁面。
+    """
+    token = f"{vendor}_{content_hash}"
+    src = _src_path(content_hash)
+    # 檢查來源檔、搬檔、寫登記要一起做：不然到期清理可能剛好在中間把共用的來源檔刪掉
+    with _registry_lock():
+        if os.path.exists(src):
+            os.remove(pdf_path)
+        else:
+            os.replace(pdf_path, src)
+        _write_entry(token, {"src": src, "kept_pages": kept_pages, "expires": time.time() + DOWNLOAD_TTL_SECONDS})
+    return token
+
+def download_url(token):
+    return f"/api/download/{token}.pdf"
+
+async def expire_download_later(token):
+    # 🌟 到期後自動刪除；期間若同一份檔案又被上傳 (任何一個 worker)，登記檔的期限會被延長
+    while True:
+        entry = _read_entry(token)
+        if entry is None: return
+        remaining = entry["expires"] - time.time()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+            continue
+        with _registry_lock():
+            # 再讀一次：剛好有人重新上傳、延長了期限就繼續等
+            entry = _read_entry(token)
+            if entry is None: return
+            if entry["expires"] > time.time(): continue
+            _remove_download(token, entry)
+        return
+
+def _remove_download(token, entry):
+    """刪掉 token 的登記與裁切過的 PDF；來源檔沒有其他未到期的 token 在用時一併刪除。(呼叫端持有 _registry_lock)"""
+    paths = [_entry_path(token), _built_path(token)]
+    if not _src_in_use(entry["src"], token): paths.append(entry["src"])
+    for path in paths:
+        if os.path.exists(path):
+            try: os.remove(path)
+            except OSError: pass
+
+def cleanup_downloads():
+    """
+    啟動時清理下載區 (取代以前整個資料夾砍掉重建：其他 worker 剛登記的檔案不能刪)：
+    刪掉已到期的登記、沒有登記在用的來源檔 / 裁切檔與寫到一半的暫存檔，回傳還沒到期的 token。
+    """
+    live = []
+    with _registry_lock():
+        now = time.time()
+        for name in os.listdir(PDF_OUT_DIR):
+            if not name.endswith(".json"): continue
+            token = name[:-5]
+            entry = _read_entry(token)
+            if entry is not None and entry["expires"] > now: live.append(token)
+            elif entry is not None: _remove_download(token, entry)
+            else:
+                try: os.remove(_entry_path(token))
+                except OSError: pass
+        keep = {_entry_path(t) for t in live} | {_built_path(t) for t in live} | {_read_entry(t)["src"] for t in live}
+        for name in os.listdir(PDF_OUT_DIR):
+            path = os.path.join(PDF_OUT_DIR, name)
+            if name == ".lock" or path in keep or not os.path.isfile(path): continue
+            # 別的 worker 可能正在裁切 PDF (寫暫存檔不在 _registry_lock 裡)，新的暫存檔先留著
+            if name.endswith(".tmp") and os.path.getmtime(path) > now - DOWNLOAD_TTL_SECONDS: continue
+            try: os.remove(path)
+            except OSError: pass
+    return live
+
+def schedule_download_expiry(token, loop):
+    """從背景 thread (揀貨單解析) 把 expire_download_later 排進 loop，登記完就開始倒數。"""
+    asyncio.run_coroutine_threadsafe(expire_download_later(token), loop)
+
+def _build_trimmed_pdf(token, entry):
+    out_path = _built_path(token)
+    with _lock:
+        build_lock = _build_locks.setdefault(token, threading.Lock())
+    with build_lock:
+        if os.path.exists(out_path): return out_path
+        with open(entry["src"], "rb") as pdf_file:
+            reader = PdfReader(pdf_file)
+            if len(entry["kept_pages"]) == len(reader.pages): return entry["src"]
+            writer = PdfWriter()
+            for i in entry["kept_pages"]: writer.add_page(reader.pages[i])
+            tmp_path = f"{out_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f: writer.write(f)
+        os.replace(tmp_path, out_path)
+    with _lock:
+        _build_locks.pop(token, None)
+    return out_path
+
+@router.get("/{filename}")
+async def download_pdf(filename: str):
+    token = filename[:-4] if filename.endswith(".pdf") else filename
+    entry = _read_entry(token)
+    if entry is None or entry["expires"] <= time.time() or not os.path.exists(entry["src"]):
+        raise HTTPException(status_code=404, detail="檔案已過期，請重新上傳")
+
+    path = entry["src"]
+    if entry["kept_pages"] is not None:
+        path = await asyncio.to_thread(_build_trimmed_pdf, token, entry)
+    vendor = token.split("_", 1)[0]
+    return FileResponse(path, media_type="application/pdf", filename=f"{vendor}.pdf", content_disposition_type="inline")
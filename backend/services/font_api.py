@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from core.fonts import DEFAULT_FONT_PATH, font_fingerprint
+
+# ========================================================
+# 🌟 標籤字體靜態檔
+# 網址帶有字體內容的指紋 (/api/fonts/<指紋>.ttf)，內容不會變，可以讓瀏覽器快取一年；
+# 換字體後指紋跟著變，舊網址回 404，前端重新上傳揀貨單就會拿到新網址。
+# ========================================================
+
+router = APIRouter()
+FONT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{filename}")
+async def get_font(filename: str, request: Request):
+    fingerprint = font_fingerprint(DEFAULT_FONT_PATH)
+    if fingerprint is None or filename != f"{fingerprint}.ttf":
+        raise HTTPException(status_code=404, detail="找不到字體檔")
+
+    etag = f'"{fingerprint}"'
+    headers = {"Cache-Control": FONT_CACHE_CONTROL, "ETag": etag}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(DEFAULT_FONT_PATH, media_type="font/ttf", headers=headers)
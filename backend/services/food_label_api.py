@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Query
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import numpy as np
 import pandas as pd
 import os
-import base64
+import asyncio
 import re
 # 🌟 統一向 master_api 借大腦
-from services.master_api import load_master_db
+from services.master_api import get_master_snapshot, get_match_col, master_search_columns, master_key_columns, rank_master_rows, STATUS_COL, STATUS_COLUMNS
+from core.search_tiers import iter_tiers
+from core.fast_json import FastJSONResponse, select_fields
+from core.fonts import FONT_CSS_PLACEHOLDER, font_face_css
+from core.label_format import render_label
+from core.label_templates import render_label_template
 
 # 🌟 匯入打卡系統
 try:
@@ -17,8 +23,6 @@ except ImportError:
 # ================= 補上遺失的路徑定義 =================
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
-# 🌟 修改預設字體為 msyh.ttf
-DEFAULT_FONT_PATH = os.path.join(DATA_DIR, "font1.ttf")
 # ======================================================
 
 router = APIRouter()
@@ -32,15 +36,6 @@ def get_nutri_val(data, key):
     if pd.isna(val) or str(val).lower() == 'nan': return "0"
     return str(val).strip()
 
-def font_to_base64_css(font_path):
-    if not os.path.exists(font_path): return ""
-    try:
-        with open(font_path, "rb") as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
-        # 🌟 加上微軟雅黑與蘋方作為 Fallback 字型
-        return f"@font-face {{ font-family: 'CustomLabelFont'; src: url(data:font/ttf;base64,{b64_str}) format('truetype'); font-weight: bold; font-style: normal; }} body, .label-container, .label-box, div, span {{ font-family: 'CustomLabelFont', 'Microsoft YaHei', 'PingFang SC', 'Heiti SC', Helvetica, Arial, sans-serif !important; }}"
-    except: return ""
-
 def check_data_status(data_dict):
     if not data_dict: return 'empty'
     
@@ -76,21 +71,8 @@ def smart_get_caution_text(data_dict):
     return None 
 
 def get_best_results(results_df):
-    if results_df.empty: return results_df
-    scores = []
-    for _, row in results_df.iterrows():
-        status = check_data_status(row.to_dict())
-        if status == 'insect': scores.append(3)
-        elif status == 'food': scores.append(2)
-        elif status == 'caution': scores.append(1)
-        else: scores.append(0)
-    results_df = results_df.copy()
-    results_df['__score'] = scores
-    results_df = results_df.sort_values(by='__score', ascending=False)
-    target_col = 'Product_No' if 'Product_No' in results_df.columns else 'ProductCode'
-    if target_col in results_df.columns:
-        results_df = results_df.drop_duplicates(subset=[target_col], keep='first')
-    return results_df
+    # 🌟 狀態在主資料庫載入時已經算好 (__status)，這裡只剩排序去重
+    return rank_master_rows(results_df, STATUS_COL)
 
 # ================= 新增：日期格式化函數 =================
 def format_expiry_date(expiry_value):
@@ -129,62 +111,8 @@ def create_insects_label_html(matched_data, qty):
     ingredients = clean_val(data.get('Ingredients', '')) 
     warnings = clean_val(data.get('警告字眼', ''))         
     
-    single_label_html = f"""
-    <html><head><style>
-        /* FONT_CSS_PLACEHOLDER */
-        @page {{ size: 70mm 50mm; margin: 0; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            font-family: Helvetica, Arial, sans-serif; 
-            background-color: white;
-        }}
-        
-        .label-box {{
-            width: 70mm; 
-            height: 50mm; 
-            box-sizing: border-box; 
-            padding: 3mm 4mm; 
-            overflow: hidden; 
-            background-color: white; 
-            color: black; 
-            font-size: 4pt; 
-            line-height: 1.1; 
-            page-break-after: always;
-        }}
-        
-        .insect-row {{
-            margin-bottom: 6pt; 
-            word-wrap: break-word; 
-            font-weight: bold; 
-            min-height: 6pt;
-        }}
-
-        .label-box, .label-box * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-box">
-            <div class="insect-row">
-                <div>{barcode}</div>
-                <div>{desc}</div>
-            </div>
-            <div class="insect-row">{features}</div>
-            <div class="insect-row">{cautions}</div>
-            <div class="insect-row">{net_content}</div>
-            <div class="insect-row">{ingredients}</div>
-            <div style="word-wrap: break-word; font-weight: bold; min-height: 6pt;">{warnings}</div>
-        </div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single_label_html.replace(div_content, full_body)
-    return single_label_html
+    return render_label(render_label_template("insect", qty, FONT_CSS_PLACEHOLDER, barcode=barcode, desc=desc, features=features, cautions=cautions,
+                                 net_content=net_content, ingredients=ingredients, warnings=warnings))
 
 def create_food_label_html(item_name, barcode_text, matched_data, qty):
     data = matched_data if matched_data else {}
@@ -215,269 +143,104 @@ def create_food_label_html(item_name, barcode_text, matched_data, qty):
     expiry_raw = data.get('Expiry_Date_Format', data.get('AD', ''))
     en_expiry, ch_expiry = format_expiry_date(expiry_raw)
 
-    single_label_html = f"""
-    <html><head><style>
-        /* FONT_CSS_PLACEHOLDER */
-        @page {{ size: auto; margin: 0mm; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            font-family: Helvetica, Arial, sans-serif; 
-        }}
-        
-        .label-container {{ 
-            width: 70mm; 
-            height: 50mm; 
-            position: relative; 
-            box-sizing: border-box; 
-            border: 1px solid #ddd; 
-            page-break-after: always; 
-            overflow: hidden; 
-            font-weight: bold; 
-        }}
-        
-        .barcode-text {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 2mm; 
-            font-size: 5pt; 
-            font-weight: bold; 
-        }}
-        
-        .desc-text {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 4.5mm; 
-            width: 59mm; 
-            font-size: 5pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-        }}
-        
-        .line1 {{ 
-            position: absolute; 
-            left: 0; 
-            top: 9mm; 
-            width: 70mm; 
-            border-top: 1.42pt solid black; 
-        }}
-        
-        .nutri-box {{   
-            position: absolute; 
-            left: 2mm; 
-            top: 10mm; 
-            width: 23mm; 
-            font-size: 4.5pt; /* 统一改字体大小 */
-            line-height: 1.25; /* 统一改行距 */
-            font-weight: bold; 
-        }}
-        
-        .nutri-title {{ 
-            font-weight: bold; 
-            margin-bottom: 1px; 
-        }}
-        
-        .nutri-row {{ 
-            display: flex; 
-            justify-content: space-between; 
-        }}
-        
-        .indent {{ 
-            padding-left: 3px; 
-        }}
-        
-        .vline {{ 
-            position: absolute; 
-            left: 26mm; 
-            top: 9mm; 
-            height: 29mm; 
-            border-left: 1.42pt solid black; 
-        }}
-        
-        .line2 {{ 
-            position: absolute; 
-            left: 0; 
-            top: 38mm; 
-            width: 70mm; 
-            border-top: 1.42pt solid black; 
-        }}
-        
-        .mfr-box {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 40mm; 
-            width: 35mm; 
-            font-size: 4.76pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-        }}
-        
-        .bb-box {{ 
-            position: absolute; 
-            left: 47mm; 
-            top: 40mm; 
-            width: 27mm; 
-            font-size: 4.2pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-            white-space: nowrap; 
-        }}
-        
-        .ing-box {{ 
-            position: absolute; 
-            left: 27mm; 
-            top: 10mm; 
-            width: 41mm; 
-            height: 28mm; 
-            font-size: 3.5pt; 
-            line-height: 1.1; 
-            overflow: hidden; 
-            text-align: left; /* 🌟 1. 改成靠左對齊，避免單字被亂拉長 */
-            font-weight: bold; 
-            letter-spacing: 0.2pt; /* 🌟 2. 調整字母與字母之間的距離 (可調 0.1pt ~ 0.5pt) */
-            word-spacing: 0.5pt;   /* 🌟 3. (可選) 調整英文單字與單字之間的距離 */
-        }}
-
-        /* 強制全域粗體 */
-        .label-container, .label-container * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-container">
-            <div class="barcode-text">{b_text}</div>
-            <div class="desc-text">{desc_text}</div>
-            <div class="line1"></div>
-            <div class="nutri-box">
-                <div class="nutri-title">Nutrition Information</div>
-                <br>
-                <div class="nutri-row"><span>Serving Size:</span><span>{nutri['Serving_Size']}</span></div>
-                <div class="nutri-row"><span>Energy:</span><span>{nutri['Energy']}</span></div>
-                <div class="nutri-row"><span>Protein:</span><span>{nutri['Protein']}</span></div>
-                <div class="nutri-row"><span>Total fat:</span><span>{nutri['Total_Fat']}</span></div>
-                <div class="nutri-row indent"><span>- Saturated fat:</span><span>{nutri['Sat_Fat']}</span></div>
-                <div class="nutri-row indent"><span>- Trans fat:</span><span>{nutri['Trans_Fat']}</span></div>
-                <div class="nutri-row"><span>Carbohydrates:</span><span>{nutri['Carb']}</span></div>
-                <div class="nutri-row indent"><span>- Sugars:</span><span>{nutri['Sugar']}</span></div>
-                <div class="nutri-row"><span>Sodium:</span><span>{nutri['Sodium']}</span></div>
-                <div class="nutri-row"><span>Net Content:</span><span>{nutri['Net_Content']}</span></div>
-                <div class="nutri-row"><span>Country Of Origin:</span><span>{nutri['Country_Of_Origin']}</span></div>
-            </div>
-            <div class="vline"></div>
-            <div class="ing-box">{ing_text}</div>
-            <div class="line2"></div>
-            <div class="mfr-box">{mfr_text}</div>
-            <div class="bb-box">Best before({en_expiry}):<br>此日期前最佳({ch_expiry})<br>Show on package(見包裝)</div>
-        </div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single_label_html.replace(div_content, full_body)
-    return single_label_html
+    return render_label(render_label_template("food", qty, FONT_CSS_PLACEHOLDER, barcode=b_text, desc=desc_text, ingredients=ing_text,
+                                 manufacturer=mfr_text, en_expiry=en_expiry, ch_expiry=ch_expiry, **nutri))
 
 def create_caution_html(text, qty):
     formatted = str(text).replace('\n', '<br/>')
     if not formatted or formatted == "nan": formatted = ""
-    single = f"""
-    <html><head><style>
-        /* FONT_CSS_PLACEHOLDER */
-        @page {{ size: auto; margin: 0mm; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            font-family: Helvetica, Arial, sans-serif; 
-        }}
-        
-        .label-container {{ 
-            width: 70mm; 
-            height: 50mm; 
-            box-sizing: border-box; 
-            padding: 2mm; 
-            page-break-after: always; 
-            display: flex; 
-            align-items: center; 
-            justify-content: center; 
-            text-align: center; 
-        }}
-        
-        .caution-text {{ 
-            font-size: 15pt; 
-            font-weight: 900; 
-            line-height: 1.2; 
-            word-wrap: break-word; 
-            color: black; 
-        }}
-        
-        /* 強制全域粗體 */
-        .label-container, .label-container * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-container"><div class="caution-text">{formatted}</div></div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single.replace(div_content, full_body)
-    return single
+    return render_label(render_label_template("caution", qty, FONT_CSS_PLACEHOLDER, text=formatted))
 
 # ================= API 路由 =================
 
+# 搜尋結果的欄位；列表畫面不需要整列資料時可用 ?fields=Product_No,Barcode,Name,status 省掉 matched_data
+FOOD_SEARCH_FIELDS = ['Product_No', 'Barcode', 'Name', 'status', 'matched_data']
+
+def rank_positions(table, positions):
+    """跟 get_best_results 相同的排序去重，但只取排序需要的欄位，回傳排好的列位置。"""
+    key_cols = [col for col in ('Product_No', 'ProductCode') if col in table.columns] + [STATUS_COL]
+    slim = pd.DataFrame({col: table.values(col, positions) for col in key_cols}, index=positions, columns=key_cols)
+    return get_best_results(slim).index.to_numpy()
+
+def _column_values(table, col, positions):
+    if col is None or col not in table.columns: return [""] * len(positions)
+    return ["" if v is None else v for v in table.values(col, positions)]
+
+# 🌟 每次最多回傳幾筆：像 "a" 這種短查詢可能符合幾萬列，整列 matched_data 全部送出去又大又慢。
+# 結果分層 (core.search_tiers)：貨號 / 條碼完全相同 → 開頭相同 → 任一欄包含查詢；
+# 每層內再依標籤完整度排序 (蟲蟲 > 食品 > 警告 > 空)、同貨號只留一列 (前面的層出現過的貨號不再出現)。
+# 前面的層已經湊滿 offset + limit 筆時不再查下一層 (貼上完整條碼時不必掃整個資料庫)，
+# 這時總筆數未知：查完全部層級時總筆數放在 X-Total-Count；後面可能還有結果時 X-Has-More 為 1。
+FOOD_SEARCH_LIMIT = 50
+FOOD_SEARCH_MAX_LIMIT = 500
+
+def _dedupe_col(table):
+    # 跟 rank_master_rows 相同的去重欄位
+    for col in ('Product_No', 'ProductCode'):
+        if col in table.columns: return col
+    return None
+
+def find_food_positions(table, query, wanted=None):
+    """
+    分層排好的符合列 (trigram 索引 / 正規化鍵，不必整欄 contains)；
+    wanted 有值時湊滿 wanted 筆就不再查下一層。回傳 (列位置, 是否查完全部層級)。
+    """
+    dedupe_col = _dedupe_col(table)
+    seen_codes, ranked, count = set(), [], 0
+
+    def substring(limit):
+        positions = np.empty(0, dtype=np.int64)
+        for col in master_search_columns(table):
+            positions = np.union1d(positions, table.find(col, query))
+        return positions
+
+    for tier, positions in iter_tiers(table, query, master_key_columns(table), substring):
+        if len(positions) == 0: continue
+        positions = rank_positions(table, positions)
+        # 最後一層而且前面的層沒有結果時不必再取貨號去重
+        if dedupe_col is not None and (seen_codes or tier != "substring"):
+            codes = table.values(dedupe_col, positions)
+            positions = positions[np.array([code not in seen_codes for code in codes], dtype=bool)]
+            seen_codes.update(codes)
+        ranked.append(positions)
+        count += len(positions)
+        if wanted is not None and count >= wanted and tier != "substring":
+            return np.concatenate(ranked), False
+    return (np.concatenate(ranked) if ranked else np.empty(0, dtype=np.int64)), True
+
 @router.get("/search")
-async def search_food_label(q: str):
-    df_master = load_master_db()
-    if df_master is None or df_master.empty:
+async def search_food_label(q: str, fields: Optional[str] = Query(None, description="只回傳這些欄位 (逗號分隔)"),
+                            limit: int = Query(FOOD_SEARCH_LIMIT, ge=1, le=FOOD_SEARCH_MAX_LIMIT, description="最多回傳幾筆"),
+                            offset: int = Query(0, ge=0, description="從排序後的第幾筆開始")):
+    selected = select_fields(fields, FOOD_SEARCH_FIELDS)
+    master = await asyncio.to_thread(get_master_snapshot)
+    if master is None or master.table.empty:
         raise HTTPException(status_code=404, detail="資料庫尚未載入")
+    table = master.table
         
     query = q.strip().lower()
-    match_col = 'Product_No' if 'Product_No' in df_master.columns else 'ProductCode'
-    if match_col not in df_master.columns and 'Product No' in df_master.columns:
-        match_col = 'Product No'
-        
-    # 確保 Barcode 欄位存在以防報錯
-    barcode_col_exists = 'Barcode' in df_master.columns
-        
-    # 同時比對商品編號、條碼、名稱
-    mask = df_master[match_col].astype(str).str.lower().str.contains(query, na=False)
-    
-    if barcode_col_exists:
-        mask = mask | df_master['Barcode'].astype(str).str.lower().str.contains(query, na=False)
-        
-    name_col = df_master.get('Name', df_master.get('Description', pd.Series(dtype=str)))
-    mask = mask | name_col.astype(str).str.lower().str.contains(query, na=False)
-    
-    results = df_master[mask]
-    if results.empty: return []
         
-    # 智能排序，優先顯示有完整資料的 (蟲蟲 > 食品 > 警告 > 空)
-    best_results = get_best_results(results).fillna("")
-    
-    output = []
-    for _, row in best_results.iterrows():
-        matched_data = row.to_dict()
-        data_status = check_data_status(matched_data)
-        
-        p_no = str(row.get(match_col, ''))
-        barcode = str(row.get('Barcode', '')) if barcode_col_exists else ""
-        name = clean_val(row.get('Name', row.get('Description', '')))
-        
-        output.append({
-            "Product_No": p_no,
-            "Barcode": barcode,
-            "Name": name,
-            "status": data_status,
-            "matched_data": matched_data
-        })
-        
-    return output
+    # 智能排序：完全相同的貨號 / 條碼優先，同一層內有完整資料的優先 (蟲蟲 > 食品 > 警告 > 空)
+    ranked, complete = await asyncio.to_thread(find_food_positions, table, query, offset + limit + 1)
+    page = ranked[offset:offset + limit]
+    headers = {"X-Has-More": "1" if len(ranked) > offset + limit else "0"}
+    if complete: headers["X-Total-Count"] = str(len(ranked))
+    return FastJSONResponse(build_search_results(table, page, selected), headers=headers)
+
+def build_search_results(table, positions, selected):
+    """🌟 整欄取值再組成結果 (不必整份 DataFrame + iterrows)；只算 selected 裡的欄位。"""
+    match_col = get_match_col(table)
+    name_col = 'Name' if 'Name' in table.columns else 'Description'
+    columns = {}
+    if 'Product_No' in selected: columns['Product_No'] = _column_values(table, match_col, positions)
+    if 'Barcode' in selected: columns['Barcode'] = _column_values(table, 'Barcode', positions)
+    if 'Name' in selected: columns['Name'] = [clean_val(v) for v in _column_values(table, name_col, positions)]
+    if 'status' in selected: columns['status'] = table.values(STATUS_COL, positions)
+    if 'matched_data' in selected:
+        data_cols = [col for col in table.columns if col not in STATUS_COLUMNS]
+        data_values = [_column_values(table, col, positions) for col in data_cols]
+        columns['matched_data'] = [dict(zip(data_cols, row)) for row in zip(*data_values)]
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
 
 class PrintRequest(BaseModel):
     item: Dict[str, Any]
@@ -486,7 +249,7 @@ class PrintRequest(BaseModel):
     status: str
 
 @router.post("/generate_html")
-async def generate_print_html(req: PrintRequest):
+async def generate_print_html(req: PrintRequest, request: Request):
     qty = req.qty
     status = req.status
     matched_data = req.matched_data
@@ -503,9 +266,9 @@ async def generate_print_html(req: PrintRequest):
     else:
         raise HTTPException(status_code=400, detail="此商品無有效標籤資料")
         
-    font_css = font_to_base64_css(DEFAULT_FONT_PATH)
+    font_css = font_face_css(request)
     if final_html:
-        final_html = final_html.replace('/* FONT_CSS_PLACEHOLDER */', font_css)
+        final_html = final_html.replace(FONT_CSS_PLACEHOLDER, font_css)
         
     log_action("FoodLabel_Search")
     return {"html": final_html}
\ No newline at end of file
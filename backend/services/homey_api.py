@@ -1,17 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from pypdf import PdfReader, PdfWriter
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Request
 import pandas as pd
 import re
-import io
 import os
 import asyncio
-import base64
-import uuid
 import gc
-import barcode
-from barcode.writer import ImageWriter
+from functools import partial
 # 🌟 統一借大腦，不自己建立 cache
-from services.master_api import load_master_db
+from services.master_api import get_master_snapshot, master_version, find_master_positions
+from core.pick_list_parser import PROFILES, iter_parsed_pages
+from core.pdf_text import iter_page_texts
+from core.uploads import save_upload, remove_quietly
+from core.pick_list_job import run_pick_list_job, build_upload_response, stream_pick_list_job
+from core.label_templates import render_label_template
+from core.barcodes import barcode_data_uri
+from core.fonts import FONT_CSS_PLACEHOLDER, font_face_css
+from services.download_api import expire_download_later
 
 try:
     from services.stats_api import log_action
@@ -20,20 +23,7 @@ except ImportError:
 
 router = APIRouter()
 DATA_DIR = "data"
-PDF_OUT_DIR = "generated_pdfs"
-# 🌟 修改預設字體為 msyh.ttf
-DEFAULT_FONT_PATH = os.path.join(DATA_DIR, "font1.ttf")
-
 os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(PDF_OUT_DIR, exist_ok=True)
-
-# 🌟 20分鐘後自動毀滅任務
-async def delete_file_later(file_path: str):
-    await asyncio.sleep(300)
-    if os.path.exists(file_path):
-        try: os.remove(file_path)
-        except: pass
-    gc.collect()
 
 def clean_val(val):
     if pd.isna(val) or str(val).lower() == 'nan': return ""
@@ -44,24 +34,6 @@ def get_nutri_val(data, key):
     if pd.isna(val) or str(val).lower() == 'nan': return "0"
     return str(val).strip()
 
-def font_to_base64_css(font_path):
-    if not os.path.exists(font_path): return ""
-    try:
-        with open(font_path, "rb") as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
-        # 🌟 加上微軟雅黑與蘋方作為 Fallback 字型
-        return f"@font-face {{ font-family: 'CustomLabelFont'; src: url(data:font/ttf;base64,{b64_str}) format('truetype'); font-weight: bold; font-style: normal; }} body, .label-container, .label-box, div, span {{ font-family: 'CustomLabelFont', 'Microsoft YaHei', 'PingFang SC', 'Heiti SC', Helvetica, Arial, sans-serif !important; }}"
-    except: return ""
-
-def generate_barcode_b64(data: str):
-    try:
-        Code128 = barcode.get_barcode_class('code128')
-        rv = io.BytesIO()
-        Code128(data, writer=ImageWriter()).write(rv, options={"write_text": False, "module_height": 10.0, "quiet_zone": 1.0})
-        b64 = base64.b64encode(rv.getvalue()).decode("utf-8")
-        return f"data:image/png;base64,{b64}"
-    except: return ""
-
 # ================= 新增：日期格式化函數 =================
 def format_expiry_date(expiry_value):
     if pd.isna(expiry_value) or str(expiry_value).lower() == 'nan':
@@ -88,69 +60,8 @@ def format_expiry_date(expiry_value):
 
 # 🌟 將 font_css 直接當作參數傳入，確保每種標籤都能載入自訂粗體
 def create_homey_repack_label_html(p_name, barcode_val, qty, font_css=""):
-    barcode_img_src = generate_barcode_b64(barcode_val)
-    single_label_html = f"""
-    <html><head><style>
-        {font_css}
-        @page {{ size: 70mm 50mm; margin: 0; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            background-color: white; 
-        }}
-        
-        .label-container {{
-            width: 70mm; 
-            height: 50mm; 
-            box-sizing: border-box; 
-            page-break-after: always; 
-            display: flex; 
-            flex-direction: column; 
-            justify-content: center; 
-            align-items: center; 
-            padding-top: 3mm; 
-            overflow: hidden; 
-            text-align: center;
-        }}
-        
-        .barcode-text {{
-            font-family: monospace; 
-            font-weight: bold; 
-            font-size: 14pt; 
-            margin-top: 2px; 
-            letter-spacing: 1px; 
-            color: black;
-        }}
-        
-        .name-text {{
-            font-size: 10pt; 
-            font-weight: bold; 
-            margin-top: 6px; 
-            width: 95%; 
-            word-wrap: break-word; 
-            line-height: 1.2; 
-            color: black;
-        }}
-
-        .label-container, .label-container * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-container">
-            <img src="{barcode_img_src}" style="height: 18mm; width: 90%; object-fit: contain;">
-            <div class="barcode-text">{barcode_val}</div>
-            <div class="name-text">{p_name}</div>
-        </div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single_label_html.replace(div_content, full_body)
-    return single_label_html
+    barcode_img_src = barcode_data_uri(barcode_val)
+    return render_label_template("repack", qty, font_css, barcode_img=barcode_img_src, barcode=barcode_val, name=p_name)
 
 def create_insects_label_html(matched_data, qty, font_css=""):
     data = matched_data if matched_data else {}
@@ -163,62 +74,8 @@ def create_insects_label_html(matched_data, qty, font_css=""):
     ingredients = clean_val(data.get('Ingredients', '')) 
     warnings = clean_val(data.get('警告字眼', ''))         
     
-    single_label_html = f"""
-    <html><head><style>
-        {font_css}
-        @page {{ size: 70mm 50mm; margin: 0; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            font-family: Helvetica, Arial, sans-serif; 
-            background-color: white;
-        }}
-        
-        .label-box {{
-            width: 70mm; 
-            height: 50mm; 
-            box-sizing: border-box; 
-            padding: 3mm 4mm; 
-            overflow: hidden; 
-            background-color: white; 
-            color: black; 
-            font-size: 4pt; 
-            line-height: 1.1; 
-            page-break-after: always;
-        }}
-        
-        .insect-row {{
-            margin-bottom: 6pt; 
-            word-wrap: break-word; 
-            font-weight: bold; 
-            min-height: 6pt;
-        }}
-
-        .label-box, .label-box * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-box">
-            <div class="insect-row">
-                <div>{barcode}</div>
-                <div>{desc}</div>
-            </div>
-            <div class="insect-row">{features}</div>
-            <div class="insect-row">{cautions}</div>
-            <div class="insect-row">{net_content}</div>
-            <div class="insect-row">{ingredients}</div>
-            <div style="word-wrap: break-word; font-weight: bold; min-height: 6pt;">{warnings}</div>
-        </div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single_label_html.replace(div_content, full_body)
-    return single_label_html
+    return render_label_template("insect", qty, font_css, barcode=barcode, desc=desc, features=features, cautions=cautions,
+                                 net_content=net_content, ingredients=ingredients, warnings=warnings)
 
 def create_food_label_html(item_name, barcode_text, matched_data, qty, font_css=""):
     data = matched_data if matched_data else {}
@@ -249,253 +106,35 @@ def create_food_label_html(item_name, barcode_text, matched_data, qty, font_css=
     expiry_raw = data.get('Expiry_Date_Format', data.get('AD', ''))
     en_expiry, ch_expiry = format_expiry_date(expiry_raw)
 
-    single_label_html = f"""
-    <html><head><style>
-        {font_css}
-        @page {{ size: auto; margin: 0mm; }}
-        
-        body {{ 
-            margin: 0; 
-            padding: 0; 
-            font-family: Helvetica, Arial, sans-serif; 
-        }}
-        
-        .label-container {{ 
-            width: 70mm; 
-            height: 50mm; 
-            position: relative; 
-            box-sizing: border-box; 
-            border: 1px solid #ddd; 
-            page-break-after: always; 
-            overflow: hidden; 
-            font-weight: bold; 
-        }}
-        
-        .barcode-text {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 2mm; 
-            font-size: 5pt; 
-            font-weight: bold; 
-        }}
-        
-        .desc-text {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 4.5mm; 
-            width: 59mm; 
-            font-size: 5pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-        }}
-        
-        .line1 {{ 
-            position: absolute; 
-            left: 0; 
-            top: 9mm; 
-            width: 70mm; 
-            border-top: 1.42pt solid black; 
-        }}
-        
-        .nutri-box {{   
-            position: absolute; 
-            left: 2mm; 
-            top: 10mm; 
-            width: 23mm; 
-            font-size: 4.5pt; /* 统一改字体大小 */
-            line-height: 1.25; /* 统一改行距 */
-            font-weight: bold; 
-        }}
-        
-        .nutri-title {{ 
-            font-weight: bold; 
-            margin-bottom: 1px; 
-        }}
-        
-        .nutri-row {{ 
-            display: flex; 
-            justify-content: space-between; 
-        }}
-        
-        .indent {{ 
-            padding-left: 3px; 
-        }}
-        
-        .vline {{ 
-            position: absolute; 
-            left: 26mm; 
-            top: 9mm; 
-            height: 29mm; 
-            border-left: 1.42pt solid black; 
-        }}
-        
-        .line2 {{ 
-            position: absolute; 
-            left: 0; 
-            top: 38mm; 
-            width: 70mm; 
-            border-top: 1.42pt solid black; 
-        }}
-        
-        .mfr-box {{ 
-            position: absolute; 
-            left: 2mm; 
-            top: 40mm; 
-            width: 35mm; 
-            font-size: 4.76pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-        }}
-        
-        .bb-box {{ 
-            position: absolute; 
-            left: 47mm; 
-            top: 40mm; 
-            width: 27mm; 
-            font-size: 4.2pt; 
-            line-height: 1.2; 
-            font-weight: bold; 
-            white-space: nowrap; 
-        }}
-        
-        .ing-box {{ 
-            position: absolute; 
-            left: 27mm; 
-            top: 10mm; 
-            width: 41mm; 
-            height: 28mm; 
-            font-size: 3.5pt; 
-            line-height: 1.1; 
-            overflow: hidden; 
-            text-align: left; /* 🌟 1. 改成靠左對齊，避免單字被亂拉長 */
-            font-weight: bold; 
-            letter-spacing: 0.2pt; /* 🌟 2. 調整字母與字母之間的距離 (可調 0.1pt ~ 0.5pt) */
-            word-spacing: 0.5pt;   /* 🌟 3. (可選) 調整英文單字與單字之間的距離 */
-        }}
-
-        /* 強制全域粗體 */
-        .label-container, .label-container * {{ 
-            font-weight: 900 !important; 
-        }}
-    </style></head><body>
-        <div class="label-container">
-            <div class="barcode-text">{b_text}</div>
-            <div class="desc-text">{desc_text}</div>
-            <div class="line1"></div>
-            <div class="nutri-box">
-                <div class="nutri-title">Nutrition Information</div>
-                <br>
-                <div class="nutri-row"><span>Serving Size:</span><span>{nutri['Serving_Size']}</span></div>
-                <div class="nutri-row"><span>Energy:</span><span>{nutri['Energy']}</span></div>
-                <div class="nutri-row"><span>Protein:</span><span>{nutri['Protein']}</span></div>
-                <div class="nutri-row"><span>Total fat:</span><span>{nutri['Total_Fat']}</span></div>
-                <div class="nutri-row indent"><span>- Saturated fat:</span><span>{nutri['Sat_Fat']}</span></div>
-                <div class="nutri-row indent"><span>- Trans fat:</span><span>{nutri['Trans_Fat']}</span></div>
-                <div class="nutri-row"><span>Carbohydrates:</span><span>{nutri['Carb']}</span></div>
-                <div class="nutri-row indent"><span>- Sugars:</span><span>{nutri['Sugar']}</span></div>
-                <div class="nutri-row"><span>Sodium:</span><span>{nutri['Sodium']}</span></div>
-                <div class="nutri-row"><span>Net Content:</span><span>{nutri['Net_Content']}</span></div>
-                <div class="nutri-row"><span>Country Of Origin:</span><span>{nutri['Country_Of_Origin']}</span></div>
-            </div>
-            <div class="vline"></div>
-            <div class="ing-box">{ing_text}</div>
-            <div class="line2"></div>
-            <div class="mfr-box">{mfr_text}</div>
-            <div class="bb-box">Best before({en_expiry}):<br>此日期前最佳({ch_expiry})<br>Show on package(見包裝)</div>
-        </div>
-    </body></html>
-    """
-    import re as regex
-    match = regex.search(r'<body>(.*?)</body>', single_label_html, regex.DOTALL)
-    if match:
-        div_content = match.group(1)
-        full_body = div_content * qty
-        return single_label_html.replace(div_content, full_body)
-    return single_label_html
+    return render_label_template("food", qty, font_css, barcode=b_text, desc=desc_text, ingredients=ing_text,
+                                 manufacturer=mfr_text, en_expiry=en_expiry, ch_expiry=ch_expiry, **nutri)
 
 
-def process_homey_pdf(file_bytes):
-    pdf_file = io.BytesIO(file_bytes)
-    reader = PdfReader(pdf_file)
-    writer = PdfWriter()
-    temp_items = []
-    product_no_tracker = {}
-    df_master = load_master_db()
+def iter_homey_pages(pdf_path, reader, content_hash=None, master=None):
+    """逐頁產生 (頁碼, item)，交給 run_pick_list_job 統一處理快取、重複統計與下載。master 是這份揀貨單比對用的主資料庫快照。"""
     
-    # 🌟 取得 Base64 自訂字體，一次性生成好供後續所有標籤使用
-    font_css = font_to_base64_css(DEFAULT_FONT_PATH)
+    # 🌟 標籤裡只留字體 CSS 的位置，前端列印時換成回應的 font_css (字體檔由 /api/fonts 快取)
+    font_css = FONT_CSS_PLACEHOLDER
     
-    for i, page in enumerate(reader.pages):
-        text = page.extract_text()
-        clean_text = re.sub(r'\[Image \d+\]', '', text).strip()
-        if not clean_text: continue
-        writer.add_page(page)
-        
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        lines = [l for l in lines if not l.startswith("[Image")]
-        if not lines: continue
-        
-        p_no = lines[0].strip() if lines else "Unknown"
-        
-        qty = 1
-        qty_line_index = -1
-        for idx, line in enumerate(lines):
-            if ".0000" in line:
-                qty_line_index = idx
-                match_inline = re.search(r"(\d+)\s*\.0000", line)
-                if match_inline and int(match_inline.group(1)) > 0:
-                    qty = int(match_inline.group(1))
-                elif idx > 0:
-                    prev_line = lines[idx-1].strip()
-                    if prev_line.isdigit():
-                        qty = int(prev_line)
-                        qty_line_index = idx - 1
-                    else:
-                        match_end = re.search(r"\s+(\d+)$", prev_line)
-                        if match_end:
-                            qty = int(match_end.group(1))
-                            lines[idx-1] = prev_line[:match_end.start()].strip()
-                            qty_line_index = idx - 1
-                break
-        
-        p_name = ""
-        if qty_line_index > 1:
-            p_name = " ".join(lines[1:qty_line_index])
-        elif len(lines) > 1 and qty_line_index == -1:
-            name_parts = []
-            for line in lines[1:]:
-                if re.search(r"\d+\.0000|\b\d{12,14}\b", line): break
-                name_parts.append(line)
-            p_name = " ".join(name_parts)
-            
-        barcode_val = ""
-        search_start = qty_line_index + 1 if qty_line_index != -1 else 0
-        candidate_lines = lines[search_start:]
-        for line in candidate_lines:
-            if "N/A" in line or "PAGE" in line.upper() or "Page" in line: continue
-            clean_line = re.sub(r'[\s\*]', '', line)
-            if "*" in line:
-                barcode_val = clean_line
-                break
-            if clean_line.isdigit() and 12 <= len(clean_line) <= 15:
-                barcode_val = clean_line
-                break
-            if clean_line == p_no or clean_line == p_no.replace("-", ""):
-                barcode_val = clean_line
-                break
+    page_texts = iter_page_texts(pdf_path, reader, content_hash=content_hash)
+    for i, parsed in iter_parsed_pages(page_texts, PROFILES["homey"]):
+        if parsed is None:
+            yield i, None
+            continue
+        p_no = parsed["p_no"]
+        p_name = parsed["name"]
+        barcode_val = parsed["barcode"]
+        qty = parsed["qty"]
         
         excel_label = ""
         matched_data = {}
-        if df_master is not None and not df_master.empty:
-            match_col = 'Product_No' if 'Product_No' in df_master.columns else 'ProductCode'
-            if match_col not in df_master.columns and 'Product No' in df_master.columns: match_col = 'Product No'
-                
-            if match_col in df_master.columns:
-                matches = df_master[df_master[match_col].astype(str).str.strip() == p_no]
-                if not matches.empty:
-                    matched_data = matches.iloc[0].fillna("").to_dict()
-                    if 'Label_Type' in matched_data: excel_label = str(matched_data.get('Label_Type'))
-                    elif 'Label Type' in matched_data: excel_label = str(matched_data.get('Label Type'))
+        if master is not None and not master.table.empty:
+            # 🌟 用主資料庫的貨號索引查表，不再每頁掃整欄
+            positions = find_master_positions(master, "product_no", p_no)
+            if len(positions) > 0:
+                matched_data = master.table.row(positions[0])
+                if 'Label_Type' in matched_data: excel_label = str(matched_data.get('Label_Type'))
+                elif 'Label Type' in matched_data: excel_label = str(matched_data.get('Label Type'))
                         
         final_label = "普通Label"
         excel_label_lower = excel_label.lower()
@@ -509,58 +148,62 @@ def process_homey_pdf(file_bytes):
         else: 
             final_label = "普通Label"
             
-        final_html = ""
+        label = None
         needs_print = False
         
         if final_label == "Food Label":
             needs_print = True
-            final_html = create_food_label_html(p_name, barcode_val, matched_data, qty, font_css)
+            label = create_food_label_html(p_name, barcode_val, matched_data, qty, font_css)
         elif final_label == "蟲蟲Label": 
             needs_print = True
-            final_html = create_insects_label_html(matched_data, qty, font_css)
+            label = create_insects_label_html(matched_data, qty, font_css)
         elif final_label == "Repack Lable":
             needs_print = True
             print_barcode = p_no if not barcode_val or barcode_val == "(N/A)" else barcode_val
-            final_html = create_homey_repack_label_html(p_name, print_barcode, qty, font_css)
+            label = create_homey_repack_label_html(p_name, print_barcode, qty, font_css)
             
         data_status = 'print' if needs_print else 'no_print'
 
-        if p_no not in product_no_tracker: product_no_tracker[p_no] = []
-        product_no_tracker[p_no].append(i + 1)
-
-        temp_items.append({
+        yield i, {
             "id": f"{p_no}_{i}", "Product_No": p_no, "Name": p_name,
             "Barcode": barcode_val if barcode_val else "(N/A)", "Qty": qty, "Date": "N/A",
-            "status": data_status, "print_html": final_html, "label_type": final_label
-        })
+            "status": data_status, "label": label, "label_type": final_label
+        }
 
-    out_filename = f"homey_{uuid.uuid4().hex}.pdf"
-    out_path = os.path.join(PDF_OUT_DIR, out_filename)
-    with open(out_path, "wb") as f: writer.write(f)
-    return temp_items, product_no_tracker, out_filename
+def process_homey_pdf(pdf_path, content_hash=None, on_item=None, master=None):
+    # 🌟 整份揀貨單固定用同一個主資料庫快照，中途有人上傳新版也不會前後不一致
+    if master is None: master = get_master_snapshot()
+    return run_pick_list_job(pdf_path, content_hash, "homey", master_version(master), partial(iter_homey_pages, master=master), on_item)
 
 @router.post("/upload")
-async def upload_homey_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_homey_pdf(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...), stream: bool = False, label_format: str = None):
+    pdf_path = None
     try:
-        file_bytes = await file.read()
-        items, tracker, out_filename = await asyncio.to_thread(process_homey_pdf, file_bytes)
+        pdf_path, content_hash = await save_upload(file, "homey")
+        font_css = font_face_css(request)
+        # 🌟 先拿定這次比對用的主資料庫版本 (冷啟動載入在 thread 裡等)，回應裡回報 master_version
+        master = await asyncio.to_thread(get_master_snapshot)
+        if stream:
+            # 🌟 串流模式 (?stream=true)：每解析完一頁就先送出 NDJSON，暫存檔交給串流結束後清理
+            response = stream_pick_list_job(partial(process_homey_pdf, pdf_path, content_hash, master=master), pdf_path, "Homey_Upload", label_format,
+                                            font_css=font_css, master_version=master_version(master))
+            pdf_path = None
+            return response
+
+        items, tracker, out_token = await asyncio.to_thread(process_homey_pdf, pdf_path, content_hash, master=master)
         
-        # 🌟 釋放記憶體
-        del file_bytes
         gc.collect()
 
         # 🌟 註冊背景任務
-        out_path = os.path.join(PDF_OUT_DIR, out_filename)
-        background_tasks.add_task(delete_file_later, out_path)
+        background_tasks.add_task(expire_download_later, out_token)
 
-        duplicates = [{"Product_No": k, "Count": len(v), "Pages": ", ".join(map(str, v))} for k, v in tracker.items() if len(v) > 1]
         log_action("Homey_Upload")
-        
-        return {
-            "status": "success", "items": items, "duplicates": duplicates,
-            "summary": {"total_pages": len(items), "has_duplicates": len(duplicates) > 0},
-            "download_url": f"/generated_pdfs/{out_filename}", "font_css": ""
-        }
+
+        return build_upload_response(items, tracker, out_token, label_format, font_css=font_css, master_version=master_version(master))
+    except HTTPException:
+        raise
     except Exception as e: 
         gc.collect()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        remove_quietly(pdf_path)
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 import os
+import time
+import asyncio
+import threading
+from typing import NamedTuple, Optional
+import numpy as np
 import pandas as pd
+from core.uploads import save_upload
+from core.table_snapshot import SharedTable, load_table, build_snapshot, build_delta_snapshot, remove_snapshots
 
 router = APIRouter()
 DATA_DIR = "data"
@@ -14,30 +21,198 @@ def get_db_path():
             return p
     return None
 
-# 全域變數：所有 3PL 系統共享這份記憶體！
-_db_cache = None
-_db_mtime = 0
+# ========================================================
+# 🌟 預先算好的標籤狀態欄
+# 以前每一頁揀貨單 / 每次食品標籤搜尋，都要對每個符合的列 iterrows() 跑一次 check_data_status
+# (逐欄比對關鍵字)。現在載入主資料庫時就向量化算好整欄，排序去重直接用。
+#   __status      含蟲蟲判斷：insect / food / caution / empty (食品標籤搜尋)
+#   __base_status 不含蟲蟲判斷：food / caution / empty (Yummy)
+# 欄名刻意避開 label / caution / fat 等關鍵字；回傳給前端的 matched_data 請先用 strip_status_columns 去掉。
+# ========================================================
 
-def load_master_db():
-    global _db_cache, _db_mtime
-    db_path = get_db_path()
-    if not db_path: 
-        return None
-    
-    current_mtime = os.path.getmtime(db_path)
-    
-    # 如果是第一次讀取，或是檔案被更新過了，就重新載入
-    if _db_cache is None or current_mtime != _db_mtime:
-        _db_mtime = current_mtime
+STATUS_COL = '__status'
+BASE_STATUS_COL = '__base_status'
+STATUS_COLUMNS = (STATUS_COL, BASE_STATUS_COL)
+STATUS_SCORES = {'insect': 3, 'food': 2, 'caution': 1, 'empty': 0}
+# add_status_columns / 索引 / 搜尋欄位的邏輯有變時要更換版本字串，讓舊快照失效
+MASTER_SNAPSHOT_VARIANT = "master3"
+
+FOOD_KEYWORDS = ['ingredient', 'energy', 'protein', 'fat', 'carb', 'sodium', 'serving']
+CAUTION_KEYWORDS = ['caution', 'warning']
+INSECT_COLUMNS = ['features', '警告字眼']
+
+def _normalized(series):
+    return series.fillna("").astype(str).str.strip().str.lower()
+
+def add_status_columns(df):
+    """跟 check_data_status 相同的判斷，一次算完整個 DataFrame。"""
+    df = df.reset_index(drop=True)
+    is_insect = np.zeros(len(df), dtype=bool)
+    has_food = np.zeros(len(df), dtype=bool)
+    has_caution = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        if col in STATUS_COLUMNS: continue
+        k_lower = str(col).lower()
+        is_label = 'label' in k_lower
+        is_food = any(fw in k_lower for fw in FOOD_KEYWORDS)
+        is_caution = any(cw in k_lower for cw in CAUTION_KEYWORDS)
+        if not (is_label or is_food or is_caution or k_lower in INSECT_COLUMNS): continue
+
+        val = _normalized(df[col])
+        filled = (val != "") & ~val.isin(['nan', 'none'])
+        valid = (filled & (val != '0')).to_numpy(dtype=bool)
+        if k_lower in INSECT_COLUMNS: is_insect |= valid
+        if is_label: is_insect |= valid & (val.str.contains('蟲', regex=False) | val.str.contains('insect', regex=False)).to_numpy(dtype=bool)
+        if is_food: has_food |= valid
+        if is_caution: has_caution |= filled.to_numpy(dtype=bool)
+
+    base_status = np.where(has_food, 'food', np.where(has_caution, 'caution', 'empty'))
+    df[STATUS_COL] = np.where(is_insect, 'insect', base_status)
+    df[BASE_STATUS_COL] = base_status
+    return df
+
+def rank_master_rows(results_df, status_col=STATUS_COL):
+    """依預先算好的狀態排序 (蟲蟲 > 食品 > 警告 > 空)，同一個貨號只留分數最高的一列。"""
+    if results_df.empty: return results_df
+    results_df = results_df.copy()
+    results_df['__score'] = results_df[status_col].map(STATUS_SCORES).to_numpy()
+    results_df = results_df.sort_values(by='__score', ascending=False)
+    target_col = 'Product_No' if 'Product_No' in results_df.columns else 'ProductCode'
+    if target_col in results_df.columns:
+        results_df = results_df.drop_duplicates(subset=[target_col], keep='first')
+    return results_df
+
+def best_master_position(table, positions, status_col=STATUS_COL):
+    """只要分數最高的一列時 (揀貨單逐頁查詢)，不必整份排序：分數相同時取原檔較前面的一列。"""
+    statuses = table.values(status_col, positions)
+    best = max(range(len(statuses)), key=lambda k: STATUS_SCORES.get(statuses[k], 0))
+    return int(positions[best])
+
+def strip_status_columns(data_dict):
+    return {k: v for k, v in data_dict.items() if k not in STATUS_COLUMNS}
+
+# ========================================================
+# 🌟 主資料庫索引：貨號 / 條碼 → 列位置
+# 以前每一頁揀貨單都對整欄做 astype(str).str.strip() == p_no，
+# 一份揀貨單就是 O(頁數 × 主資料庫列數)。現在索引跟著快照一起寫進 data/snapshots，
+# 所有 worker、所有使用者 (Yummy / Homey / ...) 共用，查詢是對排序好的鍵二分搜尋。
+# ========================================================
+
+def get_match_col(df):
+    """主資料庫的貨號欄位：Product_No → ProductCode → Product No，都沒有時回傳 None。"""
+    for col in ['Product_No', 'ProductCode', 'Product No']:
+        if col in df.columns: return col
+    return None
+
+def get_name_col(df):
+    for col in ['Name', 'Description']:
+        if col in df.columns: return col
+    return None
+
+def master_indexes(df):
+    match_col = get_match_col(df)
+    indexes = {"product_no": match_col, "barcode": 'Barcode' if 'Barcode' in df.columns else None}
+    return {name: col for name, col in indexes.items() if col}
+
+def master_search_columns(df):
+    """食品標籤搜尋會比對的欄位：貨號、條碼、名稱 (快照裡都有小寫內容與 trigram 索引)。"""
+    return [col for col in (get_match_col(df), 'Barcode', get_name_col(df)) if col and col in df.columns]
+
+def master_key_columns(df):
+    """食品標籤搜尋先找完全相同 / 開頭相同的欄位：貨號、條碼 (快照裡另存正規化鍵)。"""
+    return [col for col in (get_match_col(df), 'Barcode') if col and col in df.columns]
+
+def find_master_positions(master, key, value):
+    """用索引找出 key ("product_no" / "barcode") 等於 value 的列位置 (順序與原檔相同)。"""
+    return master.table.lookup(key, value)
+
+# ========================================================
+# 🌟 主資料庫版本快照 (所有 3PL 系統共享這份記憶體！)
+# 以前是 _db_cache / _db_mtime 兩個裸的全域變數，好幾個 to_thread 的揀貨單同時讀寫，
+# 上傳新檔時又直接清成 None，兩個 thread 可能同時整份重新載入。
+# 現在每個版本是一個不會再修改的 MasterSnapshot (版本 + 共用的唯讀快照 SharedTable)：
+#   - 一份揀貨單從頭到尾用同一個快照，回應的 master_version 就是它
+#   - 同一時間只有一個 thread 在載入 (single-flight)，其他人等它或直接沿用
+#   - 檔案被換掉時在背景載入新版本，載入完成前繼續用舊版本，不卡住正在處理的請求
+# ========================================================
+
+class MasterSnapshot(NamedTuple):
+    version: str        # 原始檔的 修改時間(ns)-大小，解析快取用它判斷是否過期
+    name: str
+    table: SharedTable  # 資料與索引都在 mmap 的快照檔裡，多個 worker 共用同一份
+
+_master: Optional[MasterSnapshot] = None
+_failed_version = None        # 解析失敗的版本，檔案沒換之前不再重試
+_rebuilding = False
+_state_lock = threading.Lock()   # 保護上面三個變數
+_build_lock = threading.Lock()   # 同一時間只允許一個 thread 載入 (single-flight)
+
+def _file_version(db_path):
+    stat = os.stat(db_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def _reload(db_path):
+    """載入 db_path 目前的版本並換上；已經有其他 thread 載入好同一版本時直接沿用。"""
+    global _master, _failed_version
+    with _build_lock:
+        try: version = _file_version(db_path)
+        except OSError: return _master
+        current = _master
+        if current is not None and current.version == version: return current
+        if version == _failed_version: return current
         try:
-            _db_cache = pd.read_csv(db_path, dtype=str, encoding='utf-8-sig')
-        except:
-            try: _db_cache = pd.read_csv(db_path, dtype=str, encoding='big5')
-            except:
-                try: _db_cache = pd.read_excel(db_path, dtype=str)
-                except: return None
-                
-    return _db_cache
+            # 🌟 優先讀上傳時轉好的二進位快照，沒有才解析原始 CSV / XLSX (並順便建快照)
+            # 換上新版本 (或別的 worker 上傳新檔) 時舊的快照資料夾會被刪掉，先把檔案都 mmap 起來，
+            # 還拿著這個版本的揀貨單 / 其他 worker 照樣讀得到 (做法同搜尋資料庫的 _load_search_table)
+            table = load_table(db_path, add_status_columns, MASTER_SNAPSHOT_VARIANT, master_indexes, master_search_columns,
+                               ngram_columns=master_search_columns, key_columns=master_key_columns).pin()
+            snapshot = MasterSnapshot(version, os.path.basename(db_path), table)
+        except Exception as e:
+            # 檔案壞掉時繼續用舊版本 (冷啟動時沒有舊版本就是 None)
+            print(f"⚠️ 主資料庫載入失敗，繼續使用舊版本 ({db_path}): {e}")
+            with _state_lock: _failed_version = version
+            return current
+        with _state_lock:
+            _master, _failed_version = snapshot, None
+        return snapshot
+
+def _reload_in_background(db_path):
+    global _rebuilding
+    with _state_lock:
+        if _rebuilding: return
+        _rebuilding = True
+
+    def run():
+        global _rebuilding
+        try: _reload(db_path)
+        finally:
+            with _state_lock: _rebuilding = False
+
+    threading.Thread(target=run, name="master-db-reload", daemon=True).start()
+
+def get_master_snapshot():
+    """
+    目前的主資料庫快照，尚未上傳 (或從來沒有成功載入過) 時回傳 None；檔案格式錯誤時沿用上一個版本。
+    冷啟動時會等載入完成；之後檔案有變時回傳舊快照，新版本在背景載入。
+    """
+    db_path = get_db_path()
+    current = _master
+    # 上傳中舊檔剛被刪掉、新檔還沒就位時，先沿用舊快照
+    if not db_path: return current
+    try: version = _file_version(db_path)
+    except OSError: return current
+    if current is not None and current.version == version: return current
+    if version == _failed_version: return current
+    if current is None: return _reload(db_path)
+    _reload_in_background(db_path)
+    return current
+
+def master_version(master):
+    return master.version if master is not None else None
+
+def get_master_db_version():
+    """目前主資料庫的版本，尚未上傳時回傳 None；解析快取用它判斷是否過期。"""
+    return master_version(get_master_snapshot())
 
 @router.get("/info")
 async def get_master_info():
@@ -45,32 +220,87 @@ async def get_master_info():
     if not db_path:
         return {"total_records": 0, "current_db_name": "尚未載入"}
     
-    df = load_master_db()
-    if df is not None:
-        return {"total_records": len(df), "current_db_name": os.path.basename(db_path)}
+    master = await asyncio.to_thread(get_master_snapshot)
+    if master is not None:
+        return {"total_records": len(master.table), "current_db_name": master.name, "version": master.version,
+                "storage_bytes": master.table.storage_bytes()}
     return {"total_records": 0, "current_db_name": "檔案格式錯誤"}
 
+def _build_incremental(tmp_path, save_path, current):
+    """
+    只把新檔與目前版本有差異的列 (以貨號比對) 寫成增量快照，未變動的列沿用現有快照與索引。
+    回傳 (table, 變動筆數)；欄位不同或變動太多時回傳 None，改走整份重建。
+    """
+    return build_delta_snapshot(tmp_path, current.table, "product_no", add_status_columns, MASTER_SNAPSHOT_VARIANT,
+                                master_indexes, master_search_columns, as_name=save_path, key_columns=master_key_columns)
+
+def _build_and_swap(tmp_path, save_path, incremental):
+    """
+    在暫存檔上建好快照 (增量或整份) 並 pin 住，成功才換到正式檔名、換上新版本，回傳 (MasterSnapshot, 變動筆數)。
+    解析失敗或沒有任何資料列時刪掉暫存檔並丟出例外，舊檔與舊版本都不動。
+    """
+    global _master, _failed_version
+    with _build_lock:
+        try:
+            version = _file_version(tmp_path)
+            table, changes = None, None
+            # 🌟 增量更新：同一個檔名的新版本只重寫有變動的列 (新增 / 修改 / 刪除)，不必整份重新解析與重建索引
+            current = _master
+            if incremental and current is not None and current.name == os.path.basename(save_path):
+                try: result = _build_incremental(tmp_path, save_path, current)
+                except Exception as e:
+                    print(f"⚠️ 增量更新失敗，改為整份重建: {e}")
+                    result = None
+                if result is not None: table, changes = result
+            if table is None:
+                table = build_snapshot(tmp_path, add_status_columns, MASTER_SNAPSHOT_VARIANT, master_indexes, master_search_columns,
+                                       as_name=save_path, ngram_columns=master_search_columns, key_columns=master_key_columns,
+                                       allow_empty=False)
+            table.pin()
+        except Exception:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+        # 刪除舊的衝突檔案，確保系統裡永遠只有一個主資料庫
+        # (同檔名的舊快照在新快照建好時已經清掉；處理中的揀貨單拿著的是 pin 住的舊版本，照樣讀得到)
+        for ext in ['.csv', '.xlsx', '.xls']:
+            old_file = os.path.join(DATA_DIR, f"data{ext}")
+            if old_file == save_path: continue
+            if os.path.exists(old_file): os.remove(old_file)
+            remove_snapshots(old_file)
+        # os.replace 不會改變修改時間與大小，換檔後的版本與快照名稱都跟暫存檔相同
+        os.replace(tmp_path, save_path)
+        snapshot = MasterSnapshot(version, os.path.basename(save_path), table)
+        with _state_lock: _master, _failed_version = snapshot, None
+        return snapshot, changes
+
 @router.post("/upload")
-async def upload_master_db(file: UploadFile = File(...)):
+async def upload_master_db(file: UploadFile = File(...), mode: str = Query("replace", description="replace：整份重建；incremental：只套用有變動的列")):
     try:
+        if mode not in ("replace", "incremental"):
+            raise HTTPException(status_code=400, detail="mode 只能是 replace 或 incremental")
+        started = time.perf_counter()
         file_ext = os.path.splitext(file.filename)[1].lower()
         if file_ext not in ['.csv', '.xlsx', '.xls']: file_ext = '.csv'
         save_path = os.path.join(DATA_DIR, f"data{file_ext}")
         
-        # 刪除舊的衝突檔案，確保系統裡永遠只有一個主資料庫
-        for ext in ['.csv', '.xlsx', '.xls']:
-            old_file = os.path.join(DATA_DIR, f"data{ext}")
-            if os.path.exists(old_file): os.remove(old_file)
+        # 🌟 先串流寫到暫存檔，完整收到 (且未超過上限) 才開始建快照
+        tmp_path, _ = await save_upload(file, "master_db", dest_path=save_path + ".uploading")
+
+        # 🌟 上傳時就建好新版本的快照，建好才換檔、換上；檔案解析失敗時回傳錯誤，繼續用舊版本
+        # 處理中的揀貨單繼續用它們開始時拿到的舊版本，不會讀到一半被清空
+        try: master, changes = await asyncio.to_thread(_build_and_swap, tmp_path, save_path, mode == "incremental")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"主資料庫檔案無法解析，繼續使用舊版本：{e}")
 
-        content = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(content)
-            
-        # 🌟 關鍵：強制清空全域記憶體，讓所有系統下次讀取時都抓最新版！
-        global _db_cache, _db_mtime
-        _db_cache = None
-        _db_mtime = 0
-            
-        return {"message": "3PL與標籤資料庫已成功更新！"}
+        return {
+            "message": "3PL與標籤資料庫已成功更新！",
+            "master_version": master_version(master),
+            "mode": "incremental" if changes is not None else "replace",
+            "changes": changes,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from pydantic import BaseModel
 import os
+import numpy as np
 import pandas as pd
 import urllib.parse
-import requests
 import time
-from typing import Dict, Any, List
+import asyncio
+import threading
+import uuid
+from typing import List, Optional, NamedTuple
+from core.uploads import save_upload
+from core.table_snapshot import SharedTable, load_table, build_snapshot, remove_snapshots
+from core.search_cache import search_cache
+from core.search_tiers import tiered_positions, exact_positions
+from core.fast_json import FastJSONResponse, select_fields
+from core.dear_client import get_dear_client
 
 # 🌟 匯入打卡系統
 try:
@@ -20,8 +30,6 @@ DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
 SEARCH_DB_NAME_FILE = os.path.join(DATA_DIR, "search_db_name.txt")
-_search_cache = None
-_search_mtime = 0
 
 def get_search_db_path():
     for ext in ['.csv', '.xlsx', '.xls']:
@@ -30,186 +38,286 @@ def get_search_db_path():
             return p
     return None
 
-def load_search_db():
-    global _search_cache, _search_mtime
+# 快照存的是 prepare 之後的結果；_prepare_search_db 或搜尋欄位有變時要更換版本字串
+SEARCH_SNAPSHOT_VARIANT = "search5"
+SEARCH_TEXT_COL = '_combined_search_text'
+# search_barcode 回傳的欄位；建快照時就整理成回傳值，其他欄位只併進搜尋字串，不另外保存
+SEARCH_RESULT_FIELDS = ['ProductCode', 'Barcode', 'Name', 'SearchUrl']
+# 先找完全相同 / 開頭相同 (core.search_tiers) 的欄位，快照裡另存正規化鍵
+SEARCH_KEY_COLUMNS = ['ProductCode', 'Barcode']
+SEARCH_LIMIT = 200
+# 一次批次查詢最多幾個條碼 (一箱貨通常幾十件)
+SEARCH_BATCH_MAX_CODES = 500
+HKTV_SEARCH_URL = "https://www.hktvmall.com/hktv/zh/search_a?keyword="
+
+def _first_column(df, *names):
+    for name in names:
+        if name in df.columns: return df[name].astype(str)
+    return pd.Series("", index=df.index, dtype=str)
+
+def _prepare_search_db(df):
+    df = df.fillna("")
+    # 整欄串接 (str.cat) 跟逐列 ' '.join 結果一樣，但不必每列呼叫一次 Python 函式
+    texts = [df[col].astype(str) for col in df.columns]
+    text = texts[0].str.cat(texts[1:], sep=' ').str.lower() if texts else pd.Series("", index=df.index)
+
+    # 🌟 以前每次搜尋都逐列 strip、比對 "NAN"、urllib.parse.quote 組 SearchUrl，現在上傳時整欄算一次
+    barcode = _first_column(df, "Barcode").str.strip()
+    name = _first_column(df, "Name", "Description").str.strip()
+    url = _first_column(df, "SearchUrl").str.strip()
+    has_name = ((name != "") & (name.str.upper() != "NAN")).tolist()
+    fallback = [HKTV_SEARCH_URL + urllib.parse.quote(n) if ok else "#" for n, ok in zip(name.tolist(), has_name)]
+    out = pd.DataFrame({
+        "ProductCode": _first_column(df, "ProductCode", "Product_No"),
+        "Barcode": barcode.where(barcode.str.upper() != "NAN", ""),
+        "Name": name.where(name.str.upper() != "NAN", "無名稱"),
+        "SearchUrl": url.where(url != "", pd.Series(fallback, index=df.index, dtype=str)),
+    }, index=df.index)
+    out[SEARCH_TEXT_COL] = text
+    return out
+
+def _load_search_table(db_path, as_name=None, progress=None):
+    # 🌟 組合搜尋字串只存成一整塊小寫內容 (search_only)，不再當成第二份資料表；
+    # 另建 trigram 索引，查詢時只驗證每個 trigram 都出現過的列
+    options = dict(search_only=[SEARCH_TEXT_COL], ngram_columns=[SEARCH_TEXT_COL], key_columns=SEARCH_KEY_COLUMNS)
+    if as_name is None: table = load_table(db_path, _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, **options)
+    else: table = build_snapshot(db_path, _prepare_search_db, SEARCH_SNAPSHOT_VARIANT, as_name=as_name, progress=progress,
+                                 allow_empty=False, **options)
+    # 換上新版本時舊的快照資料夾會被刪掉，先把檔案都 mmap 起來，還在用舊版本的請求照樣讀得到
+    return table.pin()
+
+# ========================================================
+# 🌟 搜尋資料庫版本快照 + 背景建索引後原子換上 (做法同 master_api 的 MasterSnapshot)
+# 以前上傳時先刪掉舊檔、把快取清成 None，下一個搜尋請求要自己解析整份 CSV / Excel、組搜尋字串，
+# 這段期間同時進來的搜尋不是卡住就是看到「請先上傳資料庫檔案」。
+# 現在上傳只把檔案收下來，解析與建索引 (快照、trigram、正規化鍵) 在背景 thread 做，
+# 舊版本繼續服務；建好後才把新檔換到正式檔名、一次換掉 _search 指標 (讀取端只讀一次指標，不會拿到一半)。
+# /info 回報目前版本與背景建置進度 (build)。
+# ========================================================
+
+class SearchSnapshot(NamedTuple):
+    version: str        # 原始檔的 修改時間(ns)-大小，typeahead 快取的 key 用它區分版本
+    name: str           # 上傳時的檔名 (顯示用)
+    table: SharedTable
+
+_search: Optional[SearchSnapshot] = None
+_failed_version = None        # 解析失敗的版本，檔案沒換之前不再重試
+_rebuilding = False
+# 背景建置的狀態：idle / building / ready / failed，stage 為 build_snapshot 目前的步驟
+_build_status = {"state": "idle", "version": None, "name": None, "stage": None, "started_at": None, "elapsed_ms": None, "error": None}
+_state_lock = threading.Lock()   # 保護上面四個變數
+_build_lock = threading.Lock()   # 同一時間只允許一個 thread 載入 / 建置 (single-flight)
+
+def _file_version(db_path):
+    stat = os.stat(db_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def _display_name(db_path):
+    if os.path.exists(SEARCH_DB_NAME_FILE):
+        with open(SEARCH_DB_NAME_FILE, "r", encoding="utf-8") as f: return f.read().strip()
+    return os.path.basename(db_path)
+
+def _reload(db_path):
+    """載入 db_path 目前的版本並換上；已經有其他 thread 載入好同一版本時直接沿用。"""
+    global _search, _failed_version
+    with _build_lock:
+        try: version = _file_version(db_path)
+        except OSError: return _search
+        current = _search
+        if current is not None and current.version == version: return current
+        if version == _failed_version: return current
+        # 🌟 快照裡已經是補好空值、組好搜尋字串的版本；多個 worker 共用同一份 mmap 檔案
+        try: snapshot = SearchSnapshot(version, _display_name(db_path), _load_search_table(db_path))
+        except Exception as e:
+            # 檔案壞掉時繼續用舊版本 (冷啟動時沒有舊版本就是 None)
+            print(f"⚠️ 搜尋資料庫載入失敗，繼續使用舊版本 ({db_path}): {e}")
+            with _state_lock: _failed_version = version
+            return current
+        with _state_lock: _search, _failed_version = snapshot, None
+        return snapshot
+
+def _reload_in_background(db_path):
+    global _rebuilding
+    with _state_lock:
+        if _rebuilding: return
+        _rebuilding = True
+
+    def run():
+        global _rebuilding
+        try: _reload(db_path)
+        finally:
+            with _state_lock: _rebuilding = False
+
+    threading.Thread(target=run, name="search-db-reload", daemon=True).start()
+
+def get_search_snapshot():
+    """
+    目前的搜尋資料庫快照，尚未上傳 (或從來沒有成功載入過) 時回傳 None；檔案格式錯誤時沿用上一個版本。
+    冷啟動時會等載入完成；之後檔案有變 (例如別的 worker 換上新版本) 時回傳舊快照，新版本在背景載入。
+    """
     db_path = get_search_db_path()
-    if not db_path: 
-        return None
-    
-    current_mtime = os.path.getmtime(db_path)
-    
-    if _search_cache is None or current_mtime != _search_mtime:
-        _search_mtime = current_mtime
-        try: _search_cache = pd.read_csv(db_path, dtype=str, encoding='utf-8-sig')
-        except:
-            try: _search_cache = pd.read_csv(db_path, dtype=str, encoding='big5')
-            except:
-                try: _search_cache = pd.read_excel(db_path, dtype=str)
-                except: return None
-        
-        if _search_cache is not None:
-            _search_cache = _search_cache.fillna("")
-            _search_cache['_combined_search_text'] = _search_cache.astype(str).agg(' '.join, axis=1).str.lower()
-                
-    return _search_cache
+    current = _search
+    if not db_path: return current
+    try: version = _file_version(db_path)
+    except OSError: return current
+    if current is not None and current.version == version: return current
+    if version == _failed_version: return current
+    if current is None: return _reload(db_path)
+    _reload_in_background(db_path)
+    return current
+
+def load_search_db():
+    snapshot = get_search_snapshot()
+    return snapshot.table if snapshot is not None else None
+
+def _set_build_status(**fields):
+    with _state_lock:
+        _build_status.update(fields)
+        if _build_status["started_at"] is not None:
+            _build_status["elapsed_ms"] = round((time.time() - _build_status["started_at"]) * 1000, 1)
+
+def _build_and_swap(tmp_path, save_path, display_name):
+    """背景建置：在暫存檔上建好快照與索引，再換到正式檔名並換上新版本；失敗時舊版本照常服務。"""
+    global _search, _failed_version
+    with _build_lock:
+        try:
+            version = _file_version(tmp_path)
+            # 沒有任何資料列時 build_snapshot 直接丟出例外 (allow_empty=False)，不會動到舊版本的快照
+            table = _load_search_table(tmp_path, as_name=save_path, progress=lambda stage: _set_build_status(stage=stage))
+            _set_build_status(stage="swapping")
+            # 其他副檔名的舊檔 (例如舊版是 .xlsx、新版是 .csv) 現在才刪，建置期間舊版本還要用
+            for ext in ['.csv', '.xlsx', '.xls']:
+                old_file = os.path.join(DATA_DIR, f"search_data{ext}")
+                if old_file == save_path: continue
+                if os.path.exists(old_file): os.remove(old_file)
+                remove_snapshots(old_file)
+            with open(SEARCH_DB_NAME_FILE, "w", encoding="utf-8") as f:
+                f.write(display_name)
+            # os.replace 不會改變修改時間與大小，換檔後的版本與快照名稱都跟暫存檔相同
+            os.replace(tmp_path, save_path)
+            with _state_lock: _search, _failed_version = SearchSnapshot(version, display_name, table), None
+            search_cache.clear()
+            _set_build_status(state="ready", stage=None)
+        except Exception as e:
+            print(f"⚠️ 搜尋資料庫建置失敗，繼續使用舊版本: {e}")
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            _set_build_status(state="failed", stage=None, error=str(e))
+
+def _start_build(tmp_path, save_path, display_name):
+    """登記背景建置並啟動；已經有一份在建置中時回傳 False。"""
+    with _state_lock:
+        if _build_status["state"] == "building": return False
+        _build_status.update(state="building", version=_file_version(tmp_path), name=display_name, stage="queued",
+                             started_at=time.time(), elapsed_ms=0.0, error=None)
+    threading.Thread(target=_build_and_swap, args=(tmp_path, save_path, display_name), name="search-db-build", daemon=True).start()
+    return True
+
+def search_build_status():
+    with _state_lock:
+        status = dict(_build_status)
+    if status["state"] == "building" and status["started_at"] is not None:
+        status["elapsed_ms"] = round((time.time() - status["started_at"]) * 1000, 1)
+    status.pop("started_at")
+    return status
 
 @search_router.get("/info")
 async def get_search_info():
-    db_path = get_search_db_path()
-    if not db_path:
-        return {"total_records": 0, "current_db_name": "尚未載入"}
-    
-    df = load_search_db()
-    if df is not None:
-        display_name = os.path.basename(db_path)
-        if os.path.exists(SEARCH_DB_NAME_FILE):
-            with open(SEARCH_DB_NAME_FILE, "r", encoding="utf-8") as f:
-                display_name = f.read().strip()
-                
-        return {"total_records": len(df), "current_db_name": display_name}
-    return {"total_records": 0, "current_db_name": "檔案格式錯誤"}
+    build = search_build_status()
+    snapshot = await asyncio.to_thread(get_search_snapshot) if get_search_db_path() else None
+    if snapshot is not None:
+        return {"total_records": len(snapshot.table), "current_db_name": snapshot.name, "version": snapshot.version,
+                "storage_bytes": snapshot.table.storage_bytes(), "build": build}
+    name = "建置中" if build["state"] == "building" else "尚未載入" if not get_search_db_path() else "檔案格式錯誤"
+    return {"total_records": 0, "current_db_name": name, "build": build}
 
 @search_router.post("/upload")
 async def upload_search_db(file: UploadFile = File(...)):
     try:
+        if search_build_status()["state"] == "building":
+            raise HTTPException(status_code=409, detail="搜尋資料庫正在更新中，請稍後再上傳")
         file_ext = os.path.splitext(file.filename)[1].lower()
         if file_ext not in ['.csv', '.xlsx', '.xls']: file_ext = '.csv'
         save_path = os.path.join(DATA_DIR, f"search_data{file_ext}")
         
-        for ext in ['.csv', '.xlsx', '.xls']:
-            old_file = os.path.join(DATA_DIR, f"search_data{ext}")
-            if os.path.exists(old_file): os.remove(old_file)
-
-        content = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(content)
-            
-        with open(SEARCH_DB_NAME_FILE, "w", encoding="utf-8") as f:
-            f.write(file.filename)
+        # 🌟 先串流寫到暫存檔，完整收到 (且未超過上限) 才交給背景建置；舊檔與舊版本在換上新版本前都不動
+        tmp_path, _ = await save_upload(file, "search_db", dest_path=f"{save_path}.{uuid.uuid4().hex}.uploading")
+        if not _start_build(tmp_path, save_path, file.filename):
+            os.remove(tmp_path)
+            raise HTTPException(status_code=409, detail="搜尋資料庫正在更新中，請稍後再上傳")
             
-        global _search_cache, _search_mtime
-        _search_cache = None
-        _search_mtime = 0
-            
-        return {"message": "搜尋專用資料庫已成功更新！"}
+        return {"message": "搜尋專用資料庫已上傳，正在背景建立索引 (完成前繼續使用舊版本)", "build": search_build_status()}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 🌟 快照載入、分層搜尋與整欄取值都是同步的 CPU / 磁碟工作，用一般 def 讓 FastAPI 丟到 threadpool，不卡住 event loop
 @search_router.get("/")
-async def search_barcode(q: str = Query(..., min_length=1)):
-    df = load_search_db()
-    if df is None:
+def search_barcode(q: str = Query(..., min_length=1),
+                   fields: Optional[str] = Query(None, description="只回傳這些欄位 (逗號分隔)，例如 ProductCode,Name"),
+                   limit: int = Query(SEARCH_LIMIT, ge=1, le=SEARCH_LIMIT, description="最多回傳幾筆 (掃描器只要第一筆時用 1)")):
+    selected = select_fields(fields, SEARCH_RESULT_FIELDS)
+    snapshot = get_search_snapshot()
+    if snapshot is None:
         raise HTTPException(status_code=400, detail="請先上傳資料庫檔案")
+    table = snapshot.table
     
     query_lower = str(q).lower()
-    matched_df = df[df['_combined_search_text'].str.contains(query_lower, na=False)].head(200)
-    
-    results = []
-    for _, row in matched_df.iterrows():
-        product_code = row.get("ProductCode", row.get("Product_No", ""))
-        barcode_val = str(row.get("Barcode", "")).strip()
-        name_val = str(row.get("Name", row.get("Description", ""))).strip()
-        
-        search_url = row.get("SearchUrl", "").strip()
-        
-        if not search_url:
-            if name_val and name_val.upper() != "NAN":
-                encoded_name = urllib.parse.quote(name_val)
-                search_url = f"https://www.hktvmall.com/hktv/zh/search_a?keyword={encoded_name}"
-            else:
-                search_url = "#"
-
-        results.append({
-            "ProductCode": product_code,
-            "Barcode": barcode_val if barcode_val.upper() != "NAN" else "",
-            "Name": name_val if name_val.upper() != "NAN" else "無名稱",
-            "SearchUrl": search_url
-        })
+    # 🌟 分層 (core.search_tiers)：條碼 / 貨號完全相同 → 開頭相同 → 搜尋字串包含查詢，湊滿 limit 筆就停。
+    # 包含查詢的那一層用 trigram 索引找候選列再逐列驗證 (純文字比對，不是 regex)；
+    # 邊打字邊查時，更長的查詢直接在前一個查詢的結果裡縮小範圍 (core.search_cache)
+    version = snapshot.version
+    positions = tiered_positions(table, query_lower, SEARCH_KEY_COLUMNS,
+                                 lambda n: search_cache.find(table, version, SEARCH_TEXT_COL, query_lower, limit=n), limit)
+    # 🌟 回傳值在建快照時就整理好了，這裡只要整欄取值組成 dict (不必 DataFrame + iterrows)
+    columns = [table.values(field, positions) for field in selected]
+    results = [dict(zip(selected, values)) for values in zip(*columns)]
             
     log_action("Barcode_Search")
-    return results
+    return FastJSONResponse(results)
 
+# ========================================================
+# 🌟 掃描器批次查詢：收貨時一箱掃幾十件，以前前端每件打一次 /api/search/?q=，
+# 每次都要走一遍 HTTP、分層搜尋、JSON 序列化與 log_action。
+# 現在一次送上整串條碼 / 貨號，每個都只查正規化鍵完全相同的列 (二分搜尋，不掃搜尋字串)，
+# 所有符合的列一次整欄取值，回傳 {條碼: [符合的列]} 與找不到的條碼清單。
+# ========================================================
 
-# ==============================================================================
-# 📦 第二部分：DEAR 庫存查詢系統 (Inventory API)
-# ==============================================================================
-inventory_router = APIRouter()
+class BatchSearchRequest(BaseModel):
+    codes: List[str]
+
+# 最多 SEARCH_BATCH_MAX_CODES 次二分搜尋加上整欄取值，同樣用一般 def 交給 threadpool
+@search_router.post("/batch")
+def search_barcode_batch(req: BatchSearchRequest,
+                         fields: Optional[str] = Query(None, description="只回傳這些欄位 (逗號分隔)，例如 ProductCode,Name")):
+    selected = select_fields(fields, SEARCH_RESULT_FIELDS)
+    if len(req.codes) > SEARCH_BATCH_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"一次最多查詢 {SEARCH_BATCH_MAX_CODES} 個條碼")
+    table = load_search_db()
+    if table is None:
+        raise HTTPException(status_code=400, detail="請先上傳資料庫檔案")
 
-class DearAPIClient:
-    BASE_URL = "https://inventory.dearsystems.com/ExternalApi/v2/"
+    # 同一個條碼掃兩次只查一次 (保留第一次出現的順序)
+    codes = list(dict.fromkeys(req.codes))
+    hits = [exact_positions(table, code, SEARCH_KEY_COLUMNS)[:SEARCH_LIMIT] for code in codes]
+    positions = np.concatenate([np.empty(0, dtype=np.int64)] + hits)
+    columns = [table.values(field, positions) for field in selected]
+    rows = [dict(zip(selected, values)) for values in zip(*columns)]
 
-    def __init__(self, account_id: str, application_key: str):
-        self.headers = {
-            "api-auth-accountid": account_id,
-            "api-auth-applicationkey": application_key,
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
+    results, not_found, at = {}, [], 0
+    for code, code_hits in zip(codes, hits):
+        if len(code_hits): results[code] = rows[at:at + len(code_hits)]
+        else: not_found.append(code)
+        at += len(code_hits)
 
-    def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        url = f"{self.BASE_URL}{endpoint}"
-        if params is None:
-            params = {}
-
-        while True:
-            try:
-                response = requests.get(url, headers=self.headers, params=params)
-                
-                if response.status_code == 429 or response.status_code == 503:
-                    print("⚠️ 觸發 API 速率限制，等待 2 秒後重試...")
-                    time.sleep(2)
-                    continue
-                
-                response.raise_for_status()
-                
-                if not response.text.strip():
-                    return {}
-                    
-                try:
-                    return response.json()
-                except ValueError:
-                    print(f"⚠️ API 回傳了非 JSON 格式的內容: {response.text[:100]}")
-                    return {}
-                
-            except requests.exceptions.HTTPError as e:
-                if response.status_code == 404:
-                    return {}
-                raise Exception(f"DEAR API 錯誤 ({response.status_code}): {response.text}")
-            except Exception as e:
-                raise Exception(f"連線失敗: {str(e)}")
-
-    def get_product_info(self, sku: str) -> dict:
-        params = {"SKU": sku}
-        response_data = self._make_request("Product", params)
-        products = response_data.get("Products", [])
-        
-        if products:
-            p = products[0]
-            barcode_val = (
-                p.get("Barcode") or 
-                p.get("UPC") or 
-                p.get("AdditionalAttribute1") or 
-                p.get("AdditionalAttribute2") or 
-                p.get("AdditionalAttribute3")
-            )
-            
-            return {
-                "Name": p.get("Name", "-"),
-                "SKU": p.get("SKU", "-"),
-                "UPC": str(barcode_val).strip() if barcode_val else "-",  
-                "UOM": p.get("UOM", "個")   
-            }
-        return {}
+    log_action("Barcode_Batch_Search")
+    return FastJSONResponse({"results": results, "not_found": not_found})
 
-    def get_inventory_by_sku(self, sku: str) -> List[Dict[str, Any]]:
-        params = {"SKU": sku}
-        response_data = self._make_request("ref/productavailability", params)
-        
-        if isinstance(response_data, dict):
-            return response_data.get("ProductAvailabilityList", [])
-        elif isinstance(response_data, list):
-            return response_data
-        return []
+
+# ==============================================================================
+# 📦 第二部分：DEAR 庫存查詢系統 (Inventory API)
+# ==============================================================================
+inventory_router = APIRouter()
 
 @inventory_router.get("/")
 def get_inventory(sku: str = Query(..., description="要查詢的產品 SKU")):
@@ -220,7 +328,7 @@ def get_inventory(sku: str = Query(..., description="要查詢的產品 SKU")):
         raise HTTPException(status_code=500, detail="伺服器缺少 DEAR API 金鑰設定")
 
     try:
-        dear_client = DearAPIClient(account_id=account_id, application_key=application_key)
+        dear_client = get_dear_client(account_id=account_id, application_key=application_key)
         product_info = dear_client.get_product_info(sku)
         
         if not product_info or product_info.get("SKU") == "-":
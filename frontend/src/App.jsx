@@ -418,6 +418,17 @@ function UnifiedSearchInventoryPage() {
   );
 }
 
+// ================= 共用標籤展開 =================
+// 🌟 上傳回應預設為 compact：樣式只在 label_styles 送一次，列印時才把單張標籤重複 repeat 次
+// (後端加上 ?label_format=full 則仍回傳舊版的 print_html)
+const renderLabelHtml = (resultData, item) => {
+  if (item.print_html !== undefined) return item.print_html;
+  if (!item.label) return '';
+  const style = (resultData.label_styles || {})[item.label.style];
+  if (!style) return item.label.body;
+  return style + item.label.body.repeat(item.label.repeat) + '</body></html>';
+};
+
 // ================= 共用表格樣式 =================
 const tableCellStyle = { padding: '12px', minWidth: '250px', whiteSpace: 'pre-wrap', wordBreak: 'break-word', lineHeight: '1.6' };
 
@@ -501,7 +512,7 @@ function YummyPage() {
                           {item.status === 'empty' ? (
                             <span style={{ display: 'inline-block', padding: '6px 12px', background: '#fef2f2', color: '#dc2626', borderRadius: '6px', fontWeight: 'bold', fontSize: '13px', border: '1px solid #fecaca' }}>無資料</span>
                           ) : (
-                            <button onClick={() => handlePrint(item.print_html)} style={{ background: '#eff6ff', color: '#2563eb', border: '1px solid #bfdbfe', padding: '6px 16px', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
+                            <button onClick={() => handlePrint(renderLabelHtml(resultData, item))} style={{ background: '#eff6ff', color: '#2563eb', border: '1px solid #bfdbfe', padding: '6px 16px', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
                           )}
                         </td>
                       </tr>
@@ -589,7 +600,7 @@ function AnymallPage() {
                           {item.status === 'no_print' ? (
                             <span style={{ display: 'inline-block', padding: '6px 12px', background: '#f8fafc', color: '#94a3b8', borderRadius: '6px', fontWeight: 'bold', fontSize: '13px',whiteSpace: 'nowrap', border: '1px solid #e2e8f0' }}>無需打印</span>
                           ) : (
-                            <button onClick={() => handlePrint(item.print_html)} style={{ background: '#ecfdf5', color: '#059669', border: '1px solid #a7f3d0', padding: '6px 16px', borderRadius: '6px', whiteSpace: 'nowrap', fontWeight: 'bold',fontSize: '13px', cursor: 'pointer'}}>🖨️ 打印標籤</button>
+                            <button onClick={() => handlePrint(renderLabelHtml(resultData, item))} style={{ background: '#ecfdf5', color: '#059669', border: '1px solid #a7f3d0', padding: '6px 16px', borderRadius: '6px', whiteSpace: 'nowrap', fontWeight: 'bold',fontSize: '13px', cursor: 'pointer'}}>🖨️ 打印標籤</button>
                           )}
                         </td>
                       </tr>
@@ -699,7 +710,7 @@ function HelloBearPage() {
                           {item.status === 'no_print' ? (
                             <span style={{ display: 'inline-block', padding: '6px 12px', background: '#f8fafc', color: '#94a3b8', borderRadius: '6px', fontWeight: 'bold', fontSize: '13px', border: '1px solid #e2e8f0' }}>無需打印</span>
                           ) : (
-                            <button onClick={() => handlePrint(item.print_html)} style={{ background: '#ccfbf1', color: '#0f766e', border: '1px solid #99f6e4', padding: '6px 16px', whiteSpace: 'nowrap', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
+                            <button onClick={() => handlePrint(renderLabelHtml(resultData, item))} style={{ background: '#ccfbf1', color: '#0f766e', border: '1px solid #99f6e4', padding: '6px 16px', whiteSpace: 'nowrap', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
                           )}
                         </td>
                       </tr>
@@ -748,7 +759,8 @@ function HomeyPage() {
     if (win) { 
         win.document.write(finalHtml); 
         win.document.close(); 
-        setTimeout(() => { win.focus(); win.print(); }, 0); 
+        // 🌟 字體改由 /api/fonts 網址載入，等字體下載完再列印 (之後會直接命中瀏覽器快取)
+        win.document.fonts.ready.then(() => { win.focus(); win.print(); }); 
         win.onafterprint = function() { win.close(); }; 
     }
   };
@@ -803,7 +815,7 @@ function HomeyPage() {
                           {item.status === 'no_print' ? (
                             <span style={{ display: 'inline-block', padding: '6px 12px', background: '#f8fafc', color: '#94a3b8', borderRadius: '6px', fontWeight: 'bold', fontSize: '13px', border: '1px solid #e2e8f0' }}>{item.label_type}</span>
                           ) : (
-                            <button onClick={() => handlePrint(item.print_html)} style={{ background: '#ccfbf1', color: '#0f766e', border: '1px solid #99f6e4', padding: '6px 16px', whiteSpace: 'nowrap', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
+                            <button onClick={() => handlePrint(renderLabelHtml(resultData, item))} style={{ background: '#ccfbf1', color: '#0f766e', border: '1px solid #99f6e4', padding: '6px 16px', whiteSpace: 'nowrap', borderRadius: '6px', fontWeight: 'bold', cursor: 'pointer' }}>🖨️ 打印標籤</button>
                           )}
                         </td>
                       </tr>
@@ -826,23 +838,45 @@ function FoodLabelPage() {
   const [error, setError] = useState('');
   const [hasSearched, setHasSearched] = useState(false);
   const [quantities, setQuantities] = useState({});
+  const [totalCount, setTotalCount] = useState(null);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // 🌟 後端每次只回傳一頁 (完全相同的貨號 / 條碼優先，再依標籤完整度排序)；
+  // 是否還有下一頁在 X-Has-More，總筆數 (有查完全部結果時才有) 在 X-Total-Count
+  const fetchPage = async (offset) => {
+    const response = await fetch(`${API_BASE_URL}/api/food_label/search?q=${encodeURIComponent(query)}&offset=${offset}`);
+    if (!response.ok) { const errData = await response.json(); throw new Error(errData.detail || '發生未知錯誤'); }
+    const data = await response.json();
+    const total = response.headers.get('X-Total-Count');
+    return { data, total: total === null ? null : parseInt(total, 10), more: response.headers.get('X-Has-More') === '1' };
+  };
 
   const handleSearch = async (e) => {
     if (e.key === 'Enter') {
       if (!query.trim()) return;
       setLoading(true); setError(''); setHasSearched(true);
       try {
-        const response = await fetch(`${API_BASE_URL}/api/food_label/search?q=${encodeURIComponent(query)}`);
-        if (!response.ok) { const errData = await response.json(); setError(errData.detail || '發生未知錯誤'); setResults([]); return; }
-        const data = await response.json(); 
-        setResults(data);
+        const { data, total, more } = await fetchPage(0);
+        setResults(data); setTotalCount(total); setHasMore(more);
         const initQtys = {};
         data.forEach(r => { initQtys[r.Product_No] = 1; });
         setQuantities(initQtys);
-      } catch (err) { setError('連線失敗！請確認後端已啟動。'); setResults([]); } finally { setLoading(false); }
+      } catch (err) { setError(err instanceof TypeError ? '連線失敗！請確認後端已啟動。' : err.message); setResults([]); setTotalCount(null); setHasMore(false); } finally { setLoading(false); }
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const { data, total, more } = await fetchPage(results.length);
+      setResults([...results, ...data]); setTotalCount(total); setHasMore(more);
+      const moreQtys = {};
+      data.forEach(r => { moreQtys[r.Product_No] = 1; });
+      setQuantities({ ...moreQtys, ...quantities });
+    } catch (err) { alert("載入失敗：" + err.message); } finally { setLoadingMore(false); }
+  };
+
   const handlePrint = async (item) => {
     const qty = quantities[item.Product_No] || 1;
     try {
@@ -855,7 +889,7 @@ function FoodLabelPage() {
       const data = await response.json();
       
       const win = window.open('', '_blank', 'width=400,height=400');
-      if (win) { win.document.write(data.html); win.document.close(); win.onload = function() { win.focus(); win.onafterprint = function() { win.close(); }; win.print(); }; }
+      if (win) { win.document.write(data.html); win.document.close(); win.onload = function() { win.focus(); win.onafterprint = function() { win.close(); }; win.document.fonts.ready.then(() => win.print()); }; }
     } catch (err) { alert("列印失敗：" + err.message); }
   };
 
@@ -935,6 +969,15 @@ function FoodLabelPage() {
             ))}
          </div>
       )}
+
+      {!loading && !error && results.length > 0 && hasMore && (
+         <div style={{ display: 'flex', justifyContent: 'center', alignItems: 'center', gap: '15px', marginTop: '25px' }}>
+            <span style={{ color: '#64748b', fontWeight: 'bold', fontSize: '14px' }}>已顯示 {results.length}{totalCount !== null ? ` / ${totalCount}` : ''} 筆</span>
+            <button onClick={handleLoadMore} disabled={loadingMore} style={{ background: '#f1f5f9', color: '#0f172a', border: '1px solid #cbd5e1', padding: '10px 20px', borderRadius: '8px', fontWeight: 'bold', fontSize: '14px', cursor: loadingMore ? 'wait' : 'pointer' }}>
+               {loadingMore ? '⏳ 載入中...' : '⬇️ 載入更多'}
+            </button>
+         </div>
+      )}
     </div>
   );
 }
@@ -1320,11 +1363,13 @@ function DatabaseUploader({ title, infoUrl, uploadUrl }) {
   const [uploading, setUploading] = useState(false);
   const [uploadMsg, setUploadMsg] = useState('');
   const [dbInfo, setDbInfo] = useState({ name: '尚未載入', total: 0 });
+  const [build, setBuild] = useState(null);
 
   const fetchDbInfo = async () => {
     try {
       const res = await fetch(infoUrl);
       const data = await res.json();
+      setBuild(data.build || null);
       if (data.total_records > 0) {
         setDbInfo({ name: data.current_db_name, total: data.total_records });
       } else {
@@ -1335,6 +1380,15 @@ function DatabaseUploader({ title, infoUrl, uploadUrl }) {
 
   useEffect(() => { fetchDbInfo(); }, [infoUrl]);
 
+  // 🌟 搜尋資料庫上傳後在背景建索引 (舊版本繼續服務)，建置中每秒更新一次進度
+  useEffect(() => {
+    if (build?.state !== 'building') return;
+    const timer = setTimeout(fetchDbInfo, 1000);
+    return () => clearTimeout(timer);
+  }, [build]);
+
+  const buildStages = { queued: '排隊中', parsing: '解析檔案', preparing: '整理欄位', writing: '建立索引', swapping: '切換版本' };
+
   const handleUpload = async () => {
     if (!file) { setUploadMsg('⚠️ 請先選擇檔案！'); return; }
     setUploading(true); setUploadMsg('');
@@ -1358,6 +1412,8 @@ function DatabaseUploader({ title, infoUrl, uploadUrl }) {
            <p style={{ margin: '4px 0 0 0', fontSize: '12px', color: '#15803d' }}>系統已記住 {dbInfo.total.toLocaleString()} 筆資料</p>
          </div>
       ) : ( <p style={{ fontSize: '13px', color: '#ef4444', fontWeight: 'bold', marginBottom: '15px' }}>⚠️ 尚未載入資料庫，請先上傳</p> )}
+      {build?.state === 'building' && <p style={{ fontSize: '12px', color: '#3b82f6', fontWeight: 'bold', margin: '0 0 15px 0' }}>⏳ 新版本建置中：{buildStages[build.stage] || build.stage} ({(build.elapsed_ms / 1000).toFixed(1)} 秒)</p>}
+      {build?.state === 'failed' && <p style={{ fontSize: '12px', color: '#b91c1c', fontWeight: 'bold', margin: '0 0 15px 0', wordBreak: 'break-all' }}>❌ 新版本建置失敗 (仍使用舊版本)：{build.error}</p>}
       <input type="file" accept=".csv, application/vnd.ms-excel, application/vnd.openxmlformats-officedocument.spreadsheetml.sheet, text/csv" onChange={(e) => setFile(e.target.files[0])} style={{ width: '100%', marginBottom: '15px', fontSize: '13px' }} />
       <button onClick={handleUpload} disabled={uploading} style={{ width: '100%', padding: '10px', borderRadius: '8px', background: uploading ? '#94a3b8' : '#3b82f6', color: 'white', border: 'none', fontWeight: 'bold', cursor: uploading ? 'not-allowed' : 'pointer' }}>{uploading ? '⏳ 資料上傳中...' : '確認更新資料庫'}</button>
       {uploadMsg && <div style={{ marginTop: '15px', padding: '10px', borderRadius: '8px', background: uploadMsg.includes('✅') ? '#f0fdf4' : '#fef2f2', color: uploadMsg.includes('✅') ? '#15803d' : '#b91c1c', fontSize: '13px', fontWeight: 'bold' }}>{uploadMsg}</div>}